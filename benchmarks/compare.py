@@ -0,0 +1,47 @@
+"""
+Diff two benchmark result files stage by stage.
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Prints the median of each stage in both runs and the relative change. Exits
+non-zero when any stage regressed by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        base = json.load(fh)
+    with open(args.candidate, encoding="utf-8") as fh:
+        cand = json.load(fh)
+
+    print(f"baseline {base['meta']['commit']}  →  candidate {cand['meta']['commit']}")
+    regressions = 0
+    for fixture, stages in cand["results"].items():
+        for stage, stats in stages.items():
+            old = base["results"].get(fixture, {}).get(stage)
+            if not old:
+                print(f"{fixture:>10} {stage:<12} {'new':>10} {stats['median'] * 1000:10.2f}ms")
+                continue
+            change = (stats["median"] - old["median"]) / old["median"] * 100 if old["median"] else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(
+                f"{fixture:>10} {stage:<12} {old['median'] * 1000:10.2f}ms {stats['median'] * 1000:10.2f}ms "
+                f"{change:+7.1f}%{flag}"
+            )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Synthetic ERD fixtures of varying size and density.
+
+Images are drawn deterministically with Pillow instead of being checked in, so
+every machine benchmarks identical pixels. Each fixture also carries the
+labels it contains, which the OCR benchmarks use as ground truth for recall,
+and where each label was drawn and which entity it belongs to, for grouping.
+"""
+import random
+from io import BytesIO
+from typing import List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+ENTITY_NAMES = [
+    "Student", "Course", "Instructor", "Department", "Enrollment", "Classroom", "Semester",
+    "Invoice", "Payment", "Customer", "Product", "Supplier", "Warehouse", "Shipment",
+    "Employee", "Project", "Address", "Category", "Review", "Account",
+]
+ATTRIBUTE_NAMES = [
+    "name", "email", "created_at", "status", "title", "credits", "amount", "quantity",
+    "price", "phone", "city", "start_date", "end_date", "description", "rating", "code",
+]
+
+
+class Fixture(NamedTuple):
+    name: str
+    image: Image.Image
+    png_bytes: bytes
+    labels: List[str]
+    placements: List["Placement"]
+
+
+class Placement(NamedTuple):
+    text: str
+    entity: str
+    box: Tuple[int, int, int, int]  # x0, y0, x1, y1 of the drawn text
+
+
+# name, (width, height), entity count, attributes per entity
+SPECS: List[Tuple[str, Tuple[int, int], int, int]] = [
+    ("small", (800, 600), 3, 3),
+    ("medium", (1920, 1080), 8, 5),
+    ("large", (3840, 2160), 20, 6),
+    ("warehouse", (8000, 4500), 40, 8),
+]
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has no sized default font
+        return ImageFont.load_default()
+
+
+def draw_erd(
+    size: Tuple[int, int], entities: int, attributes: int, seed: int = 0
+) -> Tuple[Image.Image, List[str], List[Placement]]:
+    """Lay entity boxes out on a grid, fill them with attributes and connect neighbours."""
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+
+    cols = max(1, int(entities ** 0.5 * width / height + 0.5))
+    rows = (entities + cols - 1) // cols
+    cell_w, cell_h = width // cols, height // rows
+    box_w, box_h = int(cell_w * 0.7), int(cell_h * 0.75)
+    font_size = max(12, min(box_h // (attributes + 3), box_w // 14))
+    title_font, attr_font = _font(int(font_size * 1.2)), _font(font_size)
+
+    boxes = []
+    for i in range(entities):
+        r, c = divmod(i, cols)
+        x0 = c * cell_w + (cell_w - box_w) // 2
+        y0 = r * cell_h + (cell_h - box_h) // 2
+        boxes.append((x0, y0))
+
+    # Connectors first, so the white-filled boxes drawn on top keep the text clean.
+    for (ax, ay), (bx, by) in zip(boxes, boxes[1:]):
+        draw.line([ax + box_w // 2, ay + box_h // 2, bx + box_w // 2, by + box_h // 2],
+                  fill="gray", width=max(1, font_size // 10))
+
+    labels: List[str] = []
+    placements: List[Placement] = []
+    for i, (x0, y0) in enumerate(boxes):
+        draw.rectangle([x0, y0, x0 + box_w, y0 + box_h], fill="white", outline="black", width=max(2, font_size // 8))
+
+        base = ENTITY_NAMES[i % len(ENTITY_NAMES)]
+        name = base if i < len(ENTITY_NAMES) else f"{base}{i // len(ENTITY_NAMES)}"
+        title_at = (x0 + font_size, y0 + font_size // 2)
+        draw.text(title_at, name, fill="black", font=title_font)
+        labels.append(name)
+        placements.append(Placement(name, name, draw.textbbox(title_at, name, font=title_font)))
+
+        attrs = [f"{name.lower()}_id"] + rng.sample(ATTRIBUTE_NAMES, attributes - 1)
+        for j, attr in enumerate(attrs):
+            ty = y0 + int(font_size * 2.2) + j * int(font_size * 1.4)
+            draw.text((x0 + font_size, ty), attr, fill="black", font=attr_font)
+            labels.append(attr)
+            placements.append(Placement(attr, name, draw.textbbox((x0 + font_size, ty), attr, font=attr_font)))
+
+    return img, labels, placements
+
+
+def load_fixtures(names: Optional[List[str]] = None) -> List[Fixture]:
+    """Build the fixtures (optionally only the named ones) with their PNG encoding."""
+    fixtures = []
+    for seed, (name, size, entities, attributes) in enumerate(SPECS):
+        if names and name not in names:
+            continue
+        image, labels, placements = draw_erd(size, entities, attributes, seed=seed)
+        buf = BytesIO()
+        image.save(buf, format="PNG")
+        fixtures.append(Fixture(name, image, buf.getvalue(), labels, placements))
+    return fixtures
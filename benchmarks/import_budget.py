@@ -0,0 +1,108 @@
+"""
+Import-time budget for the modules the pages and the CLI load at cold start.
+
+Each target is imported in a fresh interpreter under ``python -X importtime``.
+The check fails when a target's cumulative import time exceeds the budget or
+when it drags in one of the heavy OCR modules (easyocr, torch, ...), which must
+only load on first use of an OCR pipeline. The results and batch pages are also
+loaded once through Streamlit's AppTest to catch heavy imports added there.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    "normalizer.pipelines",
+    "normalizer.rendering",
+    "normalizer.metrics",
+    "normalizer.cli",
+]
+HEAVY_MODULES = ("easyocr", "torch", "torchvision", "cv2", "scipy", "skimage")
+
+PAGE_PROBE = (
+    "import sys\n"
+    "from streamlit.testing.v1 import AppTest\n"
+    "AppTest.from_file({page!r}, default_timeout=60).run()\n"
+    "print(','.join(sorted(m for m in sys.modules if m.split('.')[0] in {heavy!r})))\n"
+)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Map module name -> (self_us, cumulative_us) from ``-X importtime`` output."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module: str) -> Dict[str, Tuple[int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=REPO_ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def heavy_in(timings: Dict[str, Tuple[int, int]]) -> List[str]:
+    return sorted(name for name in timings if name.split(".")[0] in HEAVY_MODULES)
+
+
+def probe_page(page: str) -> List[str]:
+    """Heavy modules present after a cold run of ``page`` (no session state, so it stops early)."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-c", PAGE_PROBE.format(page=page, heavy=set(HEAVY_MODULES))],
+        capture_output=True, text=True, cwd=REPO_ROOT, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"loading {page} failed:\n{proc.stderr[-2000:]}")
+    out = proc.stdout.strip().splitlines()
+    return [m for m in (out[-1] if out else "").split(",") if m]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="Max cumulative import time per target")
+    parser.add_argument("--skip-page", action="store_true", help="Skip the Streamlit page probes")
+    args = parser.parse_args()
+
+    failures = 0
+    for module in TARGETS:
+        timings = measure(module)
+        total_ms = timings.get(module, (0, 0))[1] / 1000
+        heavy = heavy_in(timings)
+        slowest = sorted(
+            ((cum, name) for name, (_, cum) in timings.items() if "." not in name and name not in ("normalizer", "site", "encodings")),
+            reverse=True,
+        )[:3]
+        problems = []
+        if total_ms > args.budget_ms:
+            problems.append(f"over budget ({args.budget_ms:.0f}ms)")
+        if heavy:
+            problems.append(f"imports {', '.join(heavy[:5])}")
+        failures += bool(problems)
+        top = ", ".join(f"{name} {cum / 1000:.0f}ms" for cum, name in slowest)
+        print(f"{module:<22} {total_ms:8.1f}ms  [{top}]  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+
+    for page in () if args.skip_page else ("pages/results.py", "pages/batch.py"):
+        heavy = probe_page(page)
+        failures += bool(heavy)
+        print(f"{page:<22} {'FAIL: imports ' + ', '.join(heavy[:5]) if heavy else 'ok (no OCR stack loaded)'}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+Concurrent-session load test: how many users can one app process serve?
+
+Drives simulated sessions through upload → results with Streamlit's AppTest,
+against an in-process stub Ollama with a configurable service time. Each
+session loads the upload page, stores a distinct diagram and puts its digest in
+the session the way the upload page does, then opens the results page and keeps rerunning it
+every ``--poll`` seconds (as the page's own polling fragment would) until the
+result is shown, the job fails or ``--timeout`` passes.
+
+AppTest keeps Streamlit's runtime in process-wide state, so page runs from
+different sessions take turns under a lock (each takes milliseconds; the time
+spent waiting for the lock counts towards latency, as a busy server's script
+threads would). Everything behind the page runs concurrently as in production:
+the job pool, the model scheduler and the stub.
+
+Concurrency ramps through ``--levels``. For each level the report gives
+end-to-end latency percentiles, error and timeout rates, and the peak RSS and
+thread count of this process (which plays the server). Before the next level
+starts, the job pool is allowed to drain. Run from the project root:
+
+    python -m benchmarks.load --levels 1 4 16 --latency 2 --token-delay 0.01
+    python -m benchmarks.load --max-in-flight 4 --method hybrid --json load.json
+
+Settings the app reads from ``ERN_*`` variables (queue size, job workers, ...)
+can be set in the environment as usual; the stub's address and a throwaway
+cache and blob store are set here.
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple
+
+from PIL import Image
+
+from benchmarks.stub_ollama import StubOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_PAGE = os.path.join(ROOT, "pages", "upload.py")
+RESULTS_PAGE = os.path.join(ROOT, "pages", "results.py")
+
+OK, ERROR, TIMEOUT = "ok", "error", "timeout"
+
+# One AppTest script run at a time; see the module docstring.
+_PAGE_LOCK = threading.Lock()
+
+
+class Outcome(NamedTuple):
+    status: str  # OK | ERROR | TIMEOUT
+    seconds: float  # upload submitted -> results rendered (or given up)
+    detail: str = ""
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (``q`` in 0-100); 0.0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Sampler:
+    """Background thread recording peak RSS and thread count while a level runs."""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_rss = 0.0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, rss_mb())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+@functools.lru_cache(maxsize=1)
+def _base_image() -> Image.Image:
+    from benchmarks.fixtures import load_fixtures
+
+    return load_fixtures(["small"])[0].image
+
+
+def diagram(seed: int) -> bytes:
+    """The small fixture with its first pixels set from ``seed``, so every session misses the cache."""
+    image = _base_image().copy()
+    for i, byte in enumerate(seed.to_bytes(4, "big")):
+        image.putpixel((i, 0), (byte, 255 - byte, 0))
+    buf = BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def session(image_bytes: bytes, method: str, timeout: float, poll: float) -> Outcome:
+    """One user: open the upload page, "upload" and validate, then wait on the results page."""
+    from streamlit.testing.v1 import AppTest
+
+    from normalizer import blobs, jobs, pipelines
+
+    upload = AppTest.from_file(UPLOAD_PAGE, default_timeout=timeout)
+    with _PAGE_LOCK:
+        upload.run()
+    if upload.exception:
+        return Outcome(ERROR, 0.0, f"upload page: {upload.exception[0].value}")
+
+    start = time.perf_counter()
+    page = AppTest.from_file(RESULTS_PAGE, default_timeout=timeout)
+    page.session_state["dv_image"] = blobs.get_store().put(image_bytes)
+    page.session_state["dv_image_name"] = "load.png"
+    page.session_state["dv_analysis_method"] = method
+    while True:
+        with _PAGE_LOCK:
+            page.run()
+        elapsed = time.perf_counter() - start
+        if page.exception:
+            return Outcome(ERROR, elapsed, page.exception[0].value)
+        state = page.session_state
+        if "dv_results_ref" in state:
+            results = blobs.get_store().get_json(state["dv_results_ref"]["blob"])
+            block = results.get(pipelines.RESULT_KEYS.get(results.get("mode"), ""), {})
+            if block.get("error"):
+                return Outcome(ERROR, elapsed, (block.get("summary") or "").splitlines()[0].lstrip("# "))
+            return Outcome(OK, elapsed)
+        job = jobs.get_pool().get(state["dv_job"]["id"]) if "dv_job" in state else None
+        if job is not None and job.state == jobs.FAILED:
+            return Outcome(ERROR, elapsed, job.error)
+        if elapsed > timeout:
+            return Outcome(TIMEOUT, elapsed)
+        time.sleep(poll)
+
+
+def drain(limit: float) -> None:
+    """Wait for queued and running jobs (timed-out sessions leave theirs behind) to finish."""
+    from normalizer import jobs
+
+    deadline = time.perf_counter() + limit
+    while time.perf_counter() < deadline:
+        stats = jobs.get_pool().stats()
+        if not stats["queued"] and not stats["running"]:
+            return
+        time.sleep(0.2)
+
+
+def run_level(level: int, sessions: int, args: argparse.Namespace, seed: int) -> Dict[str, Any]:
+    images = [diagram(seed + i) for i in range(sessions)]
+    started = time.perf_counter()
+    with Sampler() as sampler, ThreadPoolExecutor(max_workers=level, thread_name_prefix="load") as pool:
+        outcomes = list(pool.map(lambda img: session(img, args.method_label, args.timeout, args.poll), images))
+    wall = time.perf_counter() - started
+
+    latencies = [o.seconds for o in outcomes if o.status == OK]
+    errors = [o.detail for o in outcomes if o.status == ERROR]
+    return {
+        "concurrency": level,
+        "sessions": sessions,
+        "ok": len(latencies),
+        "error_rate": len(errors) / sessions,
+        "timeout_rate": sum(o.status == TIMEOUT for o in outcomes) / sessions,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput_per_min": len(latencies) / wall * 60,
+        "peak_rss_mb": sampler.peak_rss,
+        "peak_threads": sampler.peak_threads,
+        "errors": sorted(set(errors))[:5],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8], help="concurrent sessions per step")
+    parser.add_argument("--sessions", type=int, default=0, help="sessions per level (default: 2 x the level)")
+    parser.add_argument("--method", default="llava_image", choices=["ocr_llm", "llava_image", "llava_extract", "hybrid"])
+    parser.add_argument("--latency", type=float, default=1.0, help="stub seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="stub seconds per streamed token")
+    parser.add_argument("--max-in-flight", type=int, default=0, help="sets ERN_OLLAMA_MAX_IN_FLIGHT")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds a session waits for its result")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between results page reruns")
+    parser.add_argument("--json", help="also write the per-level results to this file")
+    args = parser.parse_args()
+
+    stub = StubOllama(latency=args.latency, token_delay=args.token_delay).start()
+    # normalizer.config reads the environment on import, so everything is set before the app loads.
+    os.environ["OLLAMA_HOST"] = stub.url
+    scratch = tempfile.mkdtemp(prefix="ern-load-")
+    os.environ["ERN_CACHE_PATH"] = os.path.join(scratch, "cache.sqlite3")
+    os.environ["ERN_BLOB_DIR"] = os.path.join(scratch, "blobs")
+    os.environ["ERN_SIMILARITY_MODE"] = "off"  # the sessions' diagrams differ by a few pixels on purpose
+    os.environ.setdefault("ERN_OLLAMA_WARMUP", "false")
+    if args.max_in_flight:
+        os.environ["ERN_OLLAMA_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+
+    from normalizer import config, pipelines
+
+    args.method_label = pipelines.METHOD_LABELS[args.method]
+    print(
+        f"method {args.method} · stub {args.latency:.2f}s + {args.token_delay * 1000:.0f} ms/token · "
+        f"{config.OLLAMA_MAX_IN_FLIGHT} in flight, queue {config.OLLAMA_QUEUE_SIZE}, "
+        f"{config.JOB_WORKERS} job workers · baseline RSS {rss_mb():.0f} MB"
+    )
+    print(
+        f"{'conc':>4} {'n':>4} {'ok':>4} {'err%':>5} {'tmo%':>5} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+        f"{'/min':>6} {'RSS MB':>7} {'threads':>7}"
+    )
+    levels = []
+    seed = 0
+    try:
+        for level in args.levels:
+            sessions = args.sessions or 2 * level
+            result = run_level(level, sessions, args, seed)
+            seed += sessions
+            levels.append(result)
+            print(
+                f"{level:>4} {sessions:>4} {result['ok']:>4} {result['error_rate']:>5.0%} "
+                f"{result['timeout_rate']:>5.0%} {result['p50']:>7.2f} {result['p95']:>7.2f} {result['p99']:>7.2f} "
+                f"{result['throughput_per_min']:>6.1f} {result['peak_rss_mb']:>7.0f} {result['peak_threads']:>7}"
+            )
+            for error in result["errors"]:
+                print(f"{'':>10} error: {error}")
+            drain(args.timeout)
+    finally:
+        stub.stop()
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"args": vars(args), "levels": levels}, fh, indent=2)
+        print(f"wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
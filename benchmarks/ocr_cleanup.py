@@ -0,0 +1,108 @@
+"""
+Prompt size and prompt-processing time with and without local OCR clean-up.
+
+For each fixture the OCR lines are cleaned with ``normalizer.ocrclean`` and the
+report compares the raw prompt (hardened instructions + raw text) against the
+cleaned one: lines, approximate tokens, corrections, label recall and clean-up
+time. With ``--ocr`` the lines come from EasyOCR; otherwise they are the
+fixture labels with seeded OCR-style damage (dropped letters, watermark
+gibberish, glyph noise), so the benchmark runs without EasyOCR.
+
+With ``--ollama`` both prompts are also sent to the configured model with
+``num_predict: 1`` and Ollama's own ``prompt_eval_count``/``prompt_eval_duration``
+are reported. Run from the project root:
+
+    python -m benchmarks.ocr_cleanup --fixtures small medium large --ollama
+"""
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+import numpy as np
+import requests
+
+from benchmarks.fixtures import SPECS, load_fixtures
+from benchmarks.ocr_tiling import recall
+from normalizer import config, ocr, ocrclean, ollama, pipelines
+
+NOISE = ["Checynll", "Haptd", "Hadidid", "Habitnmm", "~~", "|||", "rnrn", "VVatermark", "Xqzt", "Iiil"]
+
+
+def damaged_lines(labels: List[str], seed: int = 0) -> List[Tuple[str, float]]:
+    """Fixture labels as EasyOCR tends to return them: some misread, plus noise lines."""
+    rng = random.Random(seed)
+    lines = []
+    for label in labels:
+        if len(label) > 5 and rng.random() < 0.25:
+            i = rng.randrange(1, len(label) - 1)
+            lines.append((label[:i] + label[i + 1:], rng.uniform(0.3, 0.7)))
+        else:
+            lines.append((label, rng.uniform(0.8, 1.0)))
+        if rng.random() < 0.3:
+            lines.append((rng.choice(NOISE), rng.uniform(0.05, 0.45)))
+    return lines
+
+
+def ocr_lines(np_img: np.ndarray) -> List[Tuple[str, float]]:
+    if ocr.should_tile(np_img.shape[1], np_img.shape[0]):
+        detections = ocr.readtext_tiled(np_img, ["en"])
+    else:
+        with ocr.reader(["en"]) as r:
+            detections = r.readtext(np_img, detail=1)
+    return [(text, float(conf)) for _, text, conf in detections]
+
+
+def prompt_eval(prompt: str) -> Tuple[int, float]:
+    """(prompt tokens, prompt eval seconds) as reported by Ollama for one single-token reply."""
+    client = ollama.get_client()
+    payload = {
+        "model": config.OLLAMA_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "options": {**pipelines.OCR_LLM_OPTIONS, "num_predict": 1},
+        "stream": False,
+    }
+    body = client._post("/api/chat", payload).json()
+    return body.get("prompt_eval_count", 0), (body.get("prompt_eval_duration") or 0) / 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=["small", "medium", "large"], choices=[s[0] for s in SPECS])
+    parser.add_argument("--ocr", action="store_true", help="read the fixtures with EasyOCR instead of simulating OCR")
+    parser.add_argument("--ollama", action="store_true", help="also measure prompt processing on the configured model")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ocrclean.domain_tree()
+    print(f"vocabulary: {len(ocrclean.dictionary())} words, tree built in {time.perf_counter() - start:.3f}s")
+    print(f"{'fixture':>10} {'lines':>11} {'tokens':>13} {'prompt':>13} {'fixed':>5} {'recall':>13} {'ms':>6}")
+
+    for fx in load_fixtures(args.fixtures):
+        lines = ocr_lines(np.array(fx.image.convert("RGB"))) if args.ocr else damaged_lines(fx.labels)
+        start = time.perf_counter()
+        cleanup = ocrclean.clean(lines)
+        ms = (time.perf_counter() - start) * 1000
+        raw_text = "\n".join(text for text, _ in lines)
+        raw_prompt = pipelines.build_ocr_prompt(raw_text)
+        clean_prompt = pipelines.build_ocr_prompt(cleanup.text, cleaned=True)
+        print(
+            f"{fx.name:>10} {cleanup.lines_in:>5}→{cleanup.lines_kept:<5} "
+            f"{cleanup.tokens_before:>6}→{cleanup.tokens_after:<6} "
+            f"{ocrclean.approx_tokens(raw_prompt):>6}→{ocrclean.approx_tokens(clean_prompt):<6} "
+            f"{len(cleanup.corrections):>5} "
+            f"{recall(fx.labels, raw_text.splitlines()):>6.1%}→{recall(fx.labels, cleanup.text.splitlines()):<6.1%} "
+            f"{ms:6.1f}"
+        )
+        if args.ollama:
+            try:
+                for label, prompt in (("raw", raw_prompt), ("cleaned", clean_prompt)):
+                    count, seconds = prompt_eval(prompt)
+                    print(f"{'':>10} {label:>8}: {count} prompt tokens evaluated in {seconds:.2f}s")
+            except requests.exceptions.RequestException as e:
+                print(f"{'':>10} Ollama unavailable ({type(e).__name__}); skipping prompt timing")
+                args.ollama = False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Entity grouping accuracy and prompt size for position-grouped OCR text.
+
+Each fixture knows where every label was drawn and which entity it belongs to.
+The benchmark feeds those boxes (optionally jittered by a few pixels, as real
+OCR boxes are) to ``normalizer.ocrlayout.group`` and reports how many entities
+were found, the share of labels assigned to the right entity, grouping time,
+and approximate tokens of the flat line list against the per-entity block.
+With ``--ocr`` the boxes come from EasyOCR instead, and accuracy is measured
+on the labels it read. Run from the project root:
+
+    python -m benchmarks.ocr_layout --jitter 3
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+from benchmarks.fixtures import SPECS, Fixture, load_fixtures
+from normalizer import ocr, ocrclean, ocrlayout
+
+
+def placed_detections(fx: Fixture, jitter: int, seed: int = 0) -> List[Tuple[Any, str]]:
+    rng = random.Random(seed)
+    detections = []
+    for p in fx.placements:
+        x0, y0, x1, y1 = (v + rng.randint(-jitter, jitter) for v in p.box)
+        detections.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], p.text))
+    return detections
+
+
+def ocr_detections(fx: Fixture) -> List[Tuple[Any, str]]:
+    np_img = np.array(fx.image.convert("RGB"))
+    if ocr.should_tile(np_img.shape[1], np_img.shape[0]):
+        return [(quad, text) for quad, text, _ in ocr.readtext_tiled(np_img, ["en"])]
+    with ocr.reader(["en"]) as r:
+        return [(quad, text) for quad, text, _ in r.readtext(np_img, detail=1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=[s[0] for s in SPECS], choices=[s[0] for s in SPECS])
+    parser.add_argument("--jitter", type=int, default=2, help="max pixels each drawn box edge is moved")
+    parser.add_argument("--ocr", action="store_true", help="group EasyOCR's boxes instead of the drawn ones")
+    args = parser.parse_args()
+
+    print(f"{'fixture':>10} {'entities':>9} {'assigned':>9} {'loose':>5} {'ms':>6} {'tokens':>13}")
+    for fx in load_fixtures(args.fixtures):
+        detections = ocr_detections(fx) if args.ocr else placed_detections(fx, args.jitter)
+        start = time.perf_counter()
+        layout = ocrlayout.group(detections)
+        ms = (time.perf_counter() - start) * 1000
+
+        # Attribute names repeat across entities; a label is right if any entity drawn with it got it.
+        owners: Dict[str, Set[str]] = {}
+        for p in fx.placements:
+            owners.setdefault(p.text, set()).add(p.entity)
+        labelled = [
+            (label, e.name) for e in layout.entities for row in [e.name] + e.attributes for label in row.split()
+        ] + [(label, None) for row in layout.loose for label in row.split()]
+        scored = [(label, entity) for label, entity in labelled if label in owners]
+        correct = sum(entity in owners[label] for label, entity in scored)
+        expected = len({p.entity for p in fx.placements})
+
+        flat = "\n".join(text for _, text in detections)
+        print(
+            f"{fx.name:>10} {len(layout.entities):>4}/{expected:<4} {correct / max(1, len(scored)):>9.1%} "
+            f"{len(layout.loose):>5} {ms:6.1f} "
+            f"{ocrclean.approx_tokens(flat):>6}→{ocrclean.approx_tokens(ocrlayout.compact(layout)):<6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold vs. warm EasyOCR latency.
+
+Cold runs build a fresh ``easyocr.Reader`` per call (the old ``run_ocr``
+behaviour); warm runs borrow a reader from the shared pool in
+``normalizer.ocr``. Run from the project root:
+
+    python -m benchmarks.ocr_reader_pool --runs 5
+"""
+import argparse
+import statistics
+import time
+
+import easyocr
+import numpy as np
+from PIL import Image, ImageDraw
+
+from normalizer import ocr
+
+
+def sample_diagram() -> np.ndarray:
+    """Draw a small two-entity ERD so the benchmark needs no fixture files."""
+    img = Image.new("RGB", (900, 500), "white")
+    draw = ImageDraw.Draw(img)
+    for x, name, attrs in ((60, "Student", ["student_id PK", "name", "email"]),
+                           (540, "Course", ["course_id PK", "title", "credits"])):
+        draw.rectangle([x, 80, x + 300, 380], outline="black", width=3)
+        draw.text((x + 20, 100), name, fill="black")
+        for i, attr in enumerate(attrs):
+            draw.text((x + 20, 160 + i * 50), attr, fill="black")
+    draw.line([360, 230, 540, 230], fill="black", width=3)
+    draw.text((420, 200), "enrolls", fill="black")
+    return np.array(img)
+
+
+def _time(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    np_img = sample_diagram()
+    use_gpu = ocr.gpu_available()
+
+    def cold():
+        reader = easyocr.Reader(["en"], gpu=use_gpu, verbose=False)
+        reader.readtext(np_img, detail=0)
+
+    def warm():
+        with ocr.reader(["en"]) as reader:
+            reader.readtext(np_img, detail=0)
+
+    warm()  # fill the pool so every timed warm run is a checkout
+    print(f"device: {'gpu' if use_gpu else 'cpu'}, runs: {args.runs}")
+    for label, fn in (("cold", cold), ("warm", warm)):
+        samples = _time(fn, args.runs)
+        print(f"{label:>5}: median {statistics.median(samples):.3f}s  min {min(samples):.3f}s  max {max(samples):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
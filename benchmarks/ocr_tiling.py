@@ -0,0 +1,67 @@
+"""
+Tile size vs. throughput and recall for tiled OCR.
+
+Runs each fixture once untiled (a single ``readtext`` call) and once per tile
+size through ``normalizer.ocr.readtext_tiled``, and reports wall time,
+megapixels per second and label recall against the labels the fixture was
+drawn with. Needs EasyOCR; run from the project root:
+
+    python -m benchmarks.ocr_tiling --fixtures large warehouse --tiles 1024 1600 2048
+"""
+import argparse
+import re
+import time
+from typing import Iterable, List, Set
+
+import numpy as np
+
+from benchmarks.fixtures import SPECS, load_fixtures
+from normalizer import config, ocr
+
+
+def normalize(token: str) -> str:
+    return re.sub(r"[^a-z0-9_]", "", token.lower())
+
+
+def recall(labels: List[str], texts: Iterable[str]) -> float:
+    """Share of fixture labels that appear as a whole OCR token."""
+    found: Set[str] = {normalize(tok) for text in texts for tok in text.split()}
+    wanted = [normalize(label) for label in labels]
+    return sum(label in found for label in wanted) / len(wanted) if wanted else 1.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=["large", "warehouse"], choices=[s[0] for s in SPECS])
+    parser.add_argument("--tiles", nargs="*", type=int, default=[1024, 1600, 2048, 2560])
+    parser.add_argument("--overlap", type=int, default=config.OCR_TILE_OVERLAP)
+    args = parser.parse_args()
+
+    with ocr.reader(["en"]):
+        pass  # build one reader up front so the first row doesn't include model load
+
+    print(f"pool size {config.OCR_POOL_SIZE}, overlap {args.overlap}px, device "
+          f"{'gpu' if config.OCR_USE_GPU and ocr.gpu_available() else 'cpu'}")
+    print(f"{'fixture':>10} {'tile':>6} {'tiles':>5} {'seconds':>8} {'MP/s':>6} {'recall':>7}")
+    for fx in load_fixtures(args.fixtures):
+        np_img = np.array(fx.image.convert("RGB"))
+        megapixels = np_img.shape[0] * np_img.shape[1] / 1e6
+
+        start = time.perf_counter()
+        with ocr.reader(["en"]) as r:
+            texts = r.readtext(np_img, detail=0)
+        seconds = time.perf_counter() - start
+        print(f"{fx.name:>10} {'none':>6} {1:>5} {seconds:8.2f} {megapixels / seconds:6.2f} "
+              f"{recall(fx.labels, texts):7.1%}")
+
+        for tile in args.tiles:
+            windows = ocr.tile_grid(np_img.shape[1], np_img.shape[0], tile, args.overlap)
+            start = time.perf_counter()
+            detections = ocr.readtext_tiled(np_img, ["en"], tile=tile, overlap=args.overlap)
+            seconds = time.perf_counter() - start
+            print(f"{fx.name:>10} {tile:>6} {len(windows):>5} {seconds:8.2f} {megapixels / seconds:6.2f} "
+                  f"{recall(fx.labels, (t for _, t, _ in detections)):7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Bytes each page sends to the browser on a cold load.
+
+Runs each page once through Streamlit's AppTest and sums the serialized size
+of every element it emits, which is what the server pushes over the websocket
+on each script run. The check fails when the landing page goes over budget,
+e.g. because a logo got inlined again.
+
+    python -m benchmarks.page_payload
+    python -m benchmarks.page_payload --budget-kb 48
+"""
+import argparse
+import os
+import sys
+from typing import Dict, Iterator
+
+from streamlit.testing.v1 import AppTest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ("app.py", "pages/upload.py", "pages/results.py", "pages/batch.py")
+
+
+def _elements(node) -> Iterator:
+    children = getattr(node, "children", None)
+    if children is None:
+        yield node
+        return
+    for child in children.values():
+        yield from _elements(child)
+
+
+def payload(page: str) -> Dict[str, int]:
+    """Serialized bytes per element type for one cold run of ``page``."""
+    at = AppTest.from_file(os.path.join(REPO_ROOT, page), default_timeout=60)
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"{page} raised: {at.exception[0].message}")
+    sizes: Dict[str, int] = {}
+    for element in _elements(at.main):
+        proto = getattr(element, "proto", None)
+        if proto is not None:
+            sizes[element.type] = sizes.get(element.type, 0) + proto.ByteSize()
+    return sizes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-kb", type=float, default=48.0, help="Max landing page payload")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    failures = 0
+    for page in PAGES:
+        sizes = payload(page)
+        total_kb = sum(sizes.values()) / 1024
+        over = page == "app.py" and total_kb > args.budget_kb
+        failures += over
+        top = ", ".join(f"{kind} {size / 1024:.1f}KB" for kind, size in sorted(sizes.items(), key=lambda kv: -kv[1])[:3])
+        print(f"{page:<18} {total_kb:7.1f}KB  [{top}]  {'FAIL: over budget' if over else 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
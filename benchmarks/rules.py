@@ -0,0 +1,80 @@
+"""
+Rule-check latency and what the "already checked" note does to the OCR prompt.
+
+Each fixture's drawn label boxes are grouped into entities the way
+``run_ocr`` groups EasyOCR's, then ``normalizer.rules.check`` runs over them.
+The report lists entities, findings by severity, the provisional score, check
+time, and approximate prompt tokens without and with the rules note.
+
+With ``--ollama`` both prompts are also sent to the configured model and
+Ollama's own ``eval_count`` (generated tokens) and total duration are
+reported, which is where skipping the mechanical checks should show up. Run
+from the project root:
+
+    python -m benchmarks.rules --fixtures small medium --ollama
+"""
+import argparse
+import time
+from collections import Counter
+from typing import Tuple
+
+import requests
+
+from benchmarks.fixtures import SPECS, load_fixtures
+from benchmarks.ocr_layout import placed_detections
+from normalizer import config, ocrclean, ocrlayout, ollama, pipelines, rules
+
+
+def generate(prompt: str) -> Tuple[int, float]:
+    """(generated tokens, total seconds) for one full reply from the configured model."""
+    client = ollama.get_client()
+    payload = {
+        "model": config.OLLAMA_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "options": pipelines.OCR_LLM_OPTIONS,
+        "stream": False,
+    }
+    body = client._post("/api/chat", payload).json()
+    return body.get("eval_count", 0), (body.get("total_duration") or 0) / 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=[s[0] for s in SPECS], choices=[s[0] for s in SPECS])
+    parser.add_argument("--repeats", type=int, default=20, help="checks timed per fixture (best is reported)")
+    parser.add_argument("--ollama", action="store_true", help="also compare reply length on the configured model")
+    args = parser.parse_args()
+
+    print(f"{'fixture':>10} {'entities':>8} {'E/W/I':>9} {'score':>5} {'ms':>6} {'prompt tokens':>14}")
+    for fx in load_fixtures(args.fixtures):
+        layout = ocrlayout.group(placed_detections(fx, jitter=2))
+        ocr_payload = {"entities": [e.as_dict() for e in layout.entities], "layout_text": ocrlayout.compact(layout)}
+        entities = rules.from_ocr(ocr_payload)
+
+        best = float("inf")
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            report = rules.check(entities)
+            best = min(best, time.perf_counter() - start)
+
+        severities = Counter(f.severity for f in report.findings)
+        plain = pipelines.build_ocr_prompt(ocr_payload["layout_text"], cleaned=True)
+        noted = pipelines.build_ocr_prompt(ocr_payload["layout_text"], cleaned=True, checks=rules.prompt_note(report))
+        print(
+            f"{fx.name:>10} {report.entities:>8} "
+            f"{severities[rules.ERROR]:>3}/{severities[rules.WARNING]}/{severities[rules.INFO]:<3} "
+            f"{report.score:>5} {best * 1000:6.2f} "
+            f"{ocrclean.approx_tokens(plain):>6}→{ocrclean.approx_tokens(noted):<6}"
+        )
+        if args.ollama:
+            try:
+                for label, prompt in (("no note", plain), ("with note", noted)):
+                    tokens, seconds = generate(prompt)
+                    print(f"{'':>10} {label:>9}: {tokens} tokens generated, {seconds:.1f}s")
+            except requests.exceptions.RequestException as e:
+                print(f"{'':>10} Ollama unavailable ({type(e).__name__}); skipping reply timing")
+                args.ollama = False
+
+
+if __name__ == "__main__":
+    main()
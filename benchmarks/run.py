@@ -0,0 +1,142 @@
+"""
+Reproducible latency benchmark for every pipeline stage.
+
+Runs the fixture diagrams through decode, OCR, encode, HTTP (against a local
+stub Ollama), parse and render, and writes machine-readable results that can
+be diffed across commits with ``python -m benchmarks.compare``. No real Ollama
+or GPU is needed.
+
+    python -m benchmarks.run --repeats 5 --latency 0.05
+    python -m benchmarks.run --fixtures small medium --skip-ocr
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List
+
+from PIL import Image
+
+from benchmarks.fixtures import SPECS, load_fixtures
+from benchmarks.stub_ollama import StubOllama
+from normalizer import imaging, ollama, parsing, pipelines
+from normalizer.rendering import render_result, sections_preview_html
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(samples),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": p95,
+    }
+
+
+def measure(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fixtures = load_fixtures(args.fixtures)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    with StubOllama(latency=args.latency, token_delay=args.token_delay) as stub:
+        ollama.set_client(ollama.OllamaClient(base_url=stub.url, retries=0))
+        client = ollama.get_client()
+
+        for fx in fixtures:
+            print(f"{fx.name} {fx.image.size[0]}x{fx.image.size[1]}", file=sys.stderr)
+            stages: Dict[str, Any] = {}
+
+            def decode() -> Image.Image:
+                img = Image.open(BytesIO(fx.png_bytes))
+                img.load()
+                return img
+
+            stages["decode"] = measure(decode, args.repeats)
+
+            if not args.skip_ocr:
+                pipelines.run_ocr(fx.image)  # warm the reader pool so we time recognition, not model load
+                stages["ocr"] = measure(lambda: pipelines.run_ocr(fx.image), max(1, args.repeats // 2))
+
+            encoded = imaging.encode_for_model(fx.image)
+            stages["encode"] = measure(lambda: imaging.encode_for_model(fx.image), args.repeats)
+            stages["encode"]["bytes"] = encoded.encoded_bytes
+
+            payload = {
+                "model": pipelines.LLAVA_MODEL,
+                "messages": [{"role": "user", "content": pipelines.VISION_PROMPT, "images": [encoded.b64]}],
+                "options": pipelines.LLAVA_OPTIONS,
+            }
+            stages["http"] = measure(lambda: client.chat(payload), args.repeats)
+            stages["http_stream"] = measure(lambda: client.chat(payload, on_text=lambda _: None), args.repeats)
+
+            reply = stub.reply
+            stages["parse"] = measure(lambda: parsing.parse_report(reply), args.repeats * 20)
+            parsed = parsing.parse_report(reply)
+            stages["render"] = measure(lambda: render_result(parsed), args.repeats * 20)
+            stages["render_stream"] = measure(lambda: sections_preview_html(reply), args.repeats * 20)
+            results[fx.name] = stages
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": args.repeats,
+            "stub_latency": args.latency,
+            "stub_token_delay": args.token_delay,
+            "image_settings": imaging.encoding_settings(),
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", choices=[s[0] for s in SPECS], help="Subset of fixtures to run")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub Ollama seconds before first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub Ollama seconds per token")
+    parser.add_argument("--skip-ocr", action="store_true", help="Skip EasyOCR stages")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    report = run(args)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+
+    for name, stages in report["results"].items():
+        cells = "  ".join(f"{stage} {s['median'] * 1000:.1f}ms" for stage, s in stages.items())
+        print(f"{name:>10}: {cells}")
+    print(f"wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
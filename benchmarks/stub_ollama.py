@@ -0,0 +1,181 @@
+"""
+A local stand-in for Ollama's HTTP API.
+
+Serves ``/api/chat`` (streaming NDJSON and non-streaming) and ``/api/tags``
+with configurable queueing latency, per-token delay and a canned reply, so the
+pipelines can be timed without a GPU or a real model. Usable in-process from
+the benchmarks or standalone:
+
+    python -m benchmarks.stub_ollama --port 11434 --latency 2 --token-delay 0.02
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+CANNED_REPLY = (
+    "## 1. Overview\n"
+    "A course registration schema with students, courses and instructors.\n\n"
+    "## 2. Entities & Attributes\n"
+    "- **Student**: student_id (PK), name, email, enroll_date\n"
+    "- **Course**: course_id (PK), title, credits, instructor_id (FK)\n"
+    "- **Instructor**: instructor_id (PK), name, department\n\n"
+    "## 3. Relationships\n"
+    "- Student enrolls in Course (M:N)\n"
+    "- Instructor teaches Course (1:N)\n\n"
+    "## 4. Issues\n"
+    "- The M:N relationship between Student and Course has no junction table.\n"
+    "- **Instructor** department should reference a Department entity.\n\n"
+    "## 5. Suggestions\n"
+    "- Add an Enrollment entity with student_id and course_id as a composite key.\n"
+    "- Extract Department into its own entity.\n\n"
+    "## 6. Score\n"
+    "Score: 78/100\n"
+    "Solid structure with one missing junction table.\n"
+)
+
+
+class StubOllama:
+    """Threaded stub server; ``requests`` records every chat payload it received."""
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        token_delay: float = 0.0,
+        reply: str = CANNED_REPLY,
+        host: str = "127.0.0.1",
+    ):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply = reply
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOllama":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _tokens(self) -> List[str]:
+        # Whitespace-preserving split so the streamed text reassembles exactly.
+        words = self.reply.split(" ")
+        return [w + " " for w in words[:-1]] + [words[-1]]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # Headers and body go out in separate writes; without this Nagle adds ~40 ms per reply.
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send_json(self, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": "llava:latest"}]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/chat":
+                    self.send_error(404)
+                    return
+                with stub._lock:
+                    stub.requests.append(payload)
+
+                started = time.perf_counter()
+                time.sleep(stub.latency)
+                tokens = stub._tokens()
+                final = {
+                    "model": payload.get("model", "llava"),
+                    "done": True,
+                    "load_duration": 0,
+                    "prompt_eval_count": len(json.dumps(payload)) // 4,
+                    "eval_count": len(tokens),
+                }
+
+                if not payload.get("stream", True):
+                    time.sleep(stub.token_delay * len(tokens))
+                    final["eval_duration"] = int(stub.token_delay * len(tokens) * 1e9)
+                    final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    final["message"] = {"role": "assistant", "content": stub.reply}
+                    self._send_json(final)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                gen_start = time.perf_counter()
+                for token in tokens:
+                    time.sleep(stub.token_delay)
+                    self._chunk({"message": {"role": "assistant", "content": token}, "done": False})
+                final["eval_duration"] = int((time.perf_counter() - gen_start) * 1e9)
+                final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                final["message"] = {"role": "assistant", "content": ""}
+                self._chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, body: Dict[str, Any]) -> None:
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per streamed token")
+    args = parser.parse_args()
+
+    stub = StubOllama(port=args.port, latency=args.latency, token_delay=args.token_delay).start()
+    print(f"Stub Ollama listening on {stub.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Shared, Streamlit-free building blocks used by the ERror Normalizer pages."""
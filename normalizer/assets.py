@@ -0,0 +1,129 @@
+"""
+Page styles and brand logos, built once per process.
+
+The pages used to carry their own copies of the same CSS and the landing page
+re-read and base64-encoded every logo on each rerun, then inlined each data
+URL twice (the marquee repeats its sequence). Here the CSS files under
+``styles/`` are concatenated per page and minified, the logos are minified
+and referenced once each from a CSS class, and the results are memoized so
+reruns only re-send strings that already exist.
+
+Streamlit's static file serving would be the natural home for these, but it
+serves anything other than images, fonts, PDF, XML and JSON as ``text/plain``
+with ``nosniff``, so browsers refuse ``.css`` and ``.svg`` from it. Run
+``python -m normalizer.assets`` to see the size of each bundle.
+"""
+import functools
+import os
+import re
+from typing import Dict, Tuple
+from urllib.parse import quote
+
+from normalizer import config
+
+STYLES_DIR = os.path.join(config.PROJECT_ROOT, "styles")
+LOGOS_DIR = os.path.join(config.PROJECT_ROOT, "logos")
+
+# Stylesheets for each page, in cascade order.
+PAGE_STYLES: Dict[str, Tuple[str, ...]] = {
+    "landing": ("base.css", "buttons.css", "landing.css"),
+    "upload": ("base.css", "buttons.css", "upload.css"),
+    "results": ("base.css", "buttons.css", "results.css"),
+    "batch": ("base.css", "buttons.css", "results.css"),
+}
+
+# (file stem, alt text) in marquee order.
+BRANDS: Tuple[Tuple[str, str], ...] = (
+    ("python", "Python"),
+    ("streamlit", "Streamlit"),
+    ("llava", "LLaVA"),
+    ("jaided", "Jaided"),
+    ("github", "GitHub"),
+    ("ollama", "Ollama"),
+)
+LOGO_HEIGHT_PX = 32
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and insignificant whitespace."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_svg(svg: str) -> str:
+    """Drop the XML prolog, comments and editor metadata, round path data, collapse whitespace and zeros."""
+    svg = re.sub(r"<\?xml.*?\?>|<!--.*?-->", "", svg, flags=re.S)
+    svg = re.sub(r"<metadata.*?</metadata>|<sodipodi:namedview.*?/>", "", svg, flags=re.S)
+    # Path coordinates to 2 decimals: far below a pixel at logo size.
+    svg = re.sub(r'\sd="[^"]*"', lambda m: re.sub(r"(\.\d\d)\d+", r"\1", m.group(0)), svg)
+    svg = re.sub(r"(\d)\.0+(?!\d)", r"\1", svg)  # 394.000000 -> 394
+    svg = re.sub(r"(\.\d*?[1-9])0+(?!\d)", r"\1", svg)  # 0.500000 -> 0.5
+    svg = re.sub(r"\s+", " ", svg)
+    return re.sub(r">\s+<", "><", svg).strip()
+
+
+def svg_data_url(svg: str) -> str:
+    """URL-encoded (not base64) SVG data URL; about a quarter smaller for path-heavy files."""
+    return "data:image/svg+xml," + quote(svg.replace('"', "'"), safe=" '=:/;,.-_()")
+
+
+def _aspect_ratio(svg: str) -> float:
+    box = re.search(r'viewBox="([\d.\s-]+)"', svg)
+    if box is None:
+        return 1.0
+    _, _, width, height = (float(v) for v in box.group(1).split())
+    return width / height if height else 1.0
+
+
+def _read(directory: str, name: str) -> str:
+    with open(os.path.join(directory, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def logo_css() -> str:
+    """One class per brand logo, each carrying its SVG once as a background image."""
+    rules = []
+    for stem, _ in BRANDS:
+        svg = _read(LOGOS_DIR, f"{stem}.svg")
+        width = round(LOGO_HEIGHT_PX * _aspect_ratio(svg))
+        rules.append(
+            f".dv-logo-{stem}{{width:{width}px;height:{LOGO_HEIGHT_PX}px;"
+            f'background:url("{svg_data_url(minify_svg(svg))}") center/contain no-repeat}}'
+        )
+    return "".join(rules)
+
+
+@functools.lru_cache(maxsize=None)
+def page_css(page: str) -> str:
+    """The ``<style>`` block for one page ("landing", "upload", "results" or "batch")."""
+    css = minify_css("\n".join(_read(STYLES_DIR, name) for name in PAGE_STYLES[page]))
+    if page == "landing":
+        css += logo_css()
+    return f"<style>{css}</style>"
+
+
+@functools.lru_cache(maxsize=None)
+def brands_html() -> str:
+    """The landing page's scrolling "Built using" strip."""
+    logos = "".join(
+        f'<div class="dv-brand-logo"><span class="dv-logo-{stem}" role="img" aria-label="{alt}"></span></div>'
+        for stem, alt in BRANDS
+    )
+    sequence = f'<div class="dv-brands-sequence">{logos}</div>'
+    return (
+        '<div class="dv-brands">'
+        '<div class="dv-brands-title">Built using the following tools</div>'
+        '<div class="dv-brands-marquee">'
+        # Two copies so the -50% scroll loops seamlessly
+        f'<div class="dv-brands-track">{sequence}{sequence}</div>'
+        "</div></div>"
+    )
+
+
+if __name__ == "__main__":
+    for name in PAGE_STYLES:
+        print(f"{name:>8} css {len(page_css(name).encode()) / 1024:6.1f} KB")
+    print(f"{'brands':>8} html {len(brands_html().encode()) / 1024:5.1f} KB")
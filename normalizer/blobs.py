@@ -0,0 +1,208 @@
+"""
+Content-addressed store for uploads and analysis results, shared by all sessions.
+
+Session state used to hold each upload's bytes and the full results payload
+(raw replies, OCR text) for as long as the tab lived, so idle tabs kept
+server memory growing. Sessions now keep only digests; the data lives here.
+
+Each blob is a file named by the SHA-256 of its content, so identical uploads
+from different sessions are stored once. Reads memory-map the file: the pages
+are file-backed, so the OS can drop them under pressure, and at most
+ERN_BLOB_MEMORY_MB of blobs stay mapped (least recently used first out).
+Decoded JSON results count against the same budget. Files beyond
+ERN_BLOB_DISK_MB are deleted oldest-use first; a session whose upload is gone
+is asked to upload again, and a session whose results are gone gets them
+back from the analysis cache.
+"""
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from normalizer import config
+from normalizer import metrics
+
+
+def digest(data: bytes) -> str:
+    """The key a blob is stored under (same as ``cache.image_digest``)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Files on disk keyed by content digest, with an LRU of mapped/decoded blobs in memory."""
+
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        # ("raw" or "json:<view>", digest) -> (mmap or decoded value, bytes charged to the budget)
+        self._resident: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._resident_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._disk_used = sum(e.stat().st_size for e in os.scandir(directory) if e.is_file() and e.name[0] != ".")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` (once per distinct content) and return its digest."""
+        key = digest(data)
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # counts as a use for disk eviction
+            except OSError:
+                pass
+            with self._lock:
+                self.deduplicated += 1
+            metrics.REGISTRY.inc("ern_blobs_total", "Blob store writes by outcome.", outcome="deduplicated")
+            return key
+        # Written under a temporary name and renamed, so readers never see a partial blob.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_used += len(data)
+            over = self._disk_used > self.disk_bytes
+        metrics.REGISTRY.inc("ern_blobs_total", "Blob store writes by outcome.", outcome="stored")
+        if over:
+            self._evict_disk(keep=key)
+        return key
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """The blob's bytes, read-only and without copying; None if it is not (or no longer) stored."""
+        with self._lock:
+            entry = self._resident.get(("raw", key))
+            if entry is not None:
+                self._resident.move_to_end(("raw", key))
+                self.hits += 1
+                return memoryview(entry[0])
+        try:
+            with open(self._path(key), "rb") as fh:
+                size = os.fstat(fh.fileno()).st_size
+                # A zero-length file cannot be mapped.
+                mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.misses += 1
+            self._remember(("raw", key), mapped, size)
+        return memoryview(mapped)
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Like ``get`` but a copy, for callers that need real ``bytes``."""
+        view = self.get(key)
+        return None if view is None else view.tobytes()
+
+    def put_json(self, value: Any) -> str:
+        return self.put(json.dumps(value, sort_keys=True).encode("utf-8"))
+
+    def get_json(self, key: str, prepare: Optional[Callable[[Any], Any]] = None, view: str = "") -> Any:
+        """
+        A JSON blob decoded (and passed through ``prepare``) once and kept while it
+        fits the memory budget. ``view`` names what ``prepare`` makes, so callers that
+        prepare the same blob differently get their own copies. Every session gets
+        the same object: treat it as read-only.
+        """
+        entry_key = ("json:" + view, key)
+        with self._lock:
+            entry = self._resident.get(entry_key)
+            if entry is not None:
+                self._resident.move_to_end(entry_key)
+                self.hits += 1
+                return entry[0]
+        view = self.get(key)
+        if view is None:
+            return None
+        size = len(view)
+        value = json.loads(view.tobytes())
+        del view
+        if prepare is not None:
+            value = prepare(value)
+        with self._lock:
+            # Decoded, the mapping is no longer needed; don't charge the budget for both.
+            raw = self._resident.pop(("raw", key), None)
+            if raw is not None:
+                self._resident_bytes -= raw[1]
+            self._remember(entry_key, value, size)
+        return value
+
+    def _remember(self, entry: Tuple[str, str], value: Any, size: int) -> None:
+        """Add to the resident LRU and drop the oldest entries over budget (call with the lock held)."""
+        if entry in self._resident:
+            self._resident_bytes -= self._resident.pop(entry)[1]
+        self._resident[entry] = (value, size)
+        self._resident_bytes += size
+        while self._resident_bytes > self.memory_bytes and len(self._resident) > 1:
+            _, (_, dropped) = self._resident.popitem(last=False)
+            self._resident_bytes -= dropped
+            # Not closed: a memoryview handed out earlier may still use the mapping, which is
+            # unmapped once the last one is released.
+            metrics.REGISTRY.inc("ern_blob_evictions_total", "Blobs dropped from memory or disk.", tier="memory")
+
+    def _evict_disk(self, keep: str) -> None:
+        """Delete least recently used files until the store fits its disk budget."""
+        entries = []
+        used = 0
+        for e in os.scandir(self.directory):
+            if e.is_file() and e.name[0] != ".":
+                st = e.stat()
+                used += st.st_size
+                if e.name != keep:
+                    entries.append((st.st_mtime, e.name, st.st_size))
+        entries.sort()
+        with self._lock:
+            self._disk_used = used  # re-synced: concurrent puts of the same new blob count it twice
+        for _, name, size in entries:
+            with self._lock:
+                if self._disk_used <= self.disk_bytes:
+                    return
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                continue  # in use on platforms that lock open files; try the next one
+            with self._lock:
+                self._disk_used -= size
+                for entry in [e for e in self._resident if e[1] == name]:
+                    self._resident_bytes -= self._resident.pop(entry)[1]
+            metrics.REGISTRY.inc("ern_blob_evictions_total", "Blobs dropped from memory or disk.", tier="disk")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "resident": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "memory_bytes": self.memory_bytes,
+                "disk_used": self._disk_used,
+                "hits": self.hits,
+                "misses": self.misses,
+                "deduplicated": self.deduplicated,
+            }
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> BlobStore:
+    """Return the process-wide blob store."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = BlobStore(config.BLOB_DIR, config.BLOB_MEMORY_BYTES, config.BLOB_DISK_BYTES)
+        return _STORE
@@ -0,0 +1,182 @@
+"""
+Persistent, content-addressed cache for analysis results.
+
+Entries are keyed on the SHA-256 of the uploaded bytes plus everything that
+changes the model's answer (pipeline, prompt, model name, options), so the same
+diagram returns instantly for any session, process or restart. Storage is a
+single SQLite file with size-bounded LRU eviction and a TTL.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from normalizer import config
+
+
+def image_digest(data: bytes) -> str:
+    """Stable content digest for uploaded image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(digest: str, method: str, prompt: str, model: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Derive a cache key from the image digest and every input that affects the output."""
+    material = json.dumps(
+        {"digest": digest, "method": method, "prompt": prompt, "model": model, "options": options or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed key/value store for JSON-serialisable result dicts."""
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation keeps us safe across Streamlit's threads.
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(False)
+                return None
+            value, created = row
+            if now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count(False)
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self._count(True)
+        return json.loads(value)
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        """Like ``get`` but without touching LRU order or the hit/miss counters."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        blob = json.dumps(value)
+        size = len(blob.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least-recently-used ones until we fit the size budget."""
+        conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (result, was_cached). Freshly computed results are stored unless
+        they are flagged with ``"error": True`` so transient failures aren't replayed.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        value = compute()
+        if not value.get("error"):
+            self.put(key, value)
+        return value, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+
+class _NullCache:
+    """Stand-in used when caching is disabled; always computes."""
+
+    hits = 0
+    misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def peek(self, key: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        return compute(), False
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide analysis cache."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            if config.CACHE_ENABLED:
+                _CACHE = AnalysisCache(config.CACHE_PATH, config.CACHE_MAX_BYTES, config.CACHE_TTL_SECONDS)
+            else:
+                _CACHE = _NullCache()
+        return _CACHE
@@ -0,0 +1,217 @@
+"""
+Headless batch validation for directories of diagrams.
+
+    python -m normalizer diagrams/ --method llava_image --workers 4 --output results.jsonl
+
+Each diagram becomes one JSON line (score, sections, timings) written as soon
+as it finishes. Re-running with the same ``--output`` skips diagrams that
+already have a successful record, so an interrupted audit resumes where it
+stopped. Ollama calls run on a thread pool; EasyOCR runs on a process pool
+because it is CPU/GPU bound.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from PIL import Image
+
+from normalizer import cache as analysis_cache
+from normalizer import imaging
+from normalizer import metrics
+from normalizer import parsing
+from normalizer import pipelines
+from normalizer import scheduler
+from normalizer import similarity
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def collect_paths(targets: Iterable[str]) -> List[str]:
+    """Expand directories (recursively) and glob patterns into a sorted list of image files."""
+    found = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for root, _, files in os.walk(target):
+                found.update(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            found.update(p for p in glob.glob(target, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(os.path.normpath(p) for p in found)
+
+
+def completed_paths(output_path: str) -> Set[str]:
+    """Paths that already have a successful record in a (possibly partial) output file."""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from an interrupted run; that diagram gets redone.
+                continue
+            if not record.get("error"):
+                done.add(record.get("path"))
+    return done
+
+
+def _ocr_in_process(image_bytes: bytes) -> Dict[str, Any]:
+    """Process-pool entry point: each worker process keeps its own warm reader pool."""
+    start = time.perf_counter()
+    payload = pipelines.run_ocr(Image.open(BytesIO(image_bytes)))
+    payload["_seconds"] = time.perf_counter() - start
+    return payload
+
+
+def analyze_file(path: str, method: str, ocr_pool: Optional[ProcessPoolExecutor]) -> Dict[str, Any]:
+    """Run one diagram through the chosen pipeline and build its output record."""
+    # Worker threads start with an empty context, so the pipeline label and scheduling policy are
+    # set per file. Batch work queues behind interactive sessions and is never shed.
+    with metrics.pipeline(method), scheduler.policy(priority=scheduler.BATCH, shed=False):
+        return _analyze_file(path, method, ocr_pool)
+
+
+def _analyze_file(path: str, method: str, ocr_pool: Optional[ProcessPoolExecutor]) -> Dict[str, Any]:
+    cache = analysis_cache.get_cache()
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    with open(path, "rb") as fh:
+        image_bytes = fh.read()
+    digest = analysis_cache.image_digest(image_bytes)
+
+    t = time.perf_counter()
+    image = Image.open(BytesIO(image_bytes))
+    image.load()
+    timings["decode"] = time.perf_counter() - t
+
+    record: Dict[str, Any] = {"path": path, "method": method, "digest": digest}
+
+    if method == "ocr_llm":
+        def compute_ocr() -> Dict[str, Any]:
+            if ocr_pool is None:
+                return pipelines.run_ocr(image)
+            payload = ocr_pool.submit(_ocr_in_process, image_bytes).result()
+            timings["ocr_worker"] = payload.pop("_seconds")
+            return payload
+
+        t = time.perf_counter()
+        ocr_payload, ocr_cached = cache.get_or_compute(pipelines.ocr_cache_key(digest), compute_ocr)
+        timings["ocr"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        result, llm_cached = cache.get_or_compute(
+            pipelines.ocr_llm_cache_key(digest, ocr_payload),
+            lambda: pipelines.analyze_ocr_with_llava(ocr_payload),
+        )
+        timings["llm"] = time.perf_counter() - t
+        record["cached"] = ocr_cached and llm_cached
+        record["extracted_text"] = ocr_payload.get("extracted_text", "")
+        record["ocr_cleanup"] = ocr_payload.get("cleanup")
+        record["ocr_entities"] = ocr_payload.get("entities", [])
+    elif method == "hybrid":
+        # OCR and encoding already overlap inside run_hybrid, so OCR stays in this worker thread.
+        hybrid = pipelines.run_hybrid(image, digest, len(image_bytes))
+        result, ocr_payload = hybrid["llmresults"], hybrid["ocrresults"]
+        timings.update(hybrid["timings"])
+        record["cached"] = hybrid["cached"]["ocr"] and hybrid["cached"]["llm"]
+        record["extracted_text"] = hybrid["ocrresults"].get("extracted_text", "")
+        record["ocr_cleanup"] = hybrid["ocrresults"].get("cleanup")
+        record["ocr_entities"] = hybrid["ocrresults"].get("entities", [])
+        record["image_stats"] = result.get("image_stats")
+    else:
+        t = time.perf_counter()
+        encoded = imaging.encode_for_model(image, digest, len(image_bytes))
+        timings["encode"] = time.perf_counter() - t
+        record["image_stats"] = encoded.stats()
+
+        if method == "llava_image":
+            key, fn = pipelines.vision_cache_key(digest), pipelines.analyze_diagram_with_llava
+        else:
+            key, fn = pipelines.extract_cache_key(digest), pipelines.extract_with_llava
+
+        t = time.perf_counter()
+        result, record["cached"] = cache.get_or_compute(key, lambda: fn(image, digest=digest))
+        timings["llm"] = time.perf_counter() - t
+
+    # Over the OCR entities the prompt was told about, otherwise over the entities in the reply.
+    if method in ("ocr_llm", "hybrid"):
+        report, source = pipelines.ocr_rules(ocr_payload), "ocr"
+    else:
+        report, source = pipelines.reply_rules(result), "reply"
+    if report is not None:
+        record["rules"] = {**report.as_dict(), "source": source}
+
+    timings["total"] = time.perf_counter() - started
+    parsed = parsing.from_result(result)
+    record.update({
+        "score": result.get("score"),
+        "error": bool(result.get("error")),
+        "model": result.get("model"),
+        "sections": [{"title": sec.title, "body": sec.body} for sec in parsed.sections],
+        "entities": parsing.entities_to_dicts(parsed.entities),
+        "relationships": [r._asdict() for r in parsed.relationships],
+        "timings": {k: round(v, 4) for k, v in timings.items()},
+    })
+    index = similarity.get_index()
+    if index is not None and not record["error"]:
+        index.add(digest, similarity.signature(image))  # later uploads of this diagram can reuse the result
+    return record
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m normalizer",
+        description="Validate a batch of ERD images without the Streamlit UI.",
+    )
+    parser.add_argument("targets", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("--method", choices=sorted(pipelines.METHOD_LABELS), default="llava_image")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent diagrams (threads for Ollama I/O)")
+    parser.add_argument("--ocr-processes", type=int, default=1, help="Process pool size for EasyOCR (0 runs OCR in-thread)")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file to append to and resume from")
+    args = parser.parse_args(argv)
+
+    paths = collect_paths(args.targets)
+    done = completed_paths(args.output)
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} diagrams found, {len(paths) - len(todo)} already done, {len(todo)} to run", file=sys.stderr)
+    if not todo:
+        return 0
+
+    ocr_pool = None
+    if args.method == "ocr_llm" and args.ocr_processes > 0:
+        ocr_pool = ProcessPoolExecutor(max_workers=args.ocr_processes)
+
+    failures = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool, \
+                open(args.output, "a", encoding="utf-8") as out:
+            futures: Dict[Future, str] = {pool.submit(analyze_file, p, args.method, ocr_pool): p for p in todo}
+            for n, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"path": path, "method": args.method, "error": True, "message": str(e)}
+                failures += bool(record.get("error"))
+                # Written from this thread only, one full line at a time, so a crash tears at most one line.
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                status = "error" if record.get("error") else f"score {record.get('score')}"
+                print(f"[{n}/{len(todo)}] {path}: {status}", file=sys.stderr)
+    finally:
+        if ocr_pool is not None:
+            ocr_pool.shutdown()
+        metrics.export()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
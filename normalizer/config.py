@@ -0,0 +1,160 @@
+"""
+Runtime settings for ERror Normalizer.
+
+Every value can be overridden with an environment variable so deployments can
+be tuned without touching the code.
+"""
+import os
+
+# Repository root, so relative data paths don't depend on where Streamlit was launched.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting, falling back to the default on bad input."""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting ("1", "true", "yes", "on" are truthy)."""
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- OCR ---
+# Maximum number of warm EasyOCR readers kept per (languages, device) pair.
+OCR_POOL_SIZE = max(1, env_int("ERN_OCR_POOL_SIZE", 2))
+# Set to false to force EasyOCR onto the CPU even when a GPU is available.
+OCR_USE_GPU = env_bool("ERN_OCR_USE_GPU", True)
+# Images whose longest edge exceeds this are OCR'd in overlapping tiles (0 disables tiling).
+# EasyOCR's detector shrinks anything larger than its 2560 px canvas, which loses small text.
+OCR_TILE_THRESHOLD = max(0, env_int("ERN_OCR_TILE_THRESHOLD", 2560))
+OCR_TILE_SIZE = max(256, env_int("ERN_OCR_TILE_SIZE", 1600))
+# Overlap must be wider than the longest label so every word is whole in at least one tile.
+OCR_TILE_OVERLAP = max(0, env_int("ERN_OCR_TILE_OVERLAP", 200))
+# Filter gibberish and spell-correct OCR text locally before it is sent to the LLM.
+OCR_CLEANUP = env_bool("ERN_OCR_CLEANUP", True)
+# Lines EasyOCR is less sure of than this (0-100) are dropped unless they contain a known word.
+OCR_MIN_CONFIDENCE = min(100, max(0, env_int("ERN_OCR_MIN_CONFIDENCE", 40))) / 100
+# Extra word list (one per line) accepted as correct spelling; ignored if the file is missing.
+OCR_DICTIONARY = os.environ.get("ERN_OCR_DICTIONARY", "/usr/share/dict/words")
+# Group OCR boxes into entities by position and prompt with one "Entity: attributes" line each.
+OCR_GROUPING = env_bool("ERN_OCR_GROUPING", True)
+
+# --- Rule checks ---
+# Check the extracted entities locally (keys, duplicates, naming) and tell the OCR prompts
+# what was already checked so the model does not redo it.
+RULES = env_bool("ERN_RULES", True)
+
+# --- Session store ---
+# Uploads and results live in one content-addressed store; sessions keep only digests.
+BLOB_DIR = os.environ.get("ERN_BLOB_DIR", os.path.join(PROJECT_ROOT, ".cache", "blobs"))
+# Blobs kept memory-mapped (and results kept decoded) at once, across all sessions.
+BLOB_MEMORY_BYTES = max(1, env_int("ERN_BLOB_MEMORY_MB", 256)) * 1024 * 1024
+# Least recently used blobs are deleted beyond this; their sessions are asked to upload again.
+BLOB_DISK_BYTES = max(1, env_int("ERN_BLOB_DISK_MB", 2048)) * 1024 * 1024
+
+# --- Analysis cache ---
+CACHE_ENABLED = env_bool("ERN_CACHE_ENABLED", True)
+CACHE_PATH = os.environ.get("ERN_CACHE_PATH", os.path.join(PROJECT_ROOT, ".cache", "analysis.sqlite3"))
+CACHE_MAX_BYTES = max(1, env_int("ERN_CACHE_MAX_MB", 256)) * 1024 * 1024
+CACHE_TTL_SECONDS = max(1, env_int("ERN_CACHE_TTL_HOURS", 24 * 7)) * 3600
+
+# --- Near-duplicate reuse ---
+# "offer" asks before reusing a near-identical earlier upload's result, "serve" reuses it
+# straight away, "off" disables perceptual matching.
+SIMILARITY_MODE = os.environ.get("ERN_SIMILARITY_MODE", "offer").strip().lower()
+if SIMILARITY_MODE not in ("off", "offer", "serve"):
+    SIMILARITY_MODE = "offer"
+# Max differing bits (dHash + pHash, out of 128) for two uploads to count as the same diagram.
+# Rescaled and re-compressed copies land under 10, 1% crops under 24; unrelated diagrams sit above 40.
+SIMILARITY_THRESHOLD = max(0, env_int("ERN_SIMILARITY_THRESHOLD", 24))
+# Width/height ratios may differ by at most this fraction (crops are fine, other diagrams are not).
+SIMILARITY_MAX_ASPECT_DRIFT = max(0, env_int("ERN_SIMILARITY_ASPECT_DRIFT_PCT", 10)) / 100
+
+# --- Ollama ---
+# Stream tokens from Ollama and render section cards as they arrive.
+OLLAMA_STREAM = env_bool("ERN_OLLAMA_STREAM", True)
+# Ask for a JSON reply constrained by a schema (Ollama "format") instead of a Markdown report.
+# Replies are no longer previewed while streaming, since partial JSON has no sections yet.
+OLLAMA_JSON_MODE = env_bool("ERN_OLLAMA_JSON", False)
+# Same variable the Ollama CLI uses; a bare "host:port" is accepted.
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.environ.get("ERN_OLLAMA_MODEL", "llava")
+# Optional smaller/larger models for simple/complex diagrams (empty: use ERN_OLLAMA_MODEL).
+# "scheme://name" selects a backend registered in normalizer.models instead of Ollama.
+MODEL_SMALL = os.environ.get("ERN_MODEL_SMALL", "").strip()
+MODEL_LARGE = os.environ.get("ERN_MODEL_LARGE", "").strip()
+# Tried in order after the routed model (and ERN_OLLAMA_MODEL) time out or error.
+MODEL_FALLBACKS = tuple(m.strip() for m in os.environ.get("ERN_MODEL_FALLBACKS", "").split(",") if m.strip())
+# Complexity thresholds: OCR text boxes when OCR ran, otherwise image megapixels.
+ROUTE_SMALL_MAX_BOXES = max(0, env_int("ERN_ROUTE_SMALL_MAX_BOXES", 15))
+ROUTE_LARGE_MIN_BOXES = max(1, env_int("ERN_ROUTE_LARGE_MIN_BOXES", 80))
+ROUTE_SMALL_MAX_MP = max(0, env_int("ERN_ROUTE_SMALL_MAX_KPX", 1000)) / 1000
+ROUTE_LARGE_MIN_MP = max(1, env_int("ERN_ROUTE_LARGE_MIN_KPX", 6000)) / 1000
+# How long Ollama keeps a model loaded after each request ("30m", "2h", seconds, "-1" = forever,
+# "" = Ollama's own default of 5 minutes). Sent with every chat and warmup request.
+OLLAMA_KEEP_ALIVE = os.environ.get("ERN_OLLAMA_KEEP_ALIVE", "30m").strip()
+# Load the routed models in the background when the app starts, so no analysis pays the load.
+OLLAMA_WARMUP = env_bool("ERN_OLLAMA_WARMUP", True)
+OLLAMA_CONNECT_TIMEOUT = max(1, env_int("ERN_OLLAMA_CONNECT_TIMEOUT", 5))
+OLLAMA_READ_TIMEOUT = max(1, env_int("ERN_OLLAMA_TIMEOUT", 120))
+# Retries apply to connection failures and 5xx responses, with jittered exponential backoff.
+OLLAMA_RETRIES = max(0, env_int("ERN_OLLAMA_RETRIES", 2))
+OLLAMA_BACKOFF_BASE = max(1, env_int("ERN_OLLAMA_BACKOFF_MS", 500)) / 1000
+OLLAMA_BACKOFF_MAX = max(1, env_int("ERN_OLLAMA_BACKOFF_MAX_MS", 8000)) / 1000
+# Keep-alive connections held open per host by the shared session.
+OLLAMA_POOL_SIZE = max(1, env_int("ERN_OLLAMA_POOL_SIZE", 8))
+# Chat requests allowed in flight at once; match Ollama's OLLAMA_NUM_PARALLEL.
+OLLAMA_MAX_IN_FLIGHT = max(1, env_int("ERN_OLLAMA_MAX_IN_FLIGHT", 1))
+# Interactive requests waiting beyond this are turned away with a "busy" result.
+OLLAMA_QUEUE_SIZE = max(0, env_int("ERN_OLLAMA_QUEUE_SIZE", 8))
+# Give up on an interactive request that has queued this long (0 waits forever).
+OLLAMA_QUEUE_TIMEOUT = max(0, env_int("ERN_OLLAMA_QUEUE_TIMEOUT", 300))
+
+# --- Background jobs ---
+# Analyses running at once in the background (model calls still queue in the scheduler above).
+JOB_WORKERS = max(1, env_int("ERN_JOB_WORKERS", 4))
+# Finished jobs stay available to pages polling for them this long, up to JOB_HISTORY jobs.
+JOB_RETENTION_SECONDS = max(1, env_int("ERN_JOB_RETENTION_MINUTES", 30)) * 60
+JOB_HISTORY = max(1, env_int("ERN_JOB_HISTORY", 50))
+# Diagrams of one multi-file or PDF upload analysed at once; the rest wait their turn.
+BATCH_PARALLEL = max(1, env_int("ERN_BATCH_PARALLEL", 2))
+
+# --- PDF uploads ---
+# Resolution PDF pages are rasterized at (72 = PDF points 1:1); 150 keeps small labels readable for OCR.
+PDF_DPI = min(600, max(36, env_int("ERN_PDF_DPI", 150)))
+# Pages read from one PDF; later pages are ignored.
+PDF_MAX_PAGES = max(1, env_int("ERN_PDF_MAX_PAGES", 50))
+
+# --- Image preparation ---
+# Long-edge cap for images sent to the vision model (0 disables resizing). LLaVA 1.6
+# tiles inputs into 336 px crops up to 672x672/336x1344, so 1344 keeps labels legible
+# without paying for pixels the encoder throws away.
+IMAGE_MAX_EDGE = max(0, env_int("ERN_IMAGE_MAX_EDGE", 1344))
+# Candidate encodings, smallest wins. WebP is opt-in because not every Ollama build decodes it.
+IMAGE_FORMATS = tuple(
+    f.strip().upper() for f in os.environ.get("ERN_IMAGE_FORMATS", "PNG,JPEG").split(",") if f.strip()
+)
+IMAGE_JPEG_QUALITY = min(100, max(1, env_int("ERN_IMAGE_JPEG_QUALITY", 90)))
+# Encoded payloads memoized per image digest.
+IMAGE_MEMO_SIZE = max(0, env_int("ERN_IMAGE_MEMO_SIZE", 32))
+
+# --- Previews ---
+# Width of the preview images pages show instead of the full upload. Streamlit shrinks and
+# re-encodes anything wider than 1460 px on every rerun, so larger values are capped.
+PREVIEW_WIDTH = min(1460, max(64, env_int("ERN_PREVIEW_WIDTH", 1024)))
+PREVIEW_JPEG_QUALITY = min(100, max(1, env_int("ERN_PREVIEW_JPEG_QUALITY", 85)))
+# Previews kept in memory for all sessions (each is typically 50-300 KB).
+PREVIEW_MEMO_SIZE = max(0, env_int("ERN_PREVIEW_MEMO_SIZE", 64))
+
+# --- Metrics ---
+# Prometheus text file rewritten after every analysis ("" disables the file).
+METRICS_FILE = os.environ.get("ERN_METRICS_FILE", os.path.join(PROJECT_ROOT, ".cache", "metrics.prom"))
+# Serve /metrics on this port from a background thread (0 disables the endpoint).
+METRICS_PORT = max(0, env_int("ERN_METRICS_PORT", 0))
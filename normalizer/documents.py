@@ -0,0 +1,86 @@
+"""
+Turns uploaded files into the diagrams to analyse.
+
+An image is one diagram; a PDF is one diagram per page. Pages are rasterized
+lazily at ``ERN_PDF_DPI`` by the job that analyses them, so a 30-page design
+review costs only a page count at upload time and is never held fully
+rendered in memory. PDF support needs the optional ``pypdfium2`` package,
+imported on first use so the pages that never see a PDF don't pay for it.
+"""
+import hashlib
+import threading
+from io import BytesIO
+from typing import Callable, List, NamedTuple, Optional
+
+from normalizer import config
+
+IMAGE_TYPES = ("png", "jpg", "jpeg")
+
+# PDFium is not thread-safe; page renders from parallel jobs take turns.
+_PDFIUM_LOCK = threading.Lock()
+
+
+class PdfUnavailable(RuntimeError):
+    """Raised when a PDF is uploaded but pypdfium2 is not installed."""
+
+
+class Diagram(NamedTuple):
+    name: str  # file name, plus the page for PDFs ("review.pdf · page 3")
+    source: str  # digest of the uploaded file and page; stable across sessions
+    load: Callable[[], bytes]  # the diagram as image bytes (renders PDF pages on call)
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:5] == b"%PDF-"
+
+
+def _pdfium():
+    try:
+        import pypdfium2
+    except ImportError as e:
+        raise PdfUnavailable("PDF uploads need the pypdfium2 package (pip install pypdfium2).") from e
+    return pypdfium2
+
+
+def pdf_page_count(data: bytes) -> int:
+    pdfium = _pdfium()
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def render_pdf_page(data: bytes, index: int, dpi: int = 0) -> bytes:
+    """Rasterize page ``index`` (0-based) at ``dpi`` (default ERN_PDF_DPI) to PNG bytes."""
+    pdfium = _pdfium()
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            page = pdf[index]
+            image = page.render(scale=(dpi or config.PDF_DPI) / 72).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+    buf = BytesIO()
+    image.convert("RGB").save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def expand(name: str, data: bytes, read: Optional[Callable[[], bytes]] = None) -> List[Diagram]:
+    """
+    The diagrams in one uploaded file (PDFs beyond ERN_PDF_MAX_PAGES are truncated).
+    ``read`` fetches the file again when a diagram is loaded, so the diagrams need
+    not hold ``data`` until then.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    if read is None:
+        read = lambda: data  # noqa: E731
+    if not is_pdf(data):
+        return [Diagram(name, digest, read)]
+    pages = min(pdf_page_count(data), config.PDF_MAX_PAGES)
+    return [
+        Diagram(f"{name} · page {i + 1}", f"{digest}#p{i + 1}", lambda i=i: render_pdf_page(read(), i))
+        for i in range(pages)
+    ]
@@ -0,0 +1,126 @@
+"""
+Image preparation for the vision model.
+
+Full-resolution screenshots turn into multi-megabyte JSON bodies even though
+LLaVA resizes them internally. Before sending, we cap the long edge, try each
+configured encoding and keep the smallest, and memoize the result per image
+digest so reruns and repeat pipelines don't re-encode.
+"""
+import base64
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from normalizer import config
+from normalizer import metrics
+
+
+class EncodedImage(NamedTuple):
+    b64: str
+    format: str
+    width: int
+    height: int
+    original_bytes: int
+    encoded_bytes: int
+    encode_seconds: float
+
+    def stats(self) -> Dict[str, Any]:
+        """JSON-friendly summary for result payloads (everything except the payload itself)."""
+        return {k: v for k, v in self._asdict().items() if k != "b64"}
+
+
+_MEMO: "OrderedDict[Tuple[Any, ...], EncodedImage]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+def encoding_settings() -> Dict[str, Any]:
+    """Settings that change the bytes sent to the model; part of analysis cache keys."""
+    return {
+        "max_edge": config.IMAGE_MAX_EDGE,
+        "formats": list(config.IMAGE_FORMATS),
+        "jpeg_quality": config.IMAGE_JPEG_QUALITY,
+    }
+
+
+def downscale(image: Image.Image, max_edge: int) -> Image.Image:
+    """Shrink so the long edge is at most ``max_edge``; never upscales."""
+    if max_edge <= 0 or max(image.size) <= max_edge:
+        return image
+    scale = max_edge / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """Drop alpha onto a white background; diagrams exported with transparency read as black otherwise."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, "white")
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buf = BytesIO()
+    if fmt == "JPEG":
+        image.save(buf, format="JPEG", quality=config.IMAGE_JPEG_QUALITY)
+    elif fmt == "WEBP":
+        image.save(buf, format="WEBP", quality=config.IMAGE_JPEG_QUALITY)
+    else:
+        image.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def encode_for_model(
+    image: Image.Image,
+    digest: Optional[str] = None,
+    original_bytes: int = 0,
+) -> EncodedImage:
+    """
+    Downscale and encode an image for Ollama, returning the smallest candidate.
+    The encoded payload is memoized when a content ``digest`` is supplied;
+    ``original_bytes`` and ``encode_seconds`` always describe this call.
+    """
+    start = time.perf_counter()
+    settings = encoding_settings()
+    key = (digest, settings["max_edge"], tuple(settings["formats"]), settings["jpeg_quality"])
+    if digest is not None:
+        with _MEMO_LOCK:
+            hit = _MEMO.get(key)
+            if hit is not None:
+                _MEMO.move_to_end(key)
+        if hit is not None:
+            # Only the payload is shared; the stats describe this call.
+            return hit._replace(original_bytes=original_bytes, encode_seconds=time.perf_counter() - start)
+
+    prepared = flatten(downscale(image, config.IMAGE_MAX_EDGE))
+    best_fmt, best_data = None, None
+    for fmt in config.IMAGE_FORMATS or ("PNG",):
+        data = _encode(prepared, fmt)
+        if best_data is None or len(data) < len(best_data):
+            best_fmt, best_data = fmt, data
+    b64 = base64.b64encode(best_data).decode("utf-8")
+
+    encoded = EncodedImage(
+        b64=b64,
+        format=best_fmt,
+        width=prepared.width,
+        height=prepared.height,
+        original_bytes=original_bytes,
+        encoded_bytes=len(b64),
+        encode_seconds=time.perf_counter() - start,
+    )
+    # Memo hits return above, so the histogram only sees real encodes.
+    metrics.observe("encode", encoded.encode_seconds)
+
+    if digest is not None and config.IMAGE_MEMO_SIZE > 0:
+        with _MEMO_LOCK:
+            _MEMO[key] = encoded
+            while len(_MEMO) > config.IMAGE_MEMO_SIZE:
+                _MEMO.popitem(last=False)
+    return encoded
@@ -0,0 +1,488 @@
+"""
+Background analysis jobs.
+
+An analysis holds a minute or two of LLaVA time. Run inline in the Streamlit
+script it lived and died with that script: navigating away, refreshing or a
+websocket reconnect stopped it or started it again, and the server thread sat
+blocked meanwhile. Analyses now run on a process-wide worker pool as jobs.
+
+A job is found by its id, which the results page keeps in session state and
+in the URL, and by its key (mode + image digests). Submitting a key that is
+already queued or running returns that job instead of starting another, so a
+refreshed page, a second tab or a double click all attach to the one
+in-flight analysis. Jobs record the progress lines the page used to write,
+the streamed reply so far and the queue position; any rerun redraws the
+status from them. Finished jobs are kept for ERN_JOB_RETENTION_MINUTES so a
+late poll still finds the result.
+
+A ``Batch`` is every diagram from one multi-file or PDF upload. It keeps at
+most ERN_BATCH_PARALLEL of its diagrams in flight and submits the next one as
+each finishes, so a 30-page PDF neither takes over the worker pool nor
+rasterizes pages before a worker is ready for them. Batch analyses queue
+behind interactive ones for the model and are never shed.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from normalizer import blobs
+from normalizer import cache as analysis_cache
+from normalizer import config
+from normalizer import documents
+from normalizer import imaging
+from normalizer import metrics
+from normalizer import pipelines
+from normalizer import rules
+from normalizer import scheduler
+from normalizer import similarity
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class Job:
+    """One background analysis and everything a page needs to show its progress."""
+
+    def __init__(self, key: str, label: str, request: Any = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.label = label
+        self.request = request  # what was submitted, so a page that lost its session can restore it
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error = ""
+        self.attached = 1  # submissions served by this job, coalesced ones included
+        self._lock = threading.Lock()
+        self._log: List[str] = []
+        self._text = ""
+        self._queue_position = 0
+        self._shared: Dict[str, Any] = {}
+        self._finished = threading.Event()
+        self._callbacks: List[Callable[["Job"], None]] = []
+
+    # Called from the worker thread while the job runs.
+    def note(self, message: str) -> None:
+        """Append a line to the progress log."""
+        with self._lock:
+            self._log.append(message)
+
+    def stream(self, text: str) -> None:
+        """Replace the streamed reply text (``on_text`` callback)."""
+        with self._lock:
+            self._text = text
+
+    def wait_in_queue(self, position: int) -> None:
+        """Record the model queue position (scheduler ``on_wait`` callback); 0 once admitted."""
+        with self._lock:
+            self._queue_position = position
+
+    def share(self, name: str, value: Any) -> None:
+        """Publish an intermediate result (rule findings) for pages to show before the job ends."""
+        with self._lock:
+            self._shared[name] = value
+
+    # Read from any thread.
+    def shared(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._shared)
+
+    def progress(self) -> Tuple[List[str], str, int]:
+        """(log lines, streamed text, queue position) as of now."""
+        with self._lock:
+            return list(self._log), self._text, self._queue_position
+
+    @property
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes; return whether it did within ``timeout``."""
+        return self._finished.wait(timeout)
+
+    def add_done_callback(self, fn: Callable[["Job"], None]) -> None:
+        """Call ``fn(job)`` once the job finishes (right away if it already has)."""
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self) -> None:
+        with self._lock:
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def seconds(self) -> float:
+        """Run time so far, or the whole run once finished."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict view for the job-status table."""
+        _, _, position = self.progress()
+        return {
+            "job": self.id,
+            "analysis": self.label,
+            "state": self.state,
+            "queue": position or None,
+            "sessions": self.attached,
+            "age_s": round(time.time() - self.created_at),
+            "run_s": round(self.seconds(), 1),
+            "error": self.error,
+        }
+
+
+class JobPool:
+    """Worker threads running jobs, with coalescing of in-flight duplicates and bounded history."""
+
+    def __init__(self, workers: int, retention_seconds: float, history: int):
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ern-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}  # insertion order = submission order
+        self._active: Dict[str, Job] = {}  # key -> queued or running job
+        self._batches: Dict[str, "Batch"] = {}
+        self._counts = dict.fromkeys(("submitted", "coalesced", DONE, FAILED), 0)
+
+    def submit(
+        self,
+        key: str,
+        label: str,
+        fn: Callable[[Job], Dict[str, Any]],
+        request: Any = None,
+    ) -> Job:
+        """Run ``fn(job)`` in the background, or return the queued/running job for ``key``."""
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                job.attached += 1
+                self._counts["coalesced"] += 1
+                metrics.REGISTRY.inc("ern_jobs_total", "Analysis jobs by outcome.", outcome="coalesced")
+                return job
+            self._prune()
+            job = Job(key, label, request)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._counts["submitted"] += 1
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> None:
+        job.started_at = time.time()
+        job.state = RUNNING
+        try:
+            job.result = fn(job)
+            job.state = DONE
+        except Exception as e:  # the job is the only place left to report it
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+                self._counts[job.state] += 1
+            metrics.REGISTRY.inc("ern_jobs_total", "Analysis jobs by outcome.", outcome=job.state)
+            job._finish()
+
+    def _prune(self) -> None:
+        # Caller holds self._lock. Oldest first: expired finished jobs, then finished jobs beyond the cap.
+        now = time.time()
+        finished = [j for j in self._jobs.values() if j.done]
+        excess = max(0, len(self._jobs) - self.history + 1)
+        for job in finished:
+            if now - (job.finished_at or now) > self.retention_seconds or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def add_batch(self, batch: "Batch") -> None:
+        """Register ``batch`` for ``get_batch``; finished batches expire like jobs."""
+        with self._lock:
+            now = time.time()
+            for old in list(self._batches.values()):
+                expired = now - (old.finished_at() or now) > self.retention_seconds
+                if old.done and (expired or len(self._batches) >= self.history):
+                    del self._batches[old.id]
+            self._batches[batch.id] = batch
+
+    def get_batch(self, batch_id: Optional[str]) -> Optional["Batch"]:
+        with self._lock:
+            return self._batches.get(batch_id or "")
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id or "")
+
+    def jobs(self) -> List[Job]:
+        """Known jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            states = [j.state for j in self._jobs.values()]
+            return {
+                **self._counts,
+                "queued": states.count(QUEUED),
+                "running": states.count(RUNNING),
+                "workers": self.workers,
+            }
+
+
+_POOL: Optional[JobPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> JobPool:
+    """Return the process-wide job pool configured from the environment."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = JobPool(config.JOB_WORKERS, config.JOB_RETENTION_SECONDS, config.JOB_HISTORY)
+        return _POOL
+
+
+# --- Analysis jobs ---
+class AnalysisRequest(NamedTuple):
+    mode: str  # pipeline id, see pipelines.METHOD_LABELS
+    image_name: str
+    image_digest: str  # digest of the uploaded bytes, which are read from the blob store
+    analysis_digest: str  # digest whose cached analysis to use (differs when reusing a near-duplicate)
+    reused_from: Optional[Dict[str, Any]] = None
+    batch: bool = False  # part of a multi-diagram upload: lower model priority, never shed
+
+
+def analysis_key(request: AnalysisRequest) -> str:
+    return f"{request.mode}:{request.image_digest}:{request.analysis_digest}"
+
+
+def submit_analysis(request: AnalysisRequest) -> Job:
+    """Start (or join) the background analysis for ``request``."""
+    return get_pool().submit(
+        analysis_key(request), pipelines.METHOD_LABELS.get(request.mode, request.mode),
+        lambda job: run_analysis(job, request), request,
+    )
+
+
+def _stream_note(result: Dict[str, Any], was_cached: bool) -> Optional[str]:
+    stats = result.get("stream_stats") or {}
+    if was_cached or not stats:
+        return None
+    tps = stats.get("tokens_per_sec")
+    speed = f" · {tps:.1f} tokens/s" if tps else ""
+    return f"⏱️ First token after {stats['ttft']:.2f}s{speed}"
+
+
+def _cleanup_note(ocr_payload: Dict[str, Any]) -> Optional[str]:
+    stats = ocr_payload.get("cleanup")
+    if not stats or "clean_text" not in ocr_payload:
+        return None
+    dropped = len(stats["dropped"])
+    corrected = len(stats["corrections"])
+    return (
+        f"🧹 OCR cleanup: dropped {dropped} line{'s' * (dropped != 1)}, corrected {corrected} "
+        f"word{'s' * (corrected != 1)}, prompt text ~{stats['tokens_before']} → ~{stats['tokens_after']} tokens"
+    )
+
+
+def run_analysis(job: Job, request: AnalysisRequest) -> Dict[str, Any]:
+    """
+    The results page's analysis, run on a worker: returns the payload the page
+    puts in the blob store and logs progress lines onto ``job``.
+    """
+    image_bytes = blobs.get_store().get(request.image_digest)
+    if image_bytes is None:
+        raise RuntimeError("the uploaded image is no longer stored; please upload it again")
+    image = Image.open(BytesIO(image_bytes))
+    image.load()  # decode now: PIL's lazy load is not thread-safe and the hybrid branches share the image
+    cache = analysis_cache.get_cache()
+    digest = request.analysis_digest
+    on_text = job.stream if config.OLLAMA_STREAM else None
+
+    def note(message: Optional[str]) -> None:
+        if message:
+            job.note(message)
+
+    payload: Dict[str, Any] = {
+        "analysis_method": pipelines.METHOD_LABELS.get(request.mode, request.mode),
+        "image_hash": request.image_digest,
+        "mode": request.mode,
+    }
+    if request.reused_from:
+        payload["reused_from"] = request.reused_from
+
+    def check_rules(report: Optional[rules.Report], source: str) -> None:
+        # Shared right away, so the page shows the findings while the model is still running.
+        if report is None:
+            return
+        payload["rules"] = {**report.as_dict(), "source": source}
+        job.share("rules", payload["rules"])
+        count = len(report.findings)
+        note(
+            f"📏 Rule checks: {count} finding{'s' * (count != 1)} in {report.entities} entities "
+            f"({report.seconds * 1000:.1f} ms), provisional score {report.score}/100"
+        )
+
+    # Every stage recorded below lands in this run's trace and the process-wide histograms
+    priority = scheduler.BATCH if request.batch else scheduler.INTERACTIVE
+    with metrics.pipeline(request.mode) as stage_trace, scheduler.policy(
+        priority=priority, on_wait=job.wait_in_queue, shed=not request.batch
+    ):
+        if request.mode in ("llava_image", "llava_extract"):
+            # Warms the per-digest memo so the pipeline call below reuses this payload
+            encoded = imaging.encode_for_model(image, request.image_digest, len(image_bytes))
+            note(
+                f"✅ Image processed ({encoded.original_bytes / 1024:.0f} KB → "
+                f"{encoded.encoded_bytes / 1024:.0f} KB {encoded.format}, "
+                f"{encoded.width}×{encoded.height}, {encoded.encode_seconds * 1000:.0f} ms)"
+            )
+        else:
+            note("✅ Image processed")
+
+        if request.mode == "ocr_llm":
+            ocrresults, ocr_cached = cache.get_or_compute(
+                pipelines.ocr_cache_key(digest), lambda: pipelines.run_ocr(image)
+            )
+            note("⚡ Text loaded from cache" if ocr_cached else "✅ Text scanned")
+            note(_cleanup_note(ocrresults))
+            with metrics.timed("rules"):
+                check_rules(pipelines.ocr_rules(ocrresults), "ocr")
+            llmresults, llm_cached = cache.get_or_compute(
+                pipelines.ocr_llm_cache_key(digest, ocrresults),
+                lambda: pipelines.analyze_ocr_with_llava(ocrresults, on_text=on_text),
+            )
+            note("⚡ Analysis loaded from cache" if llm_cached else "✅ Logic analyzed")
+            note(_stream_note(llmresults, llm_cached))
+            payload["ocrresults"] = ocrresults
+            payload["llmresults"] = llmresults
+
+        elif request.mode == "llava_image":
+            llavaresults, was_cached = cache.get_or_compute(
+                pipelines.vision_cache_key(digest),
+                lambda: pipelines.analyze_diagram_with_llava(image, on_text=on_text, digest=digest),
+            )
+            note("⚡ Vision analysis loaded from cache" if was_cached else "✅ Vision analysis complete")
+            note(_stream_note(llavaresults, was_cached))
+            payload["llavaresults"] = llavaresults
+            check_rules(pipelines.reply_rules(llavaresults), "reply")
+
+        elif request.mode == "hybrid":
+            hybrid = pipelines.run_hybrid(
+                image, digest, len(image_bytes), on_text=on_text,
+                on_ocr=lambda ocr_payload: check_rules(pipelines.ocr_rules(ocr_payload), "ocr"),
+            )
+            timings = hybrid["timings"]
+            note(
+                f"✅ Text scanned in {timings['ocr']:.2f}s and image encoded in {timings['encode']:.2f}s "
+                f"(in parallel: {timings['parallel']:.2f}s)"
+            )
+            note(_cleanup_note(hybrid["ocrresults"]))
+            llm_cached = hybrid["cached"]["llm"]
+            note(
+                "⚡ Analysis loaded from cache" if llm_cached
+                else f"✅ Grounded vision analysis complete ({timings['llm']:.2f}s)"
+            )
+            note(_stream_note(hybrid["llmresults"], llm_cached))
+            payload["ocrresults"] = hybrid["ocrresults"]
+            payload["llmresults"] = hybrid["llmresults"]
+            payload["timings"] = timings
+
+        else:
+            payload["mode"] = "llava_extract"
+            extractresults, was_cached = cache.get_or_compute(
+                pipelines.extract_cache_key(digest),
+                lambda: pipelines.extract_with_llava(image, on_text=on_text, digest=digest),
+            )
+            note("⚡ Extraction loaded from cache" if was_cached else "✅ Extraction complete")
+            note(_stream_note(extractresults, was_cached))
+            payload["extractresults"] = extractresults
+            check_rules(pipelines.reply_rules(extractresults), "reply")
+
+    payload["stage_timings"] = stage_trace
+    try:
+        metrics.export()
+    except OSError as e:  # the analysis itself is finished (and cached); don't fail the job over it
+        note(f"⚠️ Could not write the metrics file: {e}")
+
+    # Remember this upload for near-duplicate lookups once it has a real (non-error) analysis.
+    index = similarity.get_index()
+    block = payload.get(pipelines.RESULT_KEYS[payload["mode"]], {})
+    if index is not None and request.reused_from is None and not block.get("error"):
+        index.add(request.image_digest, similarity.signature(image))
+    return payload
+
+
+# --- Batches ---
+class Batch:
+    """The diagrams of one upload, analysed in order with at most ``parallel`` in flight."""
+
+    def __init__(self, mode: str, diagrams: List[documents.Diagram], parallel: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.diagrams = diagrams
+        self.parallel = max(1, parallel)
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+        self._jobs: List[Optional[Job]] = [None] * len(diagrams)
+        self._next = 0
+
+    def start(self) -> None:
+        self._feed()
+
+    def _feed(self, _finished: Optional[Job] = None) -> None:
+        # Reserve the next slots under the lock, submit outside it: a job that is already
+        # done calls back into _feed straight away. Reserved slots without a job yet count as running.
+        with self._lock:
+            running = sum(job is None or not job.done for job in self._jobs[:self._next])
+            start = range(self._next, min(len(self.diagrams), self._next + self.parallel - running))
+            self._next = max(self._next, start.stop)
+        for i in start:
+            job = submit_diagram(self.mode, self.diagrams[i])
+            with self._lock:
+                self._jobs[i] = job
+            job.add_done_callback(self._feed)
+
+    def items(self) -> List[Tuple[documents.Diagram, Optional[Job]]]:
+        """Each diagram with its job (None until its turn comes)."""
+        with self._lock:
+            return list(zip(self.diagrams, self._jobs))
+
+    @property
+    def done(self) -> bool:
+        return all(job is not None and job.done for _, job in self.items())
+
+    def finished_at(self) -> Optional[float]:
+        times = [job.finished_at for _, job in self.items() if job is not None]
+        return max(times) if self.done and times else None
+
+
+def submit_diagram(mode: str, diagram: documents.Diagram) -> Job:
+    """Analyse one batch diagram; its image is loaded (a PDF page rendered) on the worker."""
+
+    def run(job: Job) -> Dict[str, Any]:
+        start = time.perf_counter()
+        digest = blobs.get_store().put(diagram.load())
+        job.note(f"✅ Loaded {diagram.name} in {time.perf_counter() - start:.2f}s")
+        job.request = AnalysisRequest(mode, diagram.name, digest, digest, batch=True)
+        return run_analysis(job, job.request)
+
+    return get_pool().submit(f"{mode}:{diagram.source}", diagram.name, run)
+
+
+def submit_batch(mode: str, diagrams: List[documents.Diagram]) -> Batch:
+    """Start analysing ``diagrams`` in the background; look the batch up later with ``get_batch``."""
+    batch = Batch(mode, diagrams, config.BATCH_PARALLEL)
+    get_pool().add_batch(batch)
+    batch.start()
+    return batch
@@ -0,0 +1,284 @@
+"""
+Lightweight per-stage timing instrumentation.
+
+Stages (OCR, encode, Ollama request, parse, ...) are recorded into
+process-wide histograms labelled by stage and pipeline, plus a per-run trace
+the results page can show. Histograms are exported in Prometheus text format
+to a file and, optionally, over HTTP at ``/metrics``.
+"""
+import bisect
+import contextvars
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from normalizer import config
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+TOKEN_BUCKETS = (32.0, 64.0, 128.0, 256.0, 512.0, 1024.0, 2048.0, 4096.0, math.inf)
+
+# Ollama reports these in nanoseconds on the final response.
+OLLAMA_DURATION_FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+
+class Histogram:
+    """Cumulative-bucket histogram compatible with Prometheus exposition."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Bucket upper bound containing the q-th observation (coarse, but cheap)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, help_text: str = "", amount: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        help_text: str = "",
+        buckets: Tuple[float, ...] = BUCKETS,
+        **labels: str,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def summary(self, name: str) -> List[Dict[str, Any]]:
+        """Rows of {labels..., count, mean, p50, p95} for one metric, for on-page tables."""
+        rows = []
+        with self._lock:
+            for (metric, labels), hist in sorted(self._histograms.items()):
+                if metric != name or not hist.count:
+                    continue
+                rows.append({
+                    **dict(labels),
+                    "count": hist.count,
+                    "mean_s": round(hist.sum / hist.count, 4),
+                    "p50_s": hist.quantile(0.5),
+                    "p95_s": hist.quantile(0.95),
+                })
+        return rows
+
+    def counters(self, name: str) -> List[Dict[str, Any]]:
+        """Rows of {labels..., value} for one counter."""
+        with self._lock:
+            return [
+                {**dict(labels), "value": value}
+                for (metric, labels), value in sorted(self._counters.items())
+                if metric == name
+            ]
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], Histogram]]] = {}
+            for (name, labels), hist in self._histograms.items():
+                by_name.setdefault(name, []).append((labels, hist))
+            for name in sorted(by_name):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(by_name[name]):
+                    base = ",".join(f'{k}="{v}"' for k, v in labels)
+                    running = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        running += n
+                        le = "+Inf" if math.isinf(bound) else repr(bound)
+                        sep = "," if base else ""
+                        lines.append(f'{name}_bucket{{{base}{sep}le="{le}"}} {running}')
+                    suffix = f"{{{base}}}" if base else ""
+                    lines.append(f"{name}_sum{suffix} {hist.sum}")
+                    lines.append(f"{name}_count{suffix} {hist.count}")
+
+            counters: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], float]]] = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append((labels, value))
+            for name in sorted(counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(counters[name]):
+                    base = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{base}}} {value}" if base else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+_PIPELINE: contextvars.ContextVar = contextvars.ContextVar("ern_pipeline", default="unknown")
+_TRACE: contextvars.ContextVar = contextvars.ContextVar("ern_trace", default=None)
+
+
+@contextmanager
+def pipeline(name: str) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Label every stage recorded inside the block with ``name`` and collect them
+    into the yielded per-run trace list.
+    """
+    trace: List[Dict[str, Any]] = []
+    pipeline_token = _PIPELINE.set(name)
+    trace_token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _TRACE.reset(trace_token)
+        _PIPELINE.reset(pipeline_token)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record one stage duration for the current pipeline."""
+    REGISTRY.observe(
+        "ern_stage_seconds", seconds, "Wall time per pipeline stage.",
+        stage=stage, pipeline=_PIPELINE.get(),
+    )
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.append({"stage": stage, "seconds": round(seconds, 4)})
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_ollama_response(response: Dict[str, Any]) -> None:
+    """Record Ollama's own timing fields (ns) and token counts from a final response/chunk."""
+    for field in OLLAMA_DURATION_FIELDS:
+        if response.get(field):
+            observe(f"ollama_{field.replace('_duration', '')}", response[field] / 1e9)
+    for field in ("prompt_eval_count", "eval_count"):
+        if response.get(field):
+            REGISTRY.observe(
+                "ern_ollama_tokens", float(response[field]), "Tokens per Ollama request.", TOKEN_BUCKETS,
+                kind=field.replace("_count", ""), pipeline=_PIPELINE.get(),
+            )
+
+
+def page_view(page: str) -> None:
+    """Count one full run of ``page`` (fragment polls are not page views)."""
+    REGISTRY.inc("ern_page_views_total", "Full page script runs.", page=page)
+
+
+def page_sent(page: str, kind: str, size: int) -> None:
+    """
+    Count ``size`` bytes of ``kind`` ("css", "html", "image") sent to the browser by
+    ``page``. Elements count on every run they are sent, fragment polls included;
+    preview images only once per session, since the browser keeps them.
+    """
+    REGISTRY.inc(
+        "ern_page_sent_bytes_total", "Bytes of page CSS, rendered HTML and preview images sent to the browser.",
+        amount=size, page=page, kind=kind,
+    )
+
+
+def page_traffic() -> List[Dict[str, Any]]:
+    """Rows of {page, views, <kind>_kb per view} for on-page tables."""
+    views = {row["page"]: row["value"] for row in REGISTRY.counters("ern_page_views_total")}
+    rows: Dict[str, Dict[str, Any]] = {page: {"page": page, "views": int(n)} for page, n in views.items()}
+    for row in REGISTRY.counters("ern_page_sent_bytes_total"):
+        if views.get(row["page"]):
+            rows[row["page"]][f"{row['kind']}_kb"] = round(row["value"] / views[row["page"]] / 1024, 1)
+    return list(rows.values())
+
+
+def export() -> None:
+    """Rewrite the Prometheus text file (atomically) and make sure the endpoint is up."""
+    if config.METRICS_FILE:
+        directory = os.path.dirname(config.METRICS_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A temp file per call: job workers finishing together export at the same time.
+        fd, tmp = tempfile.mkstemp(dir=directory or None, prefix=".metrics-", suffix=".tmp")
+        try:
+            os.chmod(tmp, 0o644)  # mkstemp's 0600 would hide it from a textfile collector
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(REGISTRY.render_prometheus())
+            os.replace(tmp, config.METRICS_FILE)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    if config.METRICS_PORT:
+        start_http_server(config.METRICS_PORT)
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_LOCK = threading.Lock()
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> None:
+    """Serve ``/metrics`` from a daemon thread; later calls are no-ops."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is not None:
+            return
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = REGISTRY.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            _SERVER = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # Another Streamlit process already owns the port; the file export still works.
+            return
+        _SERVER.daemon_threads = True
+        threading.Thread(target=_SERVER.serve_forever, daemon=True, name="ern-metrics").start()
@@ -0,0 +1,173 @@
+"""
+Model backends, complexity routing and fallback.
+
+Pipelines no longer name a model. They describe how complex the diagram is
+(OCR text boxes when OCR ran, otherwise resolution), ``route`` turns that into
+an ordered chain of models, and ``chat`` walks the chain until one of them
+answers. Which model served the result, and which ones failed on the way, is
+returned alongside the reply.
+
+Models are given as specs: a bare name ("llava:13b") runs on the shared Ollama
+client; "scheme://name" picks a backend registered with ``register_backend``.
+With no tiers or fallbacks configured every call goes to ``ERN_OLLAMA_MODEL``.
+"""
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+from PIL import Image
+
+from normalizer import config
+from normalizer import metrics
+from normalizer import ollama
+
+SMALL, DEFAULT, LARGE = "small", "default", "large"
+
+
+class ModelBackend(ABC):
+    """Anything that can answer an Ollama-style /api/chat payload."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def chat(
+        self,
+        payload: Dict[str, Any],
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Return (text, stream_stats), like ``OllamaClient.chat``."""
+
+
+class OllamaBackend(ModelBackend):
+    """A model served by the process-wide Ollama client."""
+
+    def chat(
+        self,
+        payload: Dict[str, Any],
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        # Resolved per call so ollama.set_client() (benchmarks, stubs) applies.
+        return ollama.get_client().chat({**payload, "model": self.name}, on_text=on_text)
+
+
+_FACTORIES: Dict[str, Callable[[str], ModelBackend]] = {"ollama": OllamaBackend}
+_BACKENDS: Dict[str, ModelBackend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def register_backend(scheme: str, factory: Callable[[str], ModelBackend]) -> None:
+    """Serve "scheme://name" model specs with ``factory(name)``."""
+    with _BACKENDS_LOCK:
+        _FACTORIES[scheme] = factory
+        for spec in [s for s in _BACKENDS if s.startswith(f"{scheme}://")]:
+            del _BACKENDS[spec]
+
+
+def get_backend(spec: str) -> ModelBackend:
+    scheme, _, name = spec.rpartition("://")
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(spec)
+        if backend is None:
+            factory = _FACTORIES.get(scheme or "ollama")
+            if factory is None:
+                raise ValueError(f"No model backend registered for '{scheme}://'")
+            backend = _BACKENDS[spec] = factory(name)
+        return backend
+
+
+# --- Routing ---
+class Complexity(NamedTuple):
+    text_boxes: Optional[int] = None  # OCR detections, when OCR ran
+    megapixels: Optional[float] = None
+
+    @classmethod
+    def of(cls, image: Optional[Image.Image] = None, extracted_text: Optional[str] = None) -> "Complexity":
+        boxes = None if extracted_text is None else sum(1 for line in extracted_text.splitlines() if line.strip())
+        megapixels = None if image is None else image.width * image.height / 1e6
+        return cls(boxes, megapixels)
+
+
+def tier(complexity: Optional[Complexity]) -> str:
+    """SMALL, DEFAULT or LARGE. Text-box count wins over resolution when both are known."""
+    if complexity is None:
+        return DEFAULT
+    if complexity.text_boxes is not None:
+        if complexity.text_boxes <= config.ROUTE_SMALL_MAX_BOXES:
+            return SMALL
+        return LARGE if complexity.text_boxes >= config.ROUTE_LARGE_MIN_BOXES else DEFAULT
+    if complexity.megapixels is not None:
+        if complexity.megapixels <= config.ROUTE_SMALL_MAX_MP:
+            return SMALL
+        return LARGE if complexity.megapixels >= config.ROUTE_LARGE_MIN_MP else DEFAULT
+    return DEFAULT
+
+
+def route(complexity: Optional[Complexity] = None) -> List[str]:
+    """Models to try in order: the tier's model, the default model, then the configured fallbacks."""
+    chain = [{SMALL: config.MODEL_SMALL, LARGE: config.MODEL_LARGE}.get(tier(complexity)) or config.OLLAMA_MODEL]
+    for spec in (config.OLLAMA_MODEL,) + config.MODEL_FALLBACKS:
+        if spec not in chain:
+            chain.append(spec)
+    return chain
+
+
+def routing_settings() -> Dict[str, Any]:
+    """Everything that decides which model answers; part of the LLM cache keys when routing is on."""
+    if not (config.MODEL_SMALL or config.MODEL_LARGE or config.MODEL_FALLBACKS):
+        return {}
+    return {
+        "small": config.MODEL_SMALL,
+        "large": config.MODEL_LARGE,
+        "fallbacks": list(config.MODEL_FALLBACKS),
+        "boxes": [config.ROUTE_SMALL_MAX_BOXES, config.ROUTE_LARGE_MIN_BOXES],
+        "megapixels": [config.ROUTE_SMALL_MAX_MP, config.ROUTE_LARGE_MIN_MP],
+    }
+
+
+# --- Fallback ---
+class Served(NamedTuple):
+    text: str
+    stream_stats: Dict[str, Any]
+    model: str
+    failures: List[Dict[str, str]]  # [{"model", "error"}] for every model that failed before it
+
+
+# Worth trying the next model: this one timed out (before or during its reply), is
+# missing/overloaded (HTTP error after retries) or aborted mid-stream. Unreachable servers
+# are not; every Ollama model shares one.
+FALLBACK_ERRORS = (
+    requests.exceptions.Timeout,
+    requests.exceptions.HTTPError,
+    requests.exceptions.ChunkedEncodingError,
+    RuntimeError,
+    ValueError,
+)
+
+
+def chat(
+    chain: List[str],
+    payload: Dict[str, Any],
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Served:
+    """Ask each model in ``chain`` in turn; re-raise the last failure if none answers."""
+    failures: List[Dict[str, str]] = []
+    for position, spec in enumerate(chain):
+        try:
+            text, stats = get_backend(spec).chat(payload, on_text=on_text)
+        except requests.exceptions.ConnectionError:
+            # Only "cannot connect": OllamaClient raises a reply that stalls midway as ReadTimeout.
+            raise
+        except FALLBACK_ERRORS as e:
+            metrics.REGISTRY.inc("ern_model_requests_total", "Chat requests per model and outcome.", model=spec, outcome="failed")
+            failures.append({"model": spec, "error": f"{type(e).__name__}: {e}"})
+            if position == len(chain) - 1:
+                raise
+            continue
+        metrics.REGISTRY.inc(
+            "ern_model_requests_total", "Chat requests per model and outcome.",
+            model=spec, outcome="fallback" if failures else "served",
+        )
+        return Served(text, stats, spec, failures)
+    raise ValueError("empty model chain")
@@ -0,0 +1,272 @@
+"""
+Process-wide pool of warm EasyOCR readers.
+
+Building an ``easyocr.Reader`` loads the detector and recognizer weights, which
+takes seconds and hundreds of MB of memory. Readers are reusable, so we keep a
+small bounded pool per (languages, device) pair and share it across every
+Streamlit session running in this process.
+
+``easyocr`` (and through it torch/torchvision) is only imported when the first
+reader is built, so vision-only runs and page loads never pay for it.
+
+Very large diagrams are read in overlapping tiles spread across the pool, and
+the duplicate detections in the overlap zones are merged with a vectorized IoU.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from normalizer import config
+
+if TYPE_CHECKING:
+    import easyocr
+
+
+@lru_cache(maxsize=1)
+def gpu_available() -> bool:
+    """Return True when torch can see a CUDA or Apple MPS device."""
+    try:
+        import torch
+    except ImportError:
+        return False
+
+    if torch.cuda.is_available():
+        return True
+    mps = getattr(torch.backends, "mps", None)
+    return bool(mps is not None and mps.is_available())
+
+
+class ReaderPool:
+    """A bounded, thread-safe pool of EasyOCR readers for one language set and device."""
+
+    def __init__(self, languages: Sequence[str], gpu: bool, max_size: int):
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.max_size = max_size
+        self._idle: List["easyocr.Reader"] = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> "easyocr.Reader":
+        """Check out a reader, building one if the pool is not full yet, otherwise waiting."""
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            # Reserve the slot now and build outside the lock so other checkouts aren't blocked.
+            self._created += 1
+
+        try:
+            import easyocr  # heavy: pulls in torch, so deferred until OCR is actually used
+
+            return easyocr.Reader(self.languages, gpu=self.gpu, verbose=False)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, reader: "easyocr.Reader") -> None:
+        """Return a reader to the pool and wake one waiter."""
+        with self._cond:
+            self._idle.append(reader)
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self) -> Iterator["easyocr.Reader"]:
+        reader = self.acquire()
+        try:
+            yield reader
+        finally:
+            self.release(reader)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"created": self._created, "idle": len(self._idle), "max_size": self.max_size}
+
+
+_POOLS: Dict[Tuple[Tuple[str, ...], str], ReaderPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(languages: Sequence[str] = ("en",), use_gpu: Optional[bool] = None) -> ReaderPool:
+    """
+    Return the shared pool for these languages, creating it on first use.
+    Falls back to a CPU pool when a GPU is requested but none is present.
+    """
+    if use_gpu is None:
+        use_gpu = config.OCR_USE_GPU
+    device = "gpu" if use_gpu and gpu_available() else "cpu"
+    key = (tuple(languages), device)
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ReaderPool(languages, gpu=(device == "gpu"), max_size=config.OCR_POOL_SIZE)
+            _POOLS[key] = pool
+    return pool
+
+
+@contextmanager
+def reader(languages: Sequence[str] = ("en",), use_gpu: Optional[bool] = None) -> Iterator["easyocr.Reader"]:
+    """Borrow a warm reader from the shared pool for the duration of the block."""
+    with get_pool(languages, use_gpu).checkout() as r:
+        yield r
+
+
+# --- Tiled OCR for large diagrams ---
+# EasyOCR's detail=1 shape: (four corner points, text, confidence).
+Detection = Tuple[List[List[float]], str, float]
+
+
+def tiling_settings() -> Dict[str, int]:
+    """Settings that change tiled OCR output (part of the OCR cache key)."""
+    return {
+        "threshold": config.OCR_TILE_THRESHOLD,
+        "tile": config.OCR_TILE_SIZE,
+        "overlap": config.OCR_TILE_OVERLAP,
+    }
+
+
+def should_tile(width: int, height: int) -> bool:
+    return 0 < config.OCR_TILE_THRESHOLD < max(width, height)
+
+
+def tile_grid(width: int, height: int, tile: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """Overlapping (x0, y0, x1, y1) windows covering the image; the last row/column sits flush with the edge."""
+    def starts(length: int) -> List[int]:
+        if length <= tile:
+            return [0]
+        positions = list(range(0, length - tile, max(1, tile - overlap)))
+        positions.append(length - tile)
+        return positions
+
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def pairwise_overlap(boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """IoU and intersection-over-smaller-area matrices for (N, 4) x0, y0, x1, y1 boxes."""
+    ix0 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    iy0 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    ix1 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    iy1 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(ix1 - ix0, 0, None) * np.clip(iy1 - iy0, 0, None)
+
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = area[:, None] + area[None, :] - inter
+    smaller = np.minimum(area[:, None], area[None, :])
+    return inter / np.maximum(union, 1e-6), inter / np.maximum(smaller, 1e-6)
+
+
+def merge_detections(
+    boxes: np.ndarray,
+    tile_ids: np.ndarray,
+    clipped: np.ndarray,
+    confidences: np.ndarray,
+    windows: np.ndarray,
+    iou_threshold: float = 0.5,
+    containment_threshold: float = 0.8,
+) -> np.ndarray:
+    """
+    Indices of detections to keep after removing cross-tile duplicates.
+
+    Only boxes lying in an overlap zone (touching more than one window) can be
+    duplicates, so the pairwise matrices are built for those alone. Two boxes
+    from different tiles are the same word when their IoU is high, or when one
+    mostly contains the other (a word cut off at a tile edge). Whole words win
+    over clipped ones, then higher confidence wins.
+    """
+    n = len(boxes)
+    touches = (
+        (boxes[:, None, 0] < windows[None, :, 2]) & (boxes[:, None, 2] > windows[None, :, 0])
+        & (boxes[:, None, 1] < windows[None, :, 3]) & (boxes[:, None, 3] > windows[None, :, 1])
+    )
+    candidates = np.flatnonzero(touches.sum(axis=1) > 1)
+    if len(candidates) < 2:
+        return np.arange(n)
+
+    iou, containment = pairwise_overlap(boxes[candidates].astype(np.float32))
+    cand_tiles = tile_ids[candidates]
+    duplicate = ((iou >= iou_threshold) | (containment >= containment_threshold)) & (
+        cand_tiles[:, None] != cand_tiles[None, :]
+    )
+
+    # np.lexsort sorts by the last key first: unclipped before clipped, then by confidence.
+    order = np.lexsort((-confidences[candidates], clipped[candidates]))
+    suppressed = np.zeros(len(candidates), dtype=bool)
+    for i in order:
+        if not suppressed[i]:
+            suppressed |= duplicate[i]
+
+    keep = np.ones(n, dtype=bool)
+    keep[candidates[suppressed]] = False
+    return np.flatnonzero(keep)
+
+
+def readtext_tiled(
+    np_img: np.ndarray,
+    languages: Sequence[str] = ("en",),
+    tile: Optional[int] = None,
+    overlap: Optional[int] = None,
+    use_gpu: Optional[bool] = None,
+) -> List[Detection]:
+    """
+    OCR a large image as overlapping tiles, one pooled reader per tile in
+    parallel, and return merged detections in image coordinates, in reading order.
+    """
+    tile = tile or config.OCR_TILE_SIZE
+    overlap = config.OCR_TILE_OVERLAP if overlap is None else overlap
+    height, width = np_img.shape[:2]
+    windows = tile_grid(width, height, tile, overlap)
+    pool = get_pool(languages, use_gpu)
+
+    def recognise(window: Tuple[int, int, int, int]) -> List[Any]:
+        x0, y0, x1, y1 = window
+        with pool.checkout() as r:
+            return r.readtext(np.ascontiguousarray(np_img[y0:y1, x0:x1]), detail=1)
+
+    with ThreadPoolExecutor(max_workers=min(len(windows), pool.max_size), thread_name_prefix="ocr-tile") as ex:
+        per_tile = list(ex.map(recognise, windows))
+
+    points, texts, boxes, tile_ids, clipped, confidences = [], [], [], [], [], []
+    edge = 2  # px; boxes this close to an inner tile edge were probably cut off
+    for t, ((x0, y0, x1, y1), found) in enumerate(zip(windows, per_tile)):
+        for corners, text, conf in found:
+            shifted = [[float(px) + x0, float(py) + y0] for px, py in corners]
+            xs, ys = [p[0] for p in shifted], [p[1] for p in shifted]
+            bx0, by0, bx1, by1 = min(xs), min(ys), max(xs), max(ys)
+            points.append(shifted)
+            texts.append(text)
+            boxes.append((bx0, by0, bx1, by1))
+            tile_ids.append(t)
+            confidences.append(float(conf))
+            clipped.append(
+                (x0 > 0 and bx0 - x0 < edge) or (y0 > 0 and by0 - y0 < edge)
+                or (x1 < width and x1 - bx1 < edge) or (y1 < height and y1 - by1 < edge)
+            )
+
+    if not boxes:
+        return []
+
+    box_arr = np.asarray(boxes, dtype=np.float64)
+    keep = merge_detections(
+        box_arr,
+        np.asarray(tile_ids),
+        np.asarray(clipped),
+        np.asarray(confidences),
+        np.asarray(windows, dtype=np.float64),
+    )
+
+    # Reading order: bucket into text lines by the median box height, then left to right.
+    line_height = max(1.0, float(np.median(box_arr[keep, 3] - box_arr[keep, 1])))
+    keep = sorted(keep, key=lambda i: (int(box_arr[i, 1] // line_height), box_arr[i, 0]))
+    return [(points[i], texts[i], confidences[i]) for i in keep]
@@ -0,0 +1,305 @@
+"""
+Local clean-up of OCR output before it reaches the LLM.
+
+EasyOCR reads watermarks, crow's-foot glyphs and line crossings as words
+("Checynll", "Haptd") and misreads labels ("Studnt"). The OCR prompt used to
+ship all of it and spend instructions asking the model to ignore or fix it.
+This stage does that deterministically:
+
+- every token is scored against database vocabulary (PK/FK, SQL types,
+  snake_case and camelCase identifiers split into parts), a domain word list
+  (``vocabulary.txt``) and, when present, a system dictionary;
+- unknown tokens within a small edit distance of a known word are corrected
+  through a BK-tree, preferring words read with high confidence elsewhere in
+  the same image over the generic vocabulary;
+- lines with nothing recognisable are dropped when EasyOCR was unsure of them
+  or they look like gibberish, and gibberish tokens are dropped from
+  low-confidence lines.
+
+``clean`` reports what it removed and an estimate of the prompt tokens saved.
+"""
+import functools
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from normalizer import config
+
+# Bump when the rules change so cached OCR payloads are cleaned again.
+VERSION = 1
+
+VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocabulary.txt")
+
+DB_ABBREVIATIONS = {
+    "pk", "fk", "uk", "ak", "nn", "id", "ids", "uid", "uuid", "sql", "ddl", "erd", "er", "pfk",
+    "m:n", "1:n", "n:1", "1:1", "n:m", "m:1", "1:m",
+}
+# Cardinality and multiplicity marks: 1, N, M, *, 0..1, 1..*, (1,N), ...
+CARDINALITY_RE = re.compile(r"^[(\[]?[\d*nNmM]{1,2}(?:\s*(?:\.\.|,|:)\s*[\d*nNmM]{1,2})?[)\]]?$")
+IDENTIFIER_SPLIT_RE = re.compile(r"_+|(?<=[a-z])(?=[A-Z])|(?<=[A-Za-z])(?=\d)|(?<=\d)(?=[A-Za-z])")
+EDGE_PUNCT_RE = re.compile(r"^([^\w(]*)(.*?)([^\w)]*)$")
+VOWELS = set("aeiou")
+
+
+class Cleanup(NamedTuple):
+    text: str
+    lines_in: int
+    lines_kept: int
+    dropped: List[str]  # whole lines removed as noise
+    corrections: List[Tuple[str, str]]  # (as read, corrected)
+    tokens_before: int  # approximate LLM tokens
+    tokens_after: int
+    per_line: Tuple[Optional[str], ...] = ()  # cleaned text of each input line, None if dropped
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "lines_in": self.lines_in,
+            "lines_kept": self.lines_kept,
+            "dropped": self.dropped,
+            "corrections": [list(c) for c in self.corrections],
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+        }
+
+
+def approx_tokens(text: str) -> int:
+    """Rough LLM token count: one per short word, symbol or line break, long words in 4-character pieces."""
+    return sum(max(1, -(-len(piece) // 4)) for piece in re.findall(r"\w+|[^\w\s]|\n", text))
+
+
+# --- Edit distance and BK-tree ---
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance between ``a`` and ``b``, or ``limit + 1`` as soon as it must exceed ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over lowercase words for bounded edit-distance lookups."""
+
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            # Exact distances are needed to place a node; no early exit.
+            distance = levenshtein(word, node[0], max(len(word), len(node[0])))
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Words within ``max_distance`` edits, closest first."""
+        found: List[Tuple[int, str]] = []
+        stack = [self._root] if self._root else []
+        while stack:
+            candidate, children = stack.pop()
+            # Past max_distance + the farthest child, neither this node nor any subtree can match.
+            distance = levenshtein(word, candidate, max_distance + max(children, default=0))
+            if distance <= max_distance:
+                found.append((distance, candidate))
+            # Triangle inequality: only subtrees at distance d ± max_distance can hold matches.
+            stack.extend(child for d, child in children.items() if distance - max_distance <= d <= distance + max_distance)
+        return sorted(found)
+
+
+# --- Vocabulary ---
+def _read_words(path: str) -> List[str]:
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        return [w.strip().lower() for w in f if w.strip() and not w.startswith("#")]
+
+
+@functools.lru_cache(maxsize=1)
+def domain_words() -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(_read_words(VOCABULARY_PATH)))
+
+
+@functools.lru_cache(maxsize=1)
+def dictionary() -> frozenset:
+    """Membership-only word set: the domain list plus the system dictionary, if configured."""
+    words = set(domain_words()) | DB_ABBREVIATIONS
+    if config.OCR_DICTIONARY and os.path.exists(config.OCR_DICTIONARY):
+        words.update(w for w in _read_words(config.OCR_DICTIONARY) if w.isalpha())
+    return frozenset(words)
+
+
+@functools.lru_cache(maxsize=1)
+def domain_tree() -> BKTree:
+    # Correction targets stay small: the system dictionary would make every typo a "word".
+    return BKTree(w for w in domain_words() if len(w) >= 3)
+
+
+@functools.lru_cache(maxsize=1)
+def dictionary_digest() -> str:
+    """Fingerprint of ``dictionary()``, worked out once alongside it."""
+    return hashlib.sha1("\n".join(sorted(dictionary())).encode()).hexdigest()[:12]
+
+
+def settings() -> Dict[str, object]:
+    """Everything that changes ``clean``'s output; part of the OCR cache key."""
+    return {
+        "version": VERSION,
+        "enabled": config.OCR_CLEANUP,
+        "min_confidence": config.OCR_MIN_CONFIDENCE,
+        "vocabulary": dictionary_digest(),
+    }
+
+
+# --- Token rules ---
+def max_edits(word: str) -> int:
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) <= 6 else 2
+
+
+def looks_gibberish(token: str) -> bool:
+    """Vowel-less or consonant-heavy letter runs, stuttered letters, or mostly symbols."""
+    letters = re.sub(r"[^A-Za-z]", "", token).lower()
+    if len(token) >= 2 and sum(ch.isalnum() for ch in token) < len(token) / 2:
+        return True
+    if len(letters) < 4:
+        return False
+    if not VOWELS.intersection(letters):
+        return True
+    if re.search(r"[^aeiou]{5,}", letters) or re.search(r"(.)\1\1", letters):
+        return True
+    return False
+
+
+def match_case(source: str, word: str) -> str:
+    if source.isupper() and len(source) > 1:
+        return word.upper()
+    if source[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+def _is_known(part: str, words: frozenset) -> bool:
+    return part.isdigit() or part.lower() in words
+
+
+def _split_compound(part: str, words: frozenset) -> Optional[str]:
+    """"startdate" -> "start_date": OCR often loses the underscore between two known words."""
+    if not part.isalpha() or not part.islower() or len(part) < 5:
+        return None
+    for i in range(2, len(part) - 1):
+        head, tail = part[:i], part[i:]
+        if head in words and tail in words and (len(head) > 2 or head in DB_ABBREVIATIONS):
+            return f"{head}_{tail}"
+    return None
+
+
+def _correct_part(part: str, trees: Sequence[BKTree]) -> Optional[str]:
+    limit = max_edits(part)
+    if not limit or not part.isalpha():
+        return None
+    for tree in trees:  # image words first, then the domain vocabulary
+        matches = tree.search(part.lower(), limit)
+        if matches:
+            best = [w for d, w in matches if d == matches[0][0]]
+            if len(best) == 1:  # ambiguous (e.g. "cort" -> cost/court) stays as read
+                return match_case(part, best[0])
+    return None
+
+
+def clean_token(token: str, words: frozenset, trees: Sequence[BKTree]) -> Tuple[Optional[str], bool]:
+    """
+    Return (replacement, known). ``replacement`` is the token to keep (corrected
+    if need be) and ``known`` says whether every part of it was recognised.
+    """
+    lead, core, trail = EDGE_PUNCT_RE.match(token).groups()
+    if not core:
+        return None, False
+    if core.lower() in DB_ABBREVIATIONS or CARDINALITY_RE.match(core):
+        return token, True
+    # Identifiers are checked part by part: enroll_date, createdAt, address2.
+    separators = IDENTIFIER_SPLIT_RE.findall(core)
+    parts = IDENTIFIER_SPLIT_RE.split(core)
+    fixed, known = [], True
+    for part in parts:
+        if not part or _is_known(part, words):
+            fixed.append(part)
+            continue
+        corrected = _split_compound(part, words) or _correct_part(part, trees)
+        if corrected is None:
+            known = False
+            fixed.append(part)
+        else:
+            fixed.append(corrected)
+    rebuilt = fixed[0] + "".join(sep + part for sep, part in zip(separators, fixed[1:]))
+    return f"{lead}{rebuilt}{trail}", known
+
+
+def clean(lines: Sequence[Tuple[str, float]]) -> Cleanup:
+    """
+    Filter and spell-correct OCR ``(text, confidence)`` lines in reading order.
+    """
+    raw_text = "\n".join(text for text, _ in lines)
+    if not config.OCR_CLEANUP:
+        tokens = approx_tokens(raw_text)
+        return Cleanup(raw_text, len(lines), len(lines), [], [], tokens, tokens, tuple(t for t, _ in lines))
+
+    words = dictionary()
+    # Words this image shows clearly are the best correction targets for its blurry copies:
+    # known words, plus names it repeats (a single confident read may itself be the typo).
+    seen = Counter(
+        t.lower()
+        for text, conf in lines if conf >= 0.8
+        for t in re.findall(r"[A-Za-z]{4,}", text)
+    )
+    confident = sorted(w for w, n in seen.items() if w in words or (n >= 2 and not looks_gibberish(w)))
+    trees = [BKTree(confident), domain_tree()]
+
+    kept: List[str] = []
+    per_line: List[Optional[str]] = []
+    dropped: List[str] = []
+    corrections: List[Tuple[str, str]] = []
+    # Attribute names repeat across entities; look each token up once.
+    memo: Dict[str, Tuple[Optional[str], bool]] = {}
+    for text, conf in lines:
+        unsure = conf < config.OCR_MIN_CONFIDENCE
+        out, recognised = [], 0
+        for token in text.split():
+            if token not in memo:
+                memo[token] = clean_token(token, words, trees)
+            replacement, known = memo[token]
+            if replacement is None:
+                continue
+            if not known and unsure and looks_gibberish(replacement):
+                continue
+            if replacement != token:
+                corrections.append((token, replacement))
+            recognised += known
+            out.append(replacement)
+        if not out or (not recognised and (unsure or all(looks_gibberish(t) for t in out))):
+            dropped.append(text)
+            per_line.append(None)
+            continue
+        kept.append(" ".join(out))
+        per_line.append(kept[-1])
+
+    text = "\n".join(kept)
+    return Cleanup(
+        text, len(lines), len(kept), dropped, corrections, approx_tokens(raw_text), approx_tokens(text), tuple(per_line)
+    )
@@ -0,0 +1,153 @@
+"""
+Groups OCR detections into entity boxes by where they sit in the diagram.
+
+EasyOCR returns one detection per run of text with its bounding quad. In an
+ERD an entity's attributes are stacked under its name, roughly left-aligned
+and about a line apart, while the next entity is a box-width away. ``group``
+builds a pairwise "same box" matrix with NumPy, takes its connected
+components, and reads each component top to bottom: the first row is the
+entity name and the rest are its attributes. Detections that end up on their
+own (relationship names, cardinalities, stray text) are kept as loose labels.
+
+``compact`` renders the result as one line per entity. The OCR prompts get
+that instead of a flat list of lines that leaves the model to guess which
+attribute belongs where.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from normalizer import config
+
+# Bump when the grouping rules change so cached OCR payloads are grouped again.
+VERSION = 1
+
+# Pairwise thresholds, in multiples of the taller detection's height (at least the median height,
+# so short boxes such as "1" or a clipped word don't shrink the reach).
+MAX_LINE_GAP = 1.5  # vertical gap between stacked rows of one box (headers sit a little apart)
+MAX_INDENT = 1.5  # left-edge offset between stacked rows that don't overlap horizontally
+MAX_WORD_GAP = 1.5  # horizontal gap between pieces of one row ("student_id" "PK")
+# Rows of pairwise comparisons computed at once; bounds memory to CHUNK x n per matrix.
+CHUNK = 512
+
+
+class Entity(NamedTuple):
+    name: str
+    attributes: List[str]
+    box: Tuple[int, int, int, int]  # x0, y0, x1, y1 around the entity's text
+    confidence: Optional[float] = None  # lowest OCR confidence of its detections, when known
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {"name": self.name, "attributes": self.attributes, "box": list(self.box)}
+        if self.confidence is not None:
+            d["confidence"] = round(self.confidence, 3)
+        return d
+
+
+class Layout(NamedTuple):
+    entities: List[Entity]
+    loose: List[str]  # text that belongs to no entity, in reading order
+
+
+def settings() -> Dict[str, Any]:
+    """Everything that changes ``group``'s output; part of the OCR cache key."""
+    return {"version": VERSION, "enabled": config.OCR_GROUPING}
+
+
+def bounds(quads: Sequence[Any]) -> np.ndarray:
+    """(n, 4) float array of x0, y0, x1, y1 from EasyOCR's four-point boxes."""
+    if not len(quads):
+        return np.zeros((0, 4), dtype=np.float32)
+    points = np.asarray(quads, dtype=np.float32).reshape(len(quads), -1, 2)
+    return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+
+
+def same_box(b: np.ndarray) -> np.ndarray:
+    """(n, n) bool matrix: detection i and j are neighbours in one entity box."""
+    n = len(b)
+    x0, y0, x1, y1 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    h = np.maximum(y1 - y0, 1.0)
+    typical = float(np.median(h)) if n else 1.0
+    adjacent = np.zeros((n, n), dtype=bool)
+    for start in range(0, n, CHUNK):
+        rows = slice(start, start + CHUNK)
+        col = lambda a: a[rows, None]  # noqa: E731 - broadcast this chunk against every detection
+        height = np.maximum(np.maximum(col(h), h), typical)
+        v_gap = np.maximum(np.maximum(y0 - col(y1), col(y0) - y1), 0)
+        h_gap = np.maximum(np.maximum(x0 - col(x1), col(x0) - x1), 0)
+        v_overlap = np.minimum(col(y1), y1) - np.maximum(col(y0), y0)
+
+        stacked = (v_gap <= MAX_LINE_GAP * height) & (
+            (h_gap == 0) | (np.abs(col(x0) - x0) <= MAX_INDENT * height)
+        )
+        same_row = (v_overlap >= 0.5 * np.minimum(col(h), h)) & (h_gap <= MAX_WORD_GAP * height)
+        adjacent[rows] = stacked | same_row
+    return adjacent
+
+
+def components(adjacent: np.ndarray) -> np.ndarray:
+    """Connected-component label per node (the smallest index in its component)."""
+    n = len(adjacent)
+    labels = np.arange(n)
+    while True:
+        # Every node takes its smallest neighbour's label, then jumps to that label's label.
+        nearest = np.where(adjacent, labels[None, :], n).min(axis=1, initial=n)
+        updated = np.minimum(labels, nearest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _rows(members: np.ndarray, b: np.ndarray) -> List[np.ndarray]:
+    """Split one component into text rows, top to bottom, each ordered left to right."""
+    order = members[np.argsort(b[members, 1], kind="stable")]
+    rows: List[List[int]] = []
+    for i in order:
+        last = rows[-1] if rows else None
+        if last is not None:
+            top, bottom = b[last, 1].min(), b[last, 3].max()
+            overlap = min(bottom, b[i, 3]) - max(top, b[i, 1])
+            if overlap >= 0.5 * min(bottom - top, b[i, 3] - b[i, 1]):
+                last.append(i)
+                continue
+        rows.append([i])
+    return [np.array(sorted(r, key=lambda i: b[i, 0])) for r in rows]
+
+
+def group(detections: Sequence[Tuple[Any, str]], confidences: Optional[Sequence[float]] = None) -> Layout:
+    """
+    Group ``(quad, text)`` detections into entities. Components with a single
+    row of text become loose labels. ``confidences`` (EasyOCR's, one per
+    detection) give each entity the confidence of its least certain text.
+    """
+    if not detections:
+        return Layout([], [])
+    texts = [text for _, text in detections]
+    b = bounds([quad for quad, _ in detections])
+    labels = components(same_box(b))
+
+    entities: List[Entity] = []
+    loose: List[Tuple[float, float, str]] = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        rows = [" ".join(texts[i] for i in row) for row in _rows(members, b)]
+        if len(rows) < 2:
+            loose.append((b[members, 1].min(), b[members, 0].min(), rows[0]))
+            continue
+        x0, y0 = b[members, :2].min(axis=0)
+        x1, y1 = b[members, 2:].max(axis=0)
+        confidence = None if confidences is None else float(min(confidences[i] for i in members))
+        entities.append(Entity(rows[0], rows[1:], (int(x0), int(y0), int(x1), int(y1)), confidence))
+
+    # Reading order: top to bottom, then left to right, by each group's top-left corner.
+    entities.sort(key=lambda e: (e.box[1], e.box[0]))
+    return Layout(entities, [text for _, _, text in sorted(loose)])
+
+
+def compact(layout: Layout) -> str:
+    """One line per entity ("Student: student_id PK, name, email"), then the loose labels."""
+    lines = [f"{e.name}: {', '.join(e.attributes)}" for e in layout.entities]
+    if layout.loose:
+        lines.append(f"Other labels: {', '.join(layout.loose)}")
+    return "\n".join(lines)
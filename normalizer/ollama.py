@@ -0,0 +1,225 @@
+"""
+Shared Ollama client.
+
+Every pipeline talks to Ollama through one pooled ``requests.Session`` so TCP
+connections are reused across calls and sessions. Connection failures and 5xx
+responses are retried with jittered exponential backoff before any response
+bytes are consumed. ``AsyncOllamaClient`` exposes the same calls to asyncio code.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+from normalizer import config
+from normalizer import metrics
+
+
+def normalize_base_url(host: str) -> str:
+    """Accept OLLAMA_HOST-style values such as "localhost:11434" or "http://gpu-box:11434/"."""
+    host = host.strip().rstrip("/")
+    if "://" not in host:
+        host = f"http://{host}"
+    return host
+
+
+def keep_alive_value(raw: str) -> Any:
+    """Ollama takes keep_alive as a duration string ("30m") or a number of seconds (-1 = forever)."""
+    return int(raw) if raw.lstrip("-").isdigit() else raw
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def stalled(error: BaseException) -> bool:
+    """
+    True for the ConnectionError requests raises when a response that had already
+    started stops arriving (a read timeout between chunks), as opposed to a server
+    that could not be reached at all.
+    """
+    return isinstance(error, requests.exceptions.ConnectionError) and any(
+        isinstance(arg, ReadTimeoutError) for arg in error.args
+    )
+
+
+def _as_read_timeout(error: requests.exceptions.ConnectionError) -> requests.exceptions.ReadTimeout:
+    return requests.exceptions.ReadTimeout(*error.args, request=error.request, response=error.response)
+
+
+class OllamaClient:
+    """Synchronous Ollama client with pooled keep-alive connections and retries."""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        pool_size: Optional[int] = None,
+    ):
+        self.base_url = normalize_base_url(base_url or config.OLLAMA_HOST)
+        self.model = model or config.OLLAMA_MODEL
+        self.connect_timeout = connect_timeout or config.OLLAMA_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or config.OLLAMA_READ_TIMEOUT
+        self.retries = config.OLLAMA_RETRIES if retries is None else retries
+        pool_size = pool_size or config.OLLAMA_POOL_SIZE
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """POST with retries on connection errors and 5xx; other HTTP errors raise immediately."""
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(
+                    url,
+                    json=payload,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=stream,
+                )
+                if resp.status_code >= 500 and attempt < self.retries:
+                    resp.close()
+                else:
+                    resp.raise_for_status()
+                    return resp
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                # A read timeout means the model is busy generating; retrying would only double the wait.
+                if stalled(e):
+                    raise _as_read_timeout(e) from e
+                if attempt >= self.retries:
+                    raise
+            time.sleep(backoff_delay(attempt, config.OLLAMA_BACKOFF_BASE, config.OLLAMA_BACKOFF_MAX))
+            attempt += 1
+
+    def chat(
+        self,
+        payload: Dict[str, Any],
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Send a /api/chat request and return (text, stream_stats).
+        When ``on_text`` is given the reply is streamed as NDJSON and the callback
+        receives the accumulated text after every chunk.
+        """
+        payload = {"model": self.model, **payload}
+        if config.OLLAMA_KEEP_ALIVE and "keep_alive" not in payload:
+            payload["keep_alive"] = keep_alive_value(config.OLLAMA_KEEP_ALIVE)
+        if on_text is None:
+            with metrics.timed("ollama_request"):
+                body = self._post("/api/chat", {**payload, "stream": False}).json()
+            metrics.record_ollama_response(body)
+            return body.get("message", {}).get("content", "").strip(), {}
+
+        start = time.perf_counter()
+        first_token_at = None
+        pieces = []
+        final_chunk: Dict[str, Any] = {}
+
+        with self._post("/api/chat", {**payload, "stream": True}, stream=True) as resp:
+            for line in self._lines(resp):
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+
+                piece = chunk.get("message", {}).get("content", "")
+                if piece:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    pieces.append(piece)
+                    on_text("".join(pieces))
+
+                if chunk.get("done"):
+                    final_chunk = chunk
+                    break
+
+        end = time.perf_counter()
+        metrics.observe("ollama_request", end - start)
+        metrics.observe("ollama_ttft", (first_token_at or end) - start)
+        metrics.record_ollama_response(final_chunk)
+        # Prefer Ollama's own counters from the final chunk; fall back to our wall clock.
+        eval_count = final_chunk.get("eval_count") or len(pieces)
+        eval_seconds = (final_chunk.get("eval_duration") or 0) / 1e9 or (end - (first_token_at or start))
+        stats = {
+            "ttft": (first_token_at or end) - start,
+            "tokens": eval_count,
+            "tokens_per_sec": eval_count / eval_seconds if eval_seconds > 0 else None,
+        }
+        return "".join(pieces).strip(), stats
+
+    @staticmethod
+    def _lines(resp: requests.Response):
+        """``resp.iter_lines()``, raising a stall mid-reply as the read timeout it is."""
+        try:
+            yield from resp.iter_lines()
+        except requests.exceptions.ConnectionError as e:
+            if stalled(e):
+                raise _as_read_timeout(e) from e
+            raise
+
+    def load(self, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Load ``model`` into memory without generating anything (an empty
+        /api/generate request) and keep it there for the configured keep_alive.
+        """
+        payload: Dict[str, Any] = {"model": model or self.model, "stream": False}
+        if config.OLLAMA_KEEP_ALIVE:
+            payload["keep_alive"] = keep_alive_value(config.OLLAMA_KEEP_ALIVE)
+        return self._post("/api/generate", payload).json()
+
+    def running(self) -> Dict[str, Dict[str, Any]]:
+        """Models currently loaded by Ollama (/api/ps), keyed by name."""
+        resp = self.session.get(f"{self.base_url}/api/ps", timeout=(self.connect_timeout, self.connect_timeout))
+        resp.raise_for_status()
+        return {m.get("name", ""): m for m in resp.json().get("models", [])}
+
+
+class AsyncOllamaClient:
+    """
+    asyncio front-end over the pooled sync client. Calls run in worker threads
+    so the event loop stays free while the shared connection pool is reused.
+    """
+
+    def __init__(self, client: Optional[OllamaClient] = None):
+        self.client = client or get_client()
+
+    async def chat(
+        self,
+        payload: Dict[str, Any],
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        return await asyncio.to_thread(self.client.chat, payload, on_text)
+
+
+_CLIENT: Optional[OllamaClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> OllamaClient:
+    """Return the process-wide client configured from the environment."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = OllamaClient()
+        return _CLIENT
+
+
+def set_client(client: OllamaClient) -> None:
+    """Replace the process-wide client (benchmarks point it at a stub server)."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = client
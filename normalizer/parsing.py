@@ -0,0 +1,398 @@
+"""
+Single-pass parser for model output.
+
+Turns the Markdown report (or, in JSON mode, the structured reply) into one
+``ParsedResult`` per analysis. The page, the CLI and the cache all reuse its
+sections, score, entities and relationships instead of re-running regexes on
+every Streamlit rerun.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+HEADER_RE = re.compile(r"^##\s+(.+)$")
+BULLET_CHARS = ("- ", "* ", "• ", "+ ")
+CARDINALITY_RE = re.compile(
+    r"\b(?:1\s*:\s*1|1\s*:\s*[NnMm]|[NnMm]\s*:\s*1|[NnMm]\s*:\s*[NnMm]|"
+    r"one[- ]to[- ](?:one|many)|many[- ]to[- ](?:one|many))\b",
+    re.IGNORECASE,
+)
+ENTITY_RE = re.compile(r"^\**\s*([A-Za-z_][\w ]*?)\s*\**\s*(?::|\(|\s[-–]\s)\s*(.*)$")
+RELATIONSHIP_FALLBACK_RE = re.compile(r"^\**(\w+)\**\s+(.+?)\s+\**(\w+)\**$")
+KEY_MARKERS = re.compile(r"\((?:[^)]*)\)|\b(?:PK|FK)\b", re.IGNORECASE)
+PRIMARY_RE = re.compile(r"\bPK\b|\bprimary\b", re.IGNORECASE)
+FOREIGN_RE = re.compile(r"\bFK\b|\bforeign\b", re.IGNORECASE)
+
+# JSON schema passed as Ollama's ``format`` when ERN_OLLAMA_JSON is on.
+RESULT_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "overview": {"type": "string"},
+        "entities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "attributes": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["name", "attributes"],
+            },
+        },
+        "relationships": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "source": {"type": "string"},
+                    "target": {"type": "string"},
+                    "label": {"type": "string"},
+                    "cardinality": {"type": "string"},
+                },
+                "required": ["source", "target"],
+            },
+        },
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}},
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "score_reasoning": {"type": "string"},
+    },
+    "required": ["overview", "entities", "relationships", "issues", "suggestions", "score", "score_reasoning"],
+}
+
+JSON_INSTRUCTIONS = (
+    "\nIgnore the Markdown output format above. Respond ONLY with a JSON object with the keys "
+    "overview, entities (name, attributes; mark keys like 'student_id (PK)'), relationships "
+    "(source, target, label, cardinality), issues, suggestions, score (0-100) and score_reasoning.\n"
+)
+
+
+class Attribute(NamedTuple):
+    name: str
+    primary: bool = False
+    foreign: bool = False
+
+
+class Entity(NamedTuple):
+    name: str
+    attributes: Tuple[Attribute, ...] = ()
+
+
+class Relationship(NamedTuple):
+    source: str
+    target: str
+    label: str = ""
+    cardinality: str = ""
+
+
+class Section(NamedTuple):
+    title: str
+    body: str
+    kind: str  # overview | entities | relationships | issues | suggestions | score | other
+
+
+class ParsedResult:
+    """Everything the renderers need from one model reply, parsed once."""
+
+    __slots__ = ("sections", "score", "score_reasoning", "entities", "relationships", "issues", "suggestions", "structured")
+
+    def __init__(
+        self,
+        sections: Tuple[Section, ...] = (),
+        score: Optional[int] = None,
+        score_reasoning: str = "",
+        entities: Tuple[Entity, ...] = (),
+        relationships: Tuple[Relationship, ...] = (),
+        issues: Tuple[str, ...] = (),
+        suggestions: Tuple[str, ...] = (),
+        structured: bool = False,
+    ):
+        self.sections = sections
+        self.score = score
+        self.score_reasoning = score_reasoning
+        self.entities = entities
+        self.relationships = relationships
+        self.issues = issues
+        self.suggestions = suggestions
+        self.structured = structured
+
+    def cards(self) -> List[Section]:
+        """Sections shown as cards (the score has its own panel)."""
+        return [s for s in self.sections if s.kind != "score"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form stored alongside cached results."""
+        return {
+            "sections": [list(s) for s in self.sections],
+            "score": self.score,
+            "score_reasoning": self.score_reasoning,
+            "entities": entities_to_dicts(self.entities),
+            "relationships": [r._asdict() for r in self.relationships],
+            "issues": list(self.issues),
+            "suggestions": list(self.suggestions),
+            "structured": self.structured,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ParsedResult":
+        return cls(
+            sections=tuple(Section(*s) for s in data.get("sections", [])),
+            score=data.get("score"),
+            score_reasoning=data.get("score_reasoning", ""),
+            entities=tuple(
+                Entity(e["name"], tuple(Attribute(**a) for a in e.get("attributes", [])))
+                for e in data.get("entities", [])
+            ),
+            relationships=tuple(Relationship(**r) for r in data.get("relationships", [])),
+            issues=tuple(data.get("issues", [])),
+            suggestions=tuple(data.get("suggestions", [])),
+            structured=bool(data.get("structured")),
+        )
+
+    def to_markdown(self) -> str:
+        """Render in the prompts' '## N. Title' report format (used for JSON-mode replies)."""
+        return "\n\n".join(f"## {s.title}\n{s.body}".rstrip() for s in self.sections) + "\n"
+
+
+def entities_to_dicts(entities: Iterable[Entity]) -> List[Dict[str, Any]]:
+    return [{"name": e.name, "attributes": [a._asdict() for a in e.attributes]} for e in entities]
+
+
+def parse_score_from_text(text: str) -> int:
+    """
+    Robustly extracts a 0-100 score from model text.
+    It prioritizes explicit 'Score: NN' patterns but falls back to 'NN/100'.
+    """
+    if not text:
+        return None
+
+    m1 = re.search(r"Score\s*[:\-]?\s*(\d{1,3})", text, flags=re.IGNORECASE)
+
+    m2 = re.search(r"(\d{1,3})\s*/\s*100", text)
+
+    val = None
+
+    # Prefer Strategy 1 if it exists and looks reasonable
+    if m1:
+        val = int(m1.group(1))
+
+    # If Strategy 1 failed or gave a weird number (like 0 or >100), try Strategy 2
+    if (val is None or val < 0 or val > 100) and m2:
+        val = int(m2.group(1))
+
+    # Final sanity check
+    if val is not None:
+        return max(0, min(val, 100))
+
+    return None
+
+
+def split_sections(summary_text: str) -> List[Tuple[str, str]]:
+    """Split model output on '## Title' headers into (title, body) pairs."""
+    parts = re.split(r"(?m)^##\s+(.+)$", summary_text or "")
+    return [
+        (parts[i].strip(), parts[i + 1].strip() if i + 1 < len(parts) else "")
+        for i in range(1, len(parts), 2)
+    ]
+
+
+def section_kind(title: str) -> str:
+    t = title.lower()
+    if "score" in t:
+        return "score"
+    if "issue" in t or "error" in t or "problem" in t:
+        return "issues"
+    if "suggestion" in t or "fix" in t or "recommend" in t:
+        return "suggestions"
+    if "relationship" in t:
+        return "relationships"
+    if "entit" in t or "attribute" in t:
+        return "entities"
+    if "overview" in t or "summary" in t:
+        return "overview"
+    return "other"
+
+
+def parse_attribute(text: str) -> Optional[Attribute]:
+    """'student_id (PK)' -> Attribute('student_id', primary=True)."""
+    name = KEY_MARKERS.sub("", text).strip(" *`.")
+    if not name:
+        return None
+    return Attribute(name=name, primary=bool(PRIMARY_RE.search(text)), foreign=bool(FOREIGN_RE.search(text)))
+
+
+def split_attributes(text: str) -> List[str]:
+    """Split on commas that are not inside parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_entity(item: str) -> Optional[Entity]:
+    """'**Student**: student_id (PK), name' -> Entity('Student', (...))."""
+    m = ENTITY_RE.match(item)
+    if not m:
+        name = item.strip(" *`")
+        return Entity(name) if name and re.fullmatch(r"[A-Za-z_]\w*", name) else None
+    rest = m.group(2)
+    if rest.endswith(")") and rest.count(")") > rest.count("("):
+        rest = rest[:-1]  # '**Student** (student_id, name)' form
+    attributes = tuple(a for a in (parse_attribute(p) for p in split_attributes(rest)) if a)
+    return Entity(m.group(1).strip(), attributes)
+
+
+def parse_relationship(item: str, entity_names: Iterable[str]) -> Optional[Relationship]:
+    """'Student enrolls in Course (M:N)' -> Relationship('Student', 'Course', 'enrolls in', 'M:N')."""
+    m = CARDINALITY_RE.search(item)
+    cardinality = re.sub(r"\s+", "", m.group(0)).upper() if m else ""
+    text = re.sub(r"\([^)]*\)", "", CARDINALITY_RE.sub("", item)).replace("**", "").strip(" -:.")
+
+    hits = []
+    for name in entity_names:
+        found = re.search(rf"\b{re.escape(name)}\b", text, flags=re.IGNORECASE)
+        if found:
+            hits.append((found.start(), found.end(), name))
+    hits.sort()
+    if len(hits) >= 2:
+        (s0, s1, source), (t0, _, target) = hits[0], hits[1]
+        label = text[s1:t0].strip(" -–>→:")
+        return Relationship(source, target, label, cardinality)
+
+    ends = re.split(r"\s*(?:<->|->|→|=>|↔)\s*", text)
+    if len(ends) == 2 and all(re.fullmatch(r"\w+", e.strip(" *")) for e in ends):
+        return Relationship(ends[0].strip(" *"), ends[1].strip(" *"), "", cardinality)
+    fallback = RELATIONSHIP_FALLBACK_RE.match(text)
+    if fallback:
+        return Relationship(fallback.group(1), fallback.group(3), fallback.group(2).strip(), cardinality)
+    return None
+
+
+def parse_report(text: str) -> ParsedResult:
+    """Parse a model reply once: sections, score, entities, relationships, issues and suggestions."""
+    stripped = (text or "").strip()
+    if stripped.startswith("{"):
+        try:
+            return from_structured(json.loads(stripped))
+        except (ValueError, TypeError, AttributeError):
+            pass  # not valid JSON after all; treat it as Markdown
+
+    sections: List[Section] = []
+    entities: List[Entity] = []
+    relationship_items: List[str] = []
+    issues: List[str] = []
+    suggestions: List[str] = []
+    score_lines: List[str] = []
+    reasoning: List[str] = []
+
+    title, kind, body = None, "", []
+    for line in stripped.splitlines() + ["## "]:  # sentinel header flushes the last section
+        header = HEADER_RE.match(line) if line.startswith("##") else None
+        if header or line == "## ":
+            if title is not None:
+                sections.append(Section(title, "\n".join(body).strip(), kind))
+            title = header.group(1).strip() if header else None
+            kind, body = section_kind(title or ""), []
+            continue
+        if title is None:
+            continue
+        body.append(line)
+
+        s = line.strip()
+        if kind == "score":
+            if "Score:" in line:
+                score_lines.append(line)
+            else:
+                reasoning.append(line)
+        elif s.startswith(BULLET_CHARS):
+            item = s[1:].strip()
+            if kind == "entities":
+                entity = parse_entity(item)
+                if entity:
+                    entities.append(entity)
+            elif kind == "relationships":
+                relationship_items.append(item)
+            elif kind == "issues":
+                issues.append(item)
+            elif kind == "suggestions":
+                suggestions.append(item)
+
+    names = [e.name for e in entities]
+    relationships = [r for r in (parse_relationship(item, names) for item in relationship_items) if r]
+    score = parse_score_from_text("\n".join(score_lines)) if score_lines else None
+    if score is None:
+        score = parse_score_from_text(stripped)
+
+    return ParsedResult(
+        sections=tuple(sections),
+        score=score,
+        score_reasoning="\n".join(reasoning).strip(),
+        entities=tuple(entities),
+        relationships=tuple(relationships),
+        issues=tuple(issues),
+        suggestions=tuple(suggestions),
+    )
+
+
+def from_result(result: Dict[str, Any]) -> ParsedResult:
+    """The ParsedResult for a pipeline result block; older cache entries are parsed from their summary."""
+    if result.get("parsed"):
+        return ParsedResult.from_dict(result["parsed"])
+    return parse_report(result.get("summary", ""))
+
+
+def from_structured(data: Dict[str, Any]) -> ParsedResult:
+    """Build a ParsedResult from a JSON-mode reply, synthesizing the usual report sections."""
+    entities = tuple(
+        Entity(
+            str(e.get("name", "")).strip(),
+            tuple(a for a in (parse_attribute(str(x)) for x in e.get("attributes", [])) if a),
+        )
+        for e in data.get("entities", [])
+        if isinstance(e, dict) and e.get("name")
+    )
+    relationships = tuple(
+        Relationship(
+            str(r.get("source", "")), str(r.get("target", "")),
+            str(r.get("label", "") or ""), str(r.get("cardinality", "") or "").upper(),
+        )
+        for r in data.get("relationships", [])
+        if isinstance(r, dict) and r.get("source") and r.get("target")
+    )
+    issues = tuple(str(i) for i in data.get("issues", []))
+    suggestions = tuple(str(s) for s in data.get("suggestions", []))
+    score = data.get("score")
+    score = max(0, min(int(score), 100)) if isinstance(score, (int, float)) else None
+    reasoning = str(data.get("score_reasoning", "")).strip()
+
+    def bullets(items: Iterable[str]) -> str:
+        return "\n".join(f"- {item}" for item in items)
+
+    def describe(entity: Entity) -> str:
+        attrs = ", ".join(
+            a.name + (" (PK)" if a.primary else "") + (" (FK)" if a.foreign else "") for a in entity.attributes
+        )
+        return f"**{entity.name}**: {attrs}" if attrs else f"**{entity.name}**"
+
+    def relate(r: Relationship) -> str:
+        middle = f" {r.label} " if r.label else " → "
+        return f"{r.source}{middle}{r.target}" + (f" ({r.cardinality})" if r.cardinality else "")
+
+    sections = (
+        Section("1. Overview", str(data.get("overview", "")).strip(), "overview"),
+        Section("2. Entities & Attributes", bullets(describe(e) for e in entities), "entities"),
+        Section("3. Relationships", bullets(relate(r) for r in relationships), "relationships"),
+        Section("4. Issues", bullets(issues), "issues"),
+        Section("5. Suggestions", bullets(suggestions), "suggestions"),
+        Section("6. Score", (f"Score: {score}/100\n" if score is not None else "") + reasoning, "score"),
+    )
+    return ParsedResult(sections, score, reasoning, entities, relationships, issues, suggestions, structured=True)
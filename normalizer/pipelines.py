@@ -0,0 +1,548 @@
+"""
+Analysis pipelines: prompts, Ollama calls, OCR and score parsing.
+
+Nothing in here imports Streamlit, so the results page, the batch CLI and the
+benchmarks all share the same code path.
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from PIL import Image
+
+from normalizer import cache as analysis_cache
+from normalizer import config
+from normalizer import imaging
+from normalizer import metrics
+from normalizer import models
+from normalizer import ocr
+from normalizer import ocrclean
+from normalizer import ocrlayout
+from normalizer import ollama
+from normalizer import parsing
+from normalizer import rules
+from normalizer import scheduler
+from normalizer import similarity
+from normalizer.parsing import parse_score_from_text, split_sections  # re-exported for callers
+
+# Pipeline identifiers (stored as results["mode"]) and the labels shown on the upload page.
+METHOD_LABELS = {
+    "ocr_llm": "OCR + text LLM (baseline)",
+    "llava_image": "LLaVA image-based (Ollama)",
+    "llava_extract": "LLaVA extraction (entities & relationships)",
+    "hybrid": "Hybrid OCR + LLaVA (image + text)",
+}
+# Where each pipeline's LLM reply sits in a results payload.
+RESULT_KEYS = {"ocr_llm": "llmresults", "hybrid": "llmresults", "llava_image": "llavaresults", "llava_extract": "extractresults"}
+
+
+LLAVA_MODEL = config.OLLAMA_MODEL
+LLAVA_OPTIONS = {"temperature": 0.1}
+OCR_LLM_OPTIONS = {"temperature": 0.1, "num_ctx": 2048}
+
+# Prompt focused on General Analysis
+VISION_PROMPT = (
+    "You are an expert Senior Database Engineer.\n"
+    "Analyze this ER diagram image.\n"
+    "Ignore watermark text or software UI noise.\n\n"
+    "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
+    "OUTPUT FORMAT (Strictly use these Markdown headers):\n\n"
+    "## 1. Overview\n"
+    "(1-2 sentences on what the diagram represents)\n\n"
+    "## 2. Entities & Attributes\n"
+    "(List detected entities and attributes. Use dashes '-' for lists.)\n\n"
+    "## 3. Relationships\n"
+    "(List connections between entities. Use dashes '-' for lists.)\n\n"
+    "## 4. Issues\n"
+    "(List logical database design issues, e.g., missing keys, bad cardinality. Do NOT mention OCR noise. It is not necessary to find issues if there are none.)\n\n"
+    "## 5. Suggestions\n"
+    "(Concrete fixes for the issues)\n\n"
+    "## 6. Score\n"
+    "Score: NN/100\n"
+    "(Brief justification)\n"
+)
+
+# Prompt tuned for HIGH DETAIL EXTRACTION
+EXTRACTION_PROMPT = (
+    "You are a Database Architect specializing in Reverse Engineering.\n"
+    "Extract every detail from this ER diagram image into a formal report.\n"
+    "Be extremely precise with attribute names and relationship types.\n\n"
+    "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
+    "OUTPUT FORMAT (Strictly use these Markdown headers):\n\n"
+    "## 1. Overview\n"
+    "(Brief summary of the domain)\n\n"
+    "## 2. Entities & Attributes\n"
+    "(List EVERY entity and ALL its attributes found in the image. Be exhaustive.)\n\n"
+    "## 3. Relationships\n"
+    "(List every line connecting boxes, including cardinality labels like '1', 'N', 'M' if visible.)\n\n"
+    "## 4. Issues\n"
+    "(Critique the design: are Primary Keys marked? Are relationships named? Issues are not necessary to be found if there are none.)\n\n"
+    "## 5. Suggestions\n"
+    "(How to make this diagram professional)\n\n"
+    "## 6. Score\n"
+    "Score: NN/100\n"
+    "(Brief justification)\n"
+)
+
+
+# Report layout shared by the raw and cleaned OCR prompts.
+OCR_OUTPUT_SECTIONS = (
+    "### OUTPUT SECTIONS:\n\n"
+    "## 1. Overview\n"
+    "(1-2 sentences on what the Valid parts of the diagram represent)\n\n"
+    "## 2. Entities & Attributes\n"
+    "(List ONLY the valid, real entities you detected. Correct spelling errors if obvious.)\n"
+    "- **EntityName**: Attribute1, Attribute2, ...\n\n"
+    "## 3. Relationships\n"
+    "(List valid relationships between the real entities)\n"
+    "- EntityA connects to EntityB (Type if known)\n\n"
+    "## 4. Issues\n"
+    "(List ONLY logical database issues like missing keys or bad cardinality. DO NOT mention OCR typos or gibberish words here. Do not need to find issues if there are none.)\n\n"
+    "## 5. Suggestions\n"
+    "(Standard database improvements)\n\n"
+    "## 6. Score\n"
+    "Score: NN/100\n"
+    "(Brief justification)\n"
+)
+
+
+def build_ocr_prompt(extracted_text: str, cleaned: bool = False, checks: str = "") -> str:
+    """
+    Build the text-only prompt around OCR output; cleaned text needs no
+    filtering instructions. ``checks`` is ``rules.prompt_note`` output.
+    """
+    checks = f"{checks}\n" if checks else ""
+    if cleaned:
+        # ocrclean has already dropped the gibberish and fixed the misreads the hardened prompt describes.
+        return (
+            "You are an expert Senior Database Engineer.\n"
+            "Below is OCR text from an Entity Relationship Diagram (ERD), already filtered and spell-checked.\n\n"
+            "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
+            f"OCR DATA:\n{extracted_text}\n\n"
+            + checks +
+            "Do NOT report OCR artifacts or typos as issues. Use Markdown headers (##) and bullet points (-).\n\n"
+            + OCR_OUTPUT_SECTIONS
+        )
+    # HARDENED PROMPT
+    return (
+        "You are an expert Senior Database Engineer acting as a Data Cleaner.\n"
+        "You have been given raw, dirty OCR text from an Entity Relationship Diagram (ERD).\n"
+        "The OCR text contains significant 'hallucinations' (gibberish words, random characters, misread labels).\n\n"
+        "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
+        f"RAW OCR DATA:\n{extracted_text}\n\n"
+        + checks +
+        "### STRICT INSTRUCTIONS:\n"
+        "1. **AGGRESSIVE FILTERING**: Before analyzing, mentally delete any text that does not look like a valid English word, a standard database abbreviation (e.g., PK, FK, ID), or a plausible variable name.\n"
+        "   - Example: 'Checynll', 'Haptd', 'Hadidid', 'Habitnmm' -> IGNORE THESE COMPLETELY.\n"
+        "   - Example: 'User', 'Student', 'enroll_date' -> KEEP THESE.\n"
+        "2. **DO NOT REPORT NOISE**: Do NOT list OCR artifacts in the 'Issues' section. If you see 'Haptd', pretend you never saw it. Do not suggest removing it; just exclude it from your output entirely.\n"
+        "3. **INFER CONTEXT**: If you see 'Studnt', correct it to 'Student'. If you see 'Primry Key', treat it as 'Primary Key'.\n"
+        "4. **OUTPUT FORMAT**: Use Markdown headers (##) and bullet points (-).\n\n"
+        + OCR_OUTPUT_SECTIONS
+    )
+
+
+def response_format() -> str:
+    """Reply format requested from the model; part of every LLM cache key."""
+    return "json" if config.OLLAMA_JSON_MODE else "markdown"
+
+
+def _with_json_format(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Constrain the reply to parsing.RESULT_SCHEMA and tell the model so in the prompt."""
+    messages = [dict(m) for m in payload["messages"]]
+    messages[-1]["content"] = messages[-1]["content"] + parsing.JSON_INSTRUCTIONS
+    return {**payload, "messages": messages, "format": parsing.RESULT_SCHEMA}
+
+
+def _run_chat(
+    payload: Dict[str, Any],
+    on_text: Optional[Callable[[str], None]] = None,
+    complexity: Optional[models.Complexity] = None,
+) -> Dict[str, Any]:
+    """
+    Send a chat request to the model routed for ``complexity`` (falling back
+    along the chain on failure) and wrap the reply (or failure) as a result
+    block, parsed once into sections, score, entities and relationships.
+    """
+    stream_stats: Dict[str, Any] = {}
+    chain = models.route(complexity)
+    served_by = None
+    model_failures: List[Dict[str, str]] = []
+    if config.OLLAMA_JSON_MODE:
+        payload = _with_json_format(payload)
+        on_text = None  # partial JSON has no sections to preview
+    try:
+        # Queued behind other sessions' requests; raises SchedulerBusy instead of piling onto Ollama.
+        with scheduler.get_scheduler().slot():
+            served = models.chat(chain, payload, on_text=on_text)
+        raw, stream_stats, served_by, model_failures = served
+        error = False
+    except scheduler.SchedulerBusy:
+        raw = (
+            "## ⚠️ Server Busy\n"
+            "The model is handling too many analyses right now, so this one was not started.\n\n"
+            "**How to fix:**\n"
+            "- Wait a minute and run the analysis again.\n"
+            "- Nothing was cached, so retrying will send a fresh request."
+        )
+        error = True
+    except requests.exceptions.ConnectionError:
+        raw = (
+            "## ⚠️ Connection Error\n"
+            "Could not connect to **Ollama**.\n\n"
+            "**How to fix:**\n"
+            "- Make sure the Ollama llava model is running.\n"
+            "- Ensure you have pulled the model using `ollama pull llava`."
+        )
+        error = True
+    except Exception as e:
+        tried = ", ".join(chain)
+        raw = f"## ⚠️ System Error\nError calling LLaVA ({tried}): {e}"
+        error = True
+
+    with metrics.timed("parse"):
+        parsed = parsing.parse_report(raw)
+    summary = parsed.to_markdown() if parsed.structured else raw
+    entities = parsing.entities_to_dicts(parsed.entities)
+    relationships = [r._asdict() for r in parsed.relationships]
+
+    return {
+        "summary": summary,
+        "raw_output": raw,
+        "score": None if error else parsed.score,
+        "error": error,
+        "stream_stats": stream_stats,
+        "parsed": parsed.to_dict(),
+        "entities": entities,
+        "relationships": relationships,
+        "model": served_by,
+        "model_tier": models.tier(complexity),
+        "model_failures": model_failures,
+    }
+
+
+# --- 1. LLaVA IMAGE ANALYSIS (Vision Mode) ---
+def analyze_diagram_with_llava(
+    image: Image.Image,
+    on_text: Optional[Callable[[str], None]] = None,
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Directly analyzes the image using LLaVA (Vision). 
+    Focuses on a balanced analysis of structure and logic.
+    """
+    encoded = imaging.encode_for_model(image, digest)
+
+    payload = {
+        "messages": [{
+            "role": "user",
+            "content": VISION_PROMPT,
+            "images": [encoded.b64],
+        }],
+        "options": LLAVA_OPTIONS,
+    }
+
+    result = _run_chat(payload, on_text, models.Complexity.of(image))
+    result["image_stats"] = encoded.stats()
+    return result
+
+
+# --- 2. LLaVA EXTRACTION (Detailed Mode) ---
+def extract_with_llava(
+    image: Image.Image,
+    on_text: Optional[Callable[[str], None]] = None,
+    digest: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Also uses LLaVA (Vision), but the prompt is tuned slightly more 
+    towards rigorous extraction of details before analysis.
+    """
+    encoded = imaging.encode_for_model(image, digest)
+
+    payload = {
+        "messages": [{
+            "role": "user",
+            "content": EXTRACTION_PROMPT,
+            "images": [encoded.b64],
+        }],
+        "options": LLAVA_OPTIONS,
+    }
+
+    result = _run_chat(payload, on_text, models.Complexity.of(image))
+    result["image_stats"] = encoded.stats()
+    return result
+
+# --- 3. OCR AND TEXT LLM (Baseline Mode) ---
+def run_ocr(image: Image.Image) -> Dict[str, Any]:
+    """Run OCR on the uploaded image using EasyOCR."""
+    np_img = np.array(image.convert("RGB"))
+
+    if ocr.should_tile(image.width, image.height):
+        # Large diagrams: overlapping tiles across the reader pool, merged back into one list.
+        with metrics.timed("ocr"):
+            detections = ocr.readtext_tiled(np_img, ["en"])
+    else:
+        # Readers are shared across sessions; building one per call reloads the models.
+        with ocr.reader(["en"]) as reader, metrics.timed("ocr"):
+            detections = reader.readtext(np_img, detail=1)
+
+    lines = [(text, float(conf)) for _, text, conf in detections]
+    with metrics.timed("ocr_cleanup"):
+        cleanup = ocrclean.clean(lines)
+
+    # Boxes tell which attributes sit under which entity name; lines dropped as noise take no part.
+    with metrics.timed("ocr_layout"):
+        kept = [(quad, text, float(conf)) for (quad, _, conf), text in zip(detections, cleanup.per_line) if text]
+        layout = ocrlayout.group([(quad, text) for quad, text, _ in kept], [conf for _, _, conf in kept])
+
+    payload = {
+        "extracted_text": "\n".join(text for text, _ in lines),
+        "cleanup": cleanup.stats(),
+        "entities": [e.as_dict() for e in layout.entities],
+        "relationships": [],
+    }
+    if config.OCR_CLEANUP:
+        payload["clean_text"] = cleanup.text
+    if config.OCR_GROUPING and layout.entities:
+        payload["layout_text"] = ocrlayout.compact(layout)
+    return payload
+
+
+def ocr_prompt_text(ocr_payload: Dict[str, Any]) -> Tuple[str, bool]:
+    """
+    (text, cleaned): the OCR text to put in a prompt. Prefers the per-entity
+    block, then the locally cleaned lines, then the raw OCR text.
+    """
+    text = ocr_payload.get("layout_text") or ocr_payload.get("clean_text")
+    if text is None:
+        text = ocr_payload.get("extracted_text", "")
+    return text, "clean_text" in ocr_payload
+
+
+def ocr_rules(ocr_payload: Dict[str, Any]) -> Optional[rules.Report]:
+    """Rule checks over the OCR-grouped entities, or None when disabled or nothing was grouped."""
+    if not config.RULES or not ocr_payload.get("entities"):
+        return None
+    return rules.check(rules.from_ocr(ocr_payload))
+
+
+def reply_rules(result: Dict[str, Any]) -> Optional[rules.Report]:
+    """Rule checks over the entities parsed from a model reply (vision modes have no OCR entities)."""
+    if not config.RULES or result.get("error"):
+        return None
+    entities = rules.from_result(result)
+    return rules.check(entities) if entities else None
+
+
+def ocr_prompt(ocr_payload: Dict[str, Any]) -> str:
+    """The full OCR + text LLM prompt for ``ocr_payload``; also what its cache key hashes."""
+    report = ocr_rules(ocr_payload)
+    checks = rules.prompt_note(report, settled=rules.ocr_trusted(ocr_payload)) if report else ""
+    return build_ocr_prompt(*ocr_prompt_text(ocr_payload), checks=checks)
+
+
+def ocr_complexity(ocr_payload: Dict[str, Any]) -> models.Complexity:
+    """Routing input for OCR-grounded modes: the number of text boxes kept after clean-up."""
+    cleanup = ocr_payload.get("cleanup")
+    if cleanup:
+        return models.Complexity(text_boxes=cleanup["lines_kept"])
+    return models.Complexity.of(extracted_text=ocr_payload.get("extracted_text", ""))
+
+
+def analyze_ocr_with_llava(
+    ocr_payload: Dict[str, Any],
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Analyze OCR-derived ER diagram text using LLaVA as a text-only LLM."""
+    payload = {
+        "messages": [
+            {
+                "role": "user",
+                "content": ocr_prompt(ocr_payload),
+            }
+        ],
+        "options": OCR_LLM_OPTIONS,
+    }
+
+    result = _run_chat(payload, on_text, ocr_complexity(ocr_payload))
+    result.update({"issues": result["parsed"]["issues"], "suggested_fixes": result["parsed"]["suggestions"]})
+    return result
+
+
+# --- 4. HYBRID OCR + VISION ---
+def build_hybrid_prompt(extracted_text: str, cleaned: bool = False, checks: str = "") -> str:
+    """Vision prompt grounded with OCR text so small labels are read correctly."""
+    caveat = "filtered and spell-checked, may still contain misreads" if cleaned else "may contain misreads and gibberish"
+    return (
+        VISION_PROMPT
+        + f"\nOCR TEXT FROM THE SAME IMAGE ({caveat}):\n"
+        + f"{extracted_text}\n\n"
+        + "Use the OCR text to spell entity and attribute names correctly, but trust the image for "
+        "boxes, lines and cardinality. Ignore OCR words that are not plausible labels and never report them as issues.\n"
+        + (f"\n{checks}" if checks else "")
+    )
+
+
+def hybrid_prompt(ocr_payload: Dict[str, Any]) -> str:
+    report = ocr_rules(ocr_payload)
+    checks = rules.prompt_note(report, settled=rules.ocr_trusted(ocr_payload)) if report else ""
+    return build_hybrid_prompt(*ocr_prompt_text(ocr_payload), checks=checks)
+
+
+def analyze_hybrid_with_llava(
+    encoded: imaging.EncodedImage,
+    ocr_payload: Dict[str, Any],
+    on_text: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """One LLaVA call that sees both the image and the OCR text."""
+    payload = {
+        "messages": [{
+            "role": "user",
+            "content": hybrid_prompt(ocr_payload),
+            "images": [encoded.b64],
+        }],
+        "options": LLAVA_OPTIONS,
+    }
+
+    # Routed on the OCR text-box count, which says more about the diagram than its resolution.
+    result = _run_chat(payload, on_text, ocr_complexity(ocr_payload))
+    result["image_stats"] = encoded.stats()
+    return result
+
+
+def _timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def run_hybrid(
+    image: Image.Image,
+    digest: Optional[str] = None,
+    original_bytes: int = 0,
+    on_text: Optional[Callable[[str], None]] = None,
+    on_ocr: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Run EasyOCR and image encoding in parallel threads, then send a single
+    grounded LLaVA request. Wall time is roughly max(OCR, encode) + one LLM call.
+    ``on_ocr`` gets the OCR payload as soon as it is ready, before the LLM call.
+    """
+    cache = analysis_cache.get_cache()
+    # Both branches read the pixels; a lazily opened image must be decoded once, before they share it.
+    image.load()
+
+    def ocr_branch() -> Tuple[Dict[str, Any], bool]:
+        if digest is None:
+            return run_ocr(image), False
+        return cache.get_or_compute(ocr_cache_key(digest), lambda: run_ocr(image))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="hybrid") as pool:
+        # Each branch runs in a copy of the caller's context so its stages keep the pipeline label.
+        ocr_future = pool.submit(contextvars.copy_context().run, _timed, ocr_branch)
+        encode_future = pool.submit(
+            contextvars.copy_context().run, _timed, lambda: imaging.encode_for_model(image, digest, original_bytes)
+        )
+        (ocr_payload, ocr_cached), ocr_seconds = ocr_future.result()
+        encoded, encode_seconds = encode_future.result()
+    parallel_seconds = time.perf_counter() - start
+    if on_ocr is not None:
+        on_ocr(ocr_payload)
+
+    def llm_call() -> Dict[str, Any]:
+        return analyze_hybrid_with_llava(encoded, ocr_payload, on_text)
+
+    if digest is None:
+        (llmresults, llm_cached), llm_seconds = _timed(lambda: (llm_call(), False))
+    else:
+        key = hybrid_cache_key(digest, ocr_payload)
+        (llmresults, llm_cached), llm_seconds = _timed(lambda: cache.get_or_compute(key, llm_call))
+
+    return {
+        "ocrresults": ocr_payload,
+        "llmresults": llmresults,
+        "cached": {"ocr": ocr_cached, "llm": llm_cached},
+        "timings": {
+            "ocr": ocr_seconds,
+            "encode": encode_seconds,
+            "parallel": parallel_seconds,
+            "llm": llm_seconds,
+        },
+    }
+
+
+# --- Cache keys shared by the results page and the CLI ---
+def ocr_cache_key(digest: str) -> str:
+    return analysis_cache.make_key(
+        digest, "ocr", "", "easyocr",
+        {"languages": ["en"], "tiling": ocr.tiling_settings(),
+         "cleanup": ocrclean.settings(), "grouping": ocrlayout.settings()},
+    )
+
+
+def _llm_key_options(options: Dict[str, Any], image: bool = False) -> Dict[str, Any]:
+    """Model options plus everything else that changes the reply (image encoding, reply format, routing)."""
+    extra = {"image": imaging.encoding_settings()} if image else {}
+    routing = models.routing_settings()
+    if routing:
+        extra["routing"] = routing
+    return {**options, **extra, "format": response_format()}
+
+
+def ocr_llm_cache_key(digest: str, ocr_payload: Dict[str, Any]) -> str:
+    return analysis_cache.make_key(
+        digest, "ocr_llm", ocr_prompt(ocr_payload), LLAVA_MODEL, _llm_key_options(OCR_LLM_OPTIONS)
+    )
+
+
+def vision_cache_key(digest: str) -> str:
+    return analysis_cache.make_key(
+        digest, "llava_image", VISION_PROMPT, LLAVA_MODEL, _llm_key_options(LLAVA_OPTIONS, image=True)
+    )
+
+
+def extract_cache_key(digest: str) -> str:
+    return analysis_cache.make_key(
+        digest, "llava_extract", EXTRACTION_PROMPT, LLAVA_MODEL, _llm_key_options(LLAVA_OPTIONS, image=True)
+    )
+
+
+def hybrid_cache_key(digest: str, ocr_payload: Dict[str, Any]) -> str:
+    return analysis_cache.make_key(
+        digest, "hybrid", hybrid_prompt(ocr_payload), LLAVA_MODEL,
+        _llm_key_options(LLAVA_OPTIONS, image=True),
+    )
+
+
+# --- Near-duplicate reuse ---
+def cached_result_key(mode: str, digest: str) -> Optional[str]:
+    """Cache key of the final analysis for ``mode`` on ``digest``, if that analysis is cached."""
+    cache = analysis_cache.get_cache()
+    if mode in ("ocr_llm", "hybrid"):
+        ocr_payload = cache.peek(ocr_cache_key(digest))
+        if ocr_payload is None:
+            return None
+        key = ocr_llm_cache_key(digest, ocr_payload) if mode == "ocr_llm" else hybrid_cache_key(digest, ocr_payload)
+    elif mode == "llava_image":
+        key = vision_cache_key(digest)
+    else:
+        key = extract_cache_key(digest)
+    return key if cache.peek(key) is not None else None
+
+
+def near_duplicate(mode: str, signature: similarity.Signature, digest: str) -> Optional[similarity.Match]:
+    """
+    Closest earlier upload that looks like the same diagram and already has a
+    cached ``mode`` analysis, or None.
+    """
+    index = similarity.get_index()
+    if index is None:
+        return None
+    for match in index.lookup(signature, config.SIMILARITY_THRESHOLD, exclude=digest)[:5]:
+        if cached_result_key(mode, match.digest):
+            return match
+    return None
@@ -0,0 +1,104 @@
+"""
+Display-sized previews of uploaded diagrams.
+
+Handing the full upload to ``st.image`` made Streamlit decode it, resize it
+to the page width and re-encode it on every rerun, and a 10-20 MB screenshot
+made every widget click slow. ``preview`` builds one column-width copy per
+upload digest instead, decoding the original once (JPEGs at a reduced scale
+straight from the DCT), and keeps it for every later rerun and session. The
+full-resolution original is only decoded when a pipeline runs.
+
+Previews are PNG or JPEG, whichever is smaller. ``st.image`` passes those
+through untouched when given the matching ``output_format``; any other
+format (WebP included) it re-encodes as JPEG on every call.
+"""
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from normalizer import blobs
+from normalizer import config
+from normalizer import imaging
+from normalizer import metrics
+
+
+class Preview(NamedTuple):
+    data: bytes
+    format: str  # "PNG" or "JPEG": pass as st.image's output_format
+    width: int
+    height: int
+    source_width: int
+    source_height: int
+    seconds: float
+
+
+_MEMO: "OrderedDict[Tuple[str, int], Preview]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+# One lock per preview being built, so concurrent sessions decode an upload once.
+_BUILDING: Dict[Tuple[str, int], threading.Lock] = {}
+
+
+def _build(data: memoryview, width: int) -> Preview:
+    start = time.perf_counter()
+    image = Image.open(BytesIO(data))
+    source_format, source_size = image.format, image.size
+    if image.width > width:
+        # JPEGs decode straight at 1/2-1/8 scale (no less than the preview); other formats
+        # are box-reduced before the LANCZOS pass. Together most of the win on huge screenshots.
+        image.draft("RGB", (width, image.height * width // image.width))
+        image.thumbnail((width, image.height), Image.LANCZOS, reducing_gap=3.0)
+    image = imaging.flatten(image)
+
+    candidates = []
+    buf = BytesIO()
+    image.save(buf, format="PNG")
+    candidates.append(("PNG", buf.getvalue()))
+    buf = BytesIO()
+    image.save(buf, format="JPEG", quality=config.PREVIEW_JPEG_QUALITY)
+    candidates.append(("JPEG", buf.getvalue()))
+    fmt, encoded = min(candidates, key=lambda c: len(c[1]))
+
+    # An upload already small enough (and in a format browsers show) is sent as it is.
+    if source_size[0] <= width and source_format in ("PNG", "JPEG") and len(data) <= len(encoded):
+        fmt, encoded = source_format, data.tobytes()
+
+    seconds = time.perf_counter() - start
+    metrics.observe("preview", seconds)
+    return Preview(encoded, fmt, image.width, image.height, source_size[0], source_size[1], seconds)
+
+
+def preview(digest: str, width: int = 0) -> Optional[Preview]:
+    """
+    The stored upload ``digest`` at most ``width`` px wide (default ERN_PREVIEW_WIDTH);
+    None if the upload is no longer stored.
+    """
+    key = (digest, width or config.PREVIEW_WIDTH)
+    with _MEMO_LOCK:
+        hit = _MEMO.get(key)
+        if hit is not None:
+            _MEMO.move_to_end(key)
+            return hit
+        building = _BUILDING.setdefault(key, threading.Lock())
+
+    with building:
+        with _MEMO_LOCK:
+            hit = _MEMO.get(key)
+        if hit is not None:
+            return hit
+        try:
+            data = blobs.get_store().get(digest)
+            if data is None:
+                return None
+            built = _build(data, key[1])
+            with _MEMO_LOCK:
+                _MEMO[key] = built
+                while len(_MEMO) > config.PREVIEW_MEMO_SIZE:
+                    _MEMO.popitem(last=False)
+        finally:
+            with _MEMO_LOCK:
+                _BUILDING.pop(key, None)
+    return built
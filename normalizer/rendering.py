@@ -0,0 +1,120 @@
+"""
+HTML rendering helpers for model output (section cards, markdown-ish text).
+
+Pure string functions with no Streamlit dependency, so the page and the
+benchmarks exercise the same code.
+"""
+import re
+from typing import Any, Dict
+
+from normalizer import rules
+from normalizer.parsing import ParsedResult, split_sections
+
+
+def format_text_to_html(text: str) -> str:
+    """
+    Converts Markdown (bold, lists, sub-headers) to HTML.
+    """
+    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
+
+    text = re.sub(r'(?m)^###+\s*(.*)$', r'<div style="margin-top: 4px; font-weight: 700;">\1</div>', text)
+    
+    lines = text.split('\n')
+    html_lines = []
+    in_list = False
+    
+    for line in lines:
+        stripped = line.strip()
+        
+        if stripped.startswith(('* ', '- ', '• ', '+ ')):
+            content = stripped[1:].strip() 
+            if not in_list:
+                html_lines.append("<ul style='margin-bottom: 0; padding-left: 1.2rem;'>")
+                in_list = True
+            html_lines.append(f"<li>{content}</li>")
+        
+        elif stripped.startswith("<div"):
+             if in_list:
+                html_lines.append("</ul>")
+                in_list = False
+             html_lines.append(stripped)
+             
+        else:
+            if in_list:
+                html_lines.append("</ul>")
+                in_list = False
+            
+            if stripped:
+                html_lines.append(f"{line}<br>")
+
+    if in_list:
+        html_lines.append("</ul>")
+        
+    return "\n".join(html_lines)
+
+
+def section_card_html(title: str, body: str) -> str:
+    """Render one '## Section' of model output as a color-coded card."""
+    card_style = "border: 1px solid rgba(148, 163, 184, 0.2);" # Default Slate
+    icon = "📄"
+    
+    t_lower = title.lower()
+    
+    if "issue" in t_lower or "error" in t_lower or "problem" in t_lower:
+        # Red styling for Issues
+        card_style = "border: 1px solid rgba(239, 68, 68, 0.5); background: rgba(239, 68, 68, 0.1);" 
+        icon = "⚠️"
+    elif "suggestion" in t_lower or "fix" in t_lower or "recommend" in t_lower:
+        # Green styling for Suggestions
+        card_style = "border: 1px solid rgba(34, 197, 94, 0.5); background: rgba(34, 197, 94, 0.1);" 
+        icon = "💡"
+    elif "automated check" in t_lower:
+        # Amber styling for the local rule checks
+        card_style = "border: 1px solid rgba(245, 158, 11, 0.5); background: rgba(245, 158, 11, 0.1);"
+        icon = "📏"
+    elif "entity" in t_lower or "attribute" in t_lower or "relationship" in t_lower:
+        # Blue styling for Structural Data (Entities/Relationships)
+        card_style = "border: 1px solid rgba(59, 130, 246, 0.5); background: rgba(59, 130, 246, 0.1);"
+        icon = "🧬"
+
+    formatted_body = format_text_to_html(body)
+
+    return f"""
+        <div class='dv-issue-card' style='{card_style}'>
+            <div style='display: flex; align-items: center; margin-bottom: 8px;'>
+                <span style='font-size: 1.2rem; margin-right: 8px;'>{icon}</span>
+                <strong>{title}</strong>
+            </div>
+            <div style='font-size: 0.9rem; color: #cbd5e1;'>
+                {formatted_body}
+            </div>
+        </div>
+        """
+
+
+def sections_preview_html(summary_text: str) -> str:
+    """Render the (possibly still streaming) sections as cards, skipping the score."""
+    cards = [section_card_html(title, body) for title, body in split_sections(summary_text) if "score" not in title.lower()]
+    if not cards:
+        return f"<div class='dv-section-text'>{format_text_to_html(summary_text)}</div>"
+    return "\n".join(cards)
+
+
+def render_result(parsed: ParsedResult) -> Dict[str, str]:
+    """
+    Pre-render everything the results page shows for one parsed reply, so
+    Streamlit reruns only re-emit stored HTML.
+    """
+    cards = "\n".join(section_card_html(s.title, s.body) for s in parsed.cards())
+    reasoning = format_text_to_html(parsed.score_reasoning) if parsed.score_reasoning else ""
+    return {"cards": cards, "reasoning": reasoning}
+
+
+def rules_card_html(report: Dict[str, Any]) -> str:
+    """Card for a stored rule-check report (``rules.Report.as_dict`` form)."""
+    count = len(report["findings"])
+    title = (
+        f"Automated checks: {count} finding{'s' * (count != 1)} · "
+        f"provisional score {report['score']}/100"
+    )
+    return section_card_html(title, rules.to_markdown(report))
@@ -0,0 +1,141 @@
+"""
+Keeps the routed Ollama models loaded and reports whether they are.
+
+The first request after Ollama has unloaded a model pays its load time
+(``load_duration``, often 10-60 s for a vision model) on top of inference.
+``ensure_warm`` loads every routed model from a background thread, once per
+process and again whenever a model has been found unloaded, so that cost
+lands while the user is still choosing a file. Each chat request also sends
+``keep_alive`` (see ``ollama.OllamaClient.chat``) to keep the model resident
+between analyses. ``status`` says which models are ready for the upload page.
+"""
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import requests
+
+from normalizer import config
+from normalizer import metrics
+from normalizer import ollama
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+# /api/ps is cheap, but every upload-page rerun asks; reuse an answer this fresh.
+STATUS_TTL_SECONDS = 5.0
+# After a failed warmup, show the failure for this long before trying again.
+RETRY_AFTER_SECONDS = 30.0
+
+
+class ModelState(NamedTuple):
+    model: str
+    state: str  # COLD, LOADING, READY or FAILED
+    load_seconds: Optional[float] = None  # last warmup's load time, as reported by Ollama
+    error: str = ""
+
+
+def warm_models() -> List[str]:
+    """Ollama models the router can pick first (fallbacks load on demand)."""
+    specs = [config.OLLAMA_MODEL, config.MODEL_SMALL, config.MODEL_LARGE]
+    names: List[str] = []
+    for spec in specs:
+        if not spec:
+            continue
+        scheme, _, name = spec.rpartition("://")
+        if scheme in ("", "ollama") and name not in names:
+            names.append(name)
+    return names
+
+
+def _tagged(name: str) -> str:
+    # /api/ps reports "llava:latest" for a model requested as "llava".
+    return name if ":" in name else f"{name}:latest"
+
+
+class Residency:
+    """Background warmup plus a cached view of which models Ollama has loaded."""
+
+    def __init__(self, models: List[str]):
+        self.models = models
+        self._lock = threading.Lock()
+        self._states: Dict[str, ModelState] = {m: ModelState(m, COLD) for m in models}
+        self._checked_at = 0.0
+        self._retry_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_warm(self) -> None:
+        """Start loading any model not known to be resident. Never blocks."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            retry = time.time() >= self._retry_at
+            pending = [m for m, s in self._states.items() if s.state == COLD or (s.state == FAILED and retry)]
+            if not pending:
+                return
+            for m in pending:
+                self._states[m] = self._states[m]._replace(state=LOADING, error="")
+            self._thread = threading.Thread(target=self._warm, args=(pending,), name="ollama-warmup", daemon=True)
+            self._thread.start()
+
+    def _warm(self, models: List[str]) -> None:
+        client = ollama.get_client()
+        for model in models:
+            start = time.perf_counter()
+            try:
+                body = client.load(model)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                state = ModelState(model, FAILED, error=f"{type(e).__name__}: {e}")
+            else:
+                load_seconds = (body.get("load_duration") or 0) / 1e9 or time.perf_counter() - start
+                with metrics.pipeline("warmup"):
+                    metrics.observe("warmup_load", load_seconds)
+                state = ModelState(model, READY, load_seconds)
+            with self._lock:
+                self._states[model] = state
+                self._checked_at = time.time()
+                if state.state == FAILED:
+                    self._retry_at = self._checked_at + RETRY_AFTER_SECONDS
+
+    def status(self) -> List[ModelState]:
+        """Current state per model, re-checked against /api/ps when the last check is stale."""
+        with self._lock:
+            fresh = time.time() - self._checked_at < STATUS_TTL_SECONDS
+            loading = self._thread is not None and self._thread.is_alive()
+            if fresh or loading:
+                return list(self._states.values())
+        try:
+            running = ollama.get_client().running()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self._lock:
+                self._checked_at = time.time()
+                self._retry_at = self._checked_at + RETRY_AFTER_SECONDS
+                for m, s in self._states.items():
+                    self._states[m] = s._replace(state=FAILED, error=f"{type(e).__name__}: {e}")
+                return list(self._states.values())
+        with self._lock:
+            self._checked_at = time.time()
+            for m, s in self._states.items():
+                if s.state == LOADING:
+                    continue
+                # keep_alive expired or someone ran `ollama stop`: cold again until re-warmed.
+                self._states[m] = s._replace(state=READY if _tagged(m) in running else COLD, error="")
+            return list(self._states.values())
+
+
+_RESIDENCY: Optional[Residency] = None
+_RESIDENCY_LOCK = threading.Lock()
+
+
+def get_residency() -> Residency:
+    """Return the process-wide residency tracker for the routed models."""
+    global _RESIDENCY
+    with _RESIDENCY_LOCK:
+        if _RESIDENCY is None:
+            _RESIDENCY = Residency(warm_models())
+        return _RESIDENCY
+
+
+def ensure_warm() -> None:
+    """Kick off a background warmup of anything not loaded (no-op when ERN_OLLAMA_WARMUP is off)."""
+    if config.OLLAMA_WARMUP:
+        get_residency().ensure_warm()
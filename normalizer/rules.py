@@ -0,0 +1,297 @@
+"""
+Deterministic ERD checks that run locally in milliseconds.
+
+Missing primary keys, duplicated names and naming-convention slips need no
+model: once the entities and their attributes are known they are mechanical.
+``check`` runs every rule over a list of ``parsing.Entity`` and returns typed
+findings plus a provisional score. The entities come from the OCR layout
+(``run_ocr``), before the model is called, or from a parsed reply
+(``extract_with_llava`` and the other vision modes), after it.
+
+When the findings exist before the model call, ``prompt_note`` tells the model
+what was already found, so its Issues section does not repeat it and the reply
+is shorter. Only when ``ocr_trusted`` vouches for the OCR grouping does the
+note also tell the model to skip those checks: a dropped "PK" or a misread
+name would otherwise become a claim the model is told not to question.
+"""
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from normalizer import parsing
+from normalizer.parsing import Entity
+
+# Bump when rules or messages change; the prompt note (and so the LLM cache key) depends on them.
+VERSION = 1
+
+ERROR, WARNING, INFO = "error", "warning", "info"
+# Rule id -> heading used when findings are grouped (prompt note).
+RULE_TITLES = {
+    "duplicate_entity": "Entity names used twice",
+    "duplicate_attribute": "Attributes listed twice",
+    "missing_pk": "No primary key",
+    "unmarked_pk": "Key not marked PK",
+    "no_attributes": "Entities without attributes",
+    "naming_style": "Attribute names off the common naming style",
+    "plural_entity": "Plural entity names",
+    "reserved_word": "Reserved SQL words",
+    "dangling_reference": "Id attributes that match no entity",
+}
+# Points taken off the provisional score per finding, for at most MAX_REPEATS findings of one rule
+# (twenty unmarked keys are one habit, not twenty design flaws).
+PENALTY = {ERROR: 15, WARNING: 5, INFO: 1}
+MAX_REPEATS = 3
+SEVERITY_ICONS = {ERROR: "⛔", WARNING: "⚠️", INFO: "ℹ️"}
+# OCR-grouped entities settle the checks only if EasyOCR read every piece of their text at least
+# this confidently (0-1) and the clean-up neither dropped a line nor corrected their text.
+TRUSTED_OCR_CONFIDENCE = 0.8
+
+# Names that need quoting in common SQL dialects.
+RESERVED_WORDS = frozenset({
+    "by", "check", "column", "date", "default", "desc", "from", "grant", "group", "index",
+    "key", "limit", "order", "primary", "range", "references", "select", "table", "to",
+    "user", "values", "where",
+})
+
+STYLES = (
+    ("snake_case", re.compile(r"[a-z][a-z0-9]*(?:_[a-z0-9]+)+")),
+    ("camelCase", re.compile(r"[a-z][a-z0-9]*(?:[A-Z][a-z0-9]*)+")),
+    ("PascalCase", re.compile(r"(?:[A-Z][a-z0-9]+){2,}")),
+    ("UPPER_CASE", re.compile(r"[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+")),
+    ("spaced words", re.compile(r"\w+(?: \w+)+")),
+)
+# The most common naming style must cover this share of styled names before others are flagged.
+DOMINANT_STYLE_SHARE = 0.6
+
+
+class Finding(NamedTuple):
+    rule: str  # e.g. "missing_pk"
+    severity: str  # ERROR | WARNING | INFO
+    entity: str
+    attribute: str  # "" for entity-level findings
+    message: str
+
+    def as_dict(self) -> Dict[str, str]:
+        return self._asdict()
+
+
+class Report(NamedTuple):
+    findings: List[Finding]
+    score: int  # provisional: 100 minus PENALTY per finding (capped per rule)
+    entities: int
+    seconds: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "version": VERSION,
+            "findings": [f.as_dict() for f in self.findings],
+            "score": self.score,
+            "entities": self.entities,
+            "ms": round(self.seconds * 1000, 2),
+        }
+
+
+def _key(name: str) -> str:
+    """Comparison form of a name: case and separators ignored."""
+    return re.sub(r"[\s_]+", "", name).lower()
+
+
+def naming_style(name: str) -> Optional[str]:
+    """The convention ``name`` follows, or None for single lowercase words that fit any of them."""
+    for style, pattern in STYLES:
+        if pattern.fullmatch(name):
+            return style
+    return None
+
+
+def _is_plural(name: str) -> bool:
+    word = re.split(r"[\s_]|(?<=[a-z])(?=[A-Z])", name)[-1].lower()
+    return len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is"))
+
+
+def _id_like(attribute: str, entity: str) -> bool:
+    return _key(attribute) in ("id", _key(entity) + "id")
+
+
+# --- Rules ---
+# Each takes every entity, so rules that compare entities see the whole diagram.
+def duplicate_entities(entities: Sequence[Entity]) -> Iterable[Finding]:
+    counts = Counter(_key(e.name) for e in entities)
+    seen = set()
+    for e in entities:
+        if counts[_key(e.name)] > 1 and _key(e.name) not in seen:
+            seen.add(_key(e.name))
+            yield Finding("duplicate_entity", ERROR, e.name, "", f"appears {counts[_key(e.name)]} times")
+
+
+def duplicate_attributes(entities: Sequence[Entity]) -> Iterable[Finding]:
+    for e in entities:
+        counts = Counter(_key(a.name) for a in e.attributes)
+        seen = set()
+        for a in e.attributes:
+            if counts[_key(a.name)] > 1 and _key(a.name) not in seen:
+                seen.add(_key(a.name))
+                yield Finding("duplicate_attribute", ERROR, e.name, a.name, f"`{a.name}` is listed {counts[_key(a.name)]} times")
+
+
+def primary_keys(entities: Sequence[Entity]) -> Iterable[Finding]:
+    for e in entities:
+        if not e.attributes or any(a.primary for a in e.attributes):
+            continue
+        candidate = next((a.name for a in e.attributes if _id_like(a.name, e.name)), None)
+        foreign = [a.name for a in e.attributes if a.foreign]
+        if candidate:
+            yield Finding("unmarked_pk", WARNING, e.name, candidate, f"`{candidate}` looks like the key but is not marked PK")
+        elif len(foreign) >= 2:
+            # Junction tables usually take the pair of foreign keys as a composite key.
+            yield Finding(
+                "unmarked_pk", WARNING, e.name, "",
+                f"no key is marked; ({', '.join(foreign)}) could be a composite primary key",
+            )
+        else:
+            yield Finding("missing_pk", ERROR, e.name, "", "has no primary key")
+
+
+def empty_entities(entities: Sequence[Entity]) -> Iterable[Finding]:
+    for e in entities:
+        if not e.attributes:
+            yield Finding("no_attributes", WARNING, e.name, "", "has no attributes")
+
+
+def attribute_naming(entities: Sequence[Entity]) -> Iterable[Finding]:
+    styled = [(e, a, naming_style(a.name)) for e in entities for a in e.attributes]
+    counts = Counter(style for _, _, style in styled if style)
+    if sum(counts.values()) < 3:
+        return
+    dominant, count = counts.most_common(1)[0]
+    if count / sum(counts.values()) < DOMINANT_STYLE_SHARE:
+        return
+    for e, a, style in styled:
+        if style and style != dominant:
+            yield Finding("naming_style", WARNING, e.name, a.name, f"`{a.name}` is {style}; most attributes use {dominant}")
+
+
+def entity_naming(entities: Sequence[Entity]) -> Iterable[Finding]:
+    plural = [e for e in entities if _is_plural(e.name)]
+    if len(entities) - len(plural) >= 2 and len(plural) < len(entities) / 2:
+        for e in plural:
+            yield Finding("plural_entity", INFO, e.name, "", "is plural; the other entity names are singular")
+
+
+def reserved_words(entities: Sequence[Entity]) -> Iterable[Finding]:
+    for e in entities:
+        if e.name.lower() in RESERVED_WORDS:
+            yield Finding("reserved_word", INFO, e.name, "", f"`{e.name}` is a reserved SQL word")
+        for a in e.attributes:
+            if a.name.lower() in RESERVED_WORDS:
+                yield Finding("reserved_word", INFO, e.name, a.name, f"`{a.name}` is a reserved SQL word")
+
+
+def dangling_references(entities: Sequence[Entity]) -> Iterable[Finding]:
+    if len(entities) < 2:
+        return
+    names = {_key(e.name) for e in entities} | {_key(e.name).rstrip("s") for e in entities}
+    for e in entities:
+        for a in e.attributes:
+            m = re.fullmatch(r"(\w+?)(?:_id|_ID|Id)", a.name)
+            if not m or _id_like(a.name, e.name) or (a.primary and not a.foreign):
+                continue
+            target = _key(m.group(1))
+            if target not in names and target.rstrip("s") not in names:
+                yield Finding("dangling_reference", INFO, e.name, a.name, f"`{a.name}` refers to no entity in the diagram")
+
+
+RULES: List[Callable[[Sequence[Entity]], Iterable[Finding]]] = [
+    duplicate_entities,
+    duplicate_attributes,
+    primary_keys,
+    empty_entities,
+    attribute_naming,
+    entity_naming,
+    reserved_words,
+    dangling_references,
+]
+
+
+def check(entities: Sequence[Entity]) -> Report:
+    """Run every rule; findings are ordered by severity, then as the rules produced them."""
+    start = time.perf_counter()
+    findings = [f for rule in RULES for f in rule(entities)]
+    findings.sort(key=lambda f: list(PENALTY).index(f.severity))
+    per_rule = Counter(f.rule for f in findings)
+    severity = {f.rule: f.severity for f in findings}
+    score = max(0, 100 - sum(PENALTY[severity[rule]] * min(n, MAX_REPEATS) for rule, n in per_rule.items()))
+    return Report(findings, score, len(entities), time.perf_counter() - start)
+
+
+# --- Inputs ---
+def from_ocr(ocr_payload: Dict[str, Any]) -> List[Entity]:
+    """Entities grouped from OCR boxes (``run_ocr``'s "entities": name plus attribute rows)."""
+    return [
+        Entity(e["name"], tuple(a for a in (parsing.parse_attribute(row) for row in e["attributes"]) if a))
+        for e in ocr_payload.get("entities") or []
+    ]
+
+
+def from_result(result: Dict[str, Any]) -> List[Entity]:
+    """Entities parsed from a model reply block."""
+    return list(parsing.from_result(result).entities)
+
+
+def ocr_trusted(ocr_payload: Dict[str, Any]) -> bool:
+    """
+    Whether the entities grouped from OCR are read well enough for the checks
+    over them to stand in for the model's own. Payloads without per-entity
+    confidences (cached before they were recorded) are not trusted.
+    """
+    entities = ocr_payload.get("entities") or []
+    if not entities or any((e.get("confidence") or 0) < TRUSTED_OCR_CONFIDENCE for e in entities):
+        return False
+    cleanup = ocr_payload.get("cleanup") or {}
+    if cleanup.get("dropped"):
+        return False  # a dropped line may have been a garbled "PK" or part of an entity
+    corrected = {fixed.lower() for _, fixed in cleanup.get("corrections") or []}
+    words = {w.lower() for e in entities for row in [e["name"], *e["attributes"]] for w in re.findall(r"\w+", row)}
+    return not corrected & words
+
+
+def prompt_note(report: Report, settled: bool = True) -> str:
+    """
+    Prompt lines listing what the rules already found, so the model does not
+    repeat it. ``settled`` also tells the model to skip those checks; pass
+    False when the entities may be misread (see ``ocr_trusted``).
+    """
+    if not report.entities:
+        return ""
+    subjects: Dict[str, List[str]] = {}
+    for f in report.findings:
+        subjects.setdefault(f.rule, []).append(f"{f.entity}.{f.attribute}" if f.attribute else f.entity)
+    found = "".join(f"- {RULE_TITLES[rule]}: {', '.join(names)}\n" for rule, names in subjects.items())
+    if not settled:
+        if not found:
+            return ""
+        return (
+            "AUTOMATED CHECKS (run on the OCR text, which may have missed or misread labels; "
+            "the user sees these results separately):\n"
+            + found
+            + "These are already found; do not repeat them. Still report any other key, duplicate-name "
+            "or naming problems you see.\n"
+        )
+    return (
+        "AUTOMATED CHECKS (already run; the user sees these results separately):\n"
+        + (found or "- No missing or unmarked primary keys, duplicate names or naming-style problems.\n")
+        + "Do NOT re-check primary keys, duplicate names or naming conventions, and do not repeat these "
+        "findings. Keep Issues to relationships, cardinality and other design problems.\n"
+    )
+
+
+def to_markdown(report: Dict[str, Any]) -> str:
+    """Bullet list of a stored report's findings (``Report.as_dict`` form)."""
+    if not report["findings"]:
+        return f"No problems found in {report['entities']} entities."
+    return "\n".join(
+        f"- {SEVERITY_ICONS[f['severity']]} **{f['entity']}**"
+        f"{('.' + f['attribute']) if f['attribute'] else ''}: {f['message']}"
+        for f in report["findings"]
+    )
@@ -0,0 +1,161 @@
+"""
+Admission control in front of Ollama.
+
+One local Ollama serves every Streamlit session in the process, so chat
+requests go through a shared scheduler. It bounds how many run at once,
+queues the rest by (priority, arrival), reports queue positions back to the
+caller and turns requests away once the queue is full. How long a request
+waited and how long it was served are recorded separately in ``metrics``.
+
+Callers describe themselves with ``policy()``, which travels in a contextvar
+so the pipelines don't need extra parameters:
+
+    with scheduler.policy(on_wait=lambda n: print(f"#{n} in queue")):
+        pipelines.analyze_diagram_with_llava(image)
+"""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from normalizer import config
+from normalizer import metrics
+
+INTERACTIVE = 0
+BATCH = 10
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request is shed because the queue is full or it waited too long."""
+
+
+class Policy(NamedTuple):
+    priority: int = INTERACTIVE  # lower runs first
+    on_wait: Optional[Callable[[int], None]] = None  # 1-based queue position; 0 once admitted
+    shed: bool = True  # False: wait however long it takes (batch jobs)
+
+
+_POLICY: contextvars.ContextVar = contextvars.ContextVar("ern_scheduler_policy", default=Policy())
+
+
+@contextmanager
+def policy(
+    priority: int = INTERACTIVE,
+    on_wait: Optional[Callable[[int], None]] = None,
+    shed: bool = True,
+) -> Iterator[None]:
+    """Apply a scheduling policy to every Ollama call made inside the block."""
+    token = _POLICY.set(Policy(priority, on_wait, shed))
+    try:
+        yield
+    finally:
+        _POLICY.reset(token)
+
+
+class Scheduler:
+    """Bounded in-flight limit with a priority/FIFO wait queue and load shedding."""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float = 0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._served = 0
+        self._shed = 0
+
+    def _turn_away(self, reason: str) -> SchedulerBusy:
+        # Caller holds self._cond.
+        self._shed += 1
+        metrics.REGISTRY.inc("ern_scheduler_shed_total", "Requests turned away by the scheduler.", reason=reason)
+        return SchedulerBusy(reason)
+
+    def acquire(self, pol: Optional[Policy] = None) -> float:
+        """Block until a slot is free (or raise SchedulerBusy); return seconds spent queued."""
+        pol = pol or _POLICY.get()
+        start = time.perf_counter()
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._waiting:
+                self._in_flight += 1
+                return 0.0
+            if pol.shed and len(self._waiting) >= self.max_queue:
+                raise self._turn_away("queue_full")
+            ticket = (pol.priority, next(self._seq))
+            self._waiting.append(ticket)
+
+        reported = None
+        try:
+            while True:
+                with self._cond:
+                    ahead = sum(t < ticket for t in self._waiting)
+                    if ahead == 0 and self._in_flight < self.max_in_flight:
+                        self._waiting.remove(ticket)
+                        self._in_flight += 1
+                        break
+                    if pol.shed and self.queue_timeout and time.perf_counter() - start > self.queue_timeout:
+                        self._waiting.remove(ticket)
+                        self._cond.notify_all()
+                        raise self._turn_away("queue_timeout")
+                    if pol.on_wait is None or ahead + 1 == reported:
+                        self._cond.wait(timeout=0.5)
+                        continue
+                # Report outside the lock: the callback may be slow (it redraws a Streamlit widget).
+                reported = ahead + 1
+                pol.on_wait(reported)
+        except SchedulerBusy:
+            raise
+        except BaseException:
+            # The caller went away while queued (e.g. Streamlit stopped the script); free the ticket.
+            with self._cond:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+        if reported is not None and pol.on_wait is not None:
+            pol.on_wait(0)
+        return time.perf_counter() - start
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._served += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, pol: Optional[Policy] = None) -> Iterator[None]:
+        """Hold one in-flight slot for the duration of the block, recording wait and service time."""
+        metrics.observe("queue_wait", self.acquire(pol))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release()
+            metrics.observe("service", time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "served": self._served,
+                "shed": self._shed,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+_SCHEDULER: Optional[Scheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """Return the process-wide scheduler configured from the environment."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = Scheduler(config.OLLAMA_MAX_IN_FLIGHT, config.OLLAMA_QUEUE_SIZE, config.OLLAMA_QUEUE_TIMEOUT)
+        return _SCHEDULER
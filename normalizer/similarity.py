@@ -0,0 +1,177 @@
+"""
+Perceptual hashing and a near-duplicate index over past analyses.
+
+A re-uploaded screenshot of the same diagram (new crop, scale or JPEG
+artifacts) has different bytes, so its SHA-256 digest never matches the
+cache. Its perceptual hashes do: a 64-bit dHash (gradient signs) and a 64-bit
+pHash (low DCT frequencies), both computed with NumPy. The index lives next
+to the analysis cache in SQLite and answers Hamming-distance lookups with one
+vectorized XOR/popcount over every stored hash.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+from normalizer import config
+
+# popcount for every byte value; numpy 1.x has no bitwise_count.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class Signature(NamedTuple):
+    dhash: int
+    phash: int
+    aspect: float  # width / height, so a tall and a wide diagram never match
+
+
+class Match(NamedTuple):
+    digest: str
+    distance: int  # dHash + pHash Hamming distance (0-128)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def _gray(image: Image.Image, size: tuple) -> np.ndarray:
+    return np.asarray(image.convert("L").resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0), dtype=np.float32)
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """Difference hash: sign of the horizontal gradient on a (size+1) x size thumbnail."""
+    pixels = _gray(image, (size + 1, size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def phash(image: Image.Image, size: int = 8) -> int:
+    """DCT hash: low-frequency coefficients of a 32x32 thumbnail against their median (DC term excluded)."""
+    pixels = _gray(image, (32, 32))
+    coeffs = (_DCT32 @ pixels @ _DCT32.T)[:size, :size].ravel()
+    return _bits_to_int(coeffs > np.median(coeffs[1:]))
+
+
+def signature(image: Image.Image) -> Signature:
+    return Signature(dhash(image), phash(image), image.width / max(1, image.height))
+
+
+def hamming(hashes: np.ndarray, query: int) -> np.ndarray:
+    """Hamming distance from ``query`` to every uint64 in ``hashes``."""
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(len(hashes), 8).sum(axis=1)
+
+
+def _to_sql(value: int) -> int:
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_sql(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class NearDuplicateIndex:
+    """Perceptual signatures of analysed uploads, persisted in SQLite and searched in memory."""
+
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._loaded_at = -1.0
+        self._digests: List[str] = []
+        self._dhashes = np.zeros(0, dtype=np.uint64)
+        self._phashes = np.zeros(0, dtype=np.uint64)
+        self._aspects = np.zeros(0, dtype=np.float32)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " digest TEXT PRIMARY KEY, dhash INTEGER NOT NULL, phash INTEGER NOT NULL,"
+                " aspect REAL NOT NULL, created REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, digest: str, sig: Signature) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (digest, dhash, phash, aspect, created) VALUES (?, ?, ?, ?, ?)",
+                (digest, _to_sql(sig.dhash), _to_sql(sig.phash), sig.aspect, now),
+            )
+            conn.execute("DELETE FROM signatures WHERE created < ?", (now - self.ttl_seconds,))
+        with self._lock:
+            self._loaded_at = -1.0  # other processes may have written too; reload on next lookup
+
+    def _refresh(self) -> None:
+        # Caller holds self._lock. Reload at most every few seconds; the table is small.
+        if time.time() - self._loaded_at < 5:
+            return
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT digest, dhash, phash, aspect FROM signatures WHERE created >= ?",
+                (time.time() - self.ttl_seconds,),
+            ).fetchall()
+        self._digests = [r[0] for r in rows]
+        self._dhashes = np.array([_from_sql(r[1]) for r in rows], dtype=np.uint64)
+        self._phashes = np.array([_from_sql(r[2]) for r in rows], dtype=np.uint64)
+        self._aspects = np.array([r[3] for r in rows], dtype=np.float32)
+        self._loaded_at = time.time()
+
+    def lookup(self, sig: Signature, threshold: int, exclude: Optional[str] = None) -> List[Match]:
+        """Stored uploads within ``threshold`` differing bits (dHash + pHash), closest first."""
+        with self._lock:
+            self._refresh()
+            if not self._digests:
+                return []
+            # Summed: pHash shrugs off small crops that flip many dHash bits, dHash catches layout changes.
+            distance = hamming(self._dhashes, sig.dhash) + hamming(self._phashes, sig.phash)
+            same_shape = np.abs(self._aspects / sig.aspect - 1) <= config.SIMILARITY_MAX_ASPECT_DRIFT
+            hits = np.flatnonzero((distance <= threshold) & same_shape)
+            ranked = hits[np.argsort(distance[hits], kind="stable")]
+            return [
+                Match(self._digests[i], int(distance[i]))
+                for i in ranked
+                if self._digests[i] != exclude
+            ]
+
+
+_INDEX: Optional[NearDuplicateIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index() -> Optional[NearDuplicateIndex]:
+    """Return the process-wide index, or None when near-duplicate reuse (or the cache) is off."""
+    global _INDEX
+    if config.SIMILARITY_MODE == "off" or not config.CACHE_ENABLED:
+        return None
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = NearDuplicateIndex(config.CACHE_PATH, config.CACHE_TTL_SECONDS)
+        return _INDEX
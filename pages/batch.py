@@ -0,0 +1,227 @@
+import streamlit as st
+from typing import Any, Callable, Dict, List, Optional
+
+from normalizer import assets
+from normalizer import blobs
+from normalizer import documents
+from normalizer import config
+from normalizer import jobs
+from normalizer import metrics
+from normalizer import parsing
+from normalizer import previews
+from normalizer.rendering import render_result, rules_card_html
+from normalizer.pipelines import METHOD_LABELS, RESULT_KEYS
+
+PIPELINE_IDS = {label: key for key, label in METHOD_LABELS.items()}
+
+st.set_page_config(page_title="Batch Results", layout="wide", initial_sidebar_state="collapsed", page_icon="🗂️")
+
+# How often the page redraws while diagrams of the batch are still being analysed.
+JOB_POLL_SECONDS = 1.0
+# Previews sit in a third of the wide layout.
+PREVIEW_WIDTH = config.PREVIEW_WIDTH // 2
+
+
+def stored_file(digest: str) -> Callable[[], bytes]:
+    """Reads an uploaded file back from the blob store when one of its diagrams is analysed."""
+
+    def read() -> bytes:
+        data = blobs.get_store().read(digest)
+        if data is None:
+            raise RuntimeError("the uploaded file is no longer stored; please upload it again")
+        return data
+
+    return read
+
+
+def current_batch() -> Optional[jobs.Batch]:
+    """Start the batch for freshly uploaded files, or find this session's (or the URL's) batch."""
+    files = st.session_state.pop("dv_batch_files", None)
+    if files:
+        mode = PIPELINE_IDS.get(st.session_state.get("dv_analysis_method"), "llava_extract")
+        store = blobs.get_store()
+        try:
+            diagrams = [
+                d for name, digest in files
+                for d in documents.expand(name, store.read(digest) or b"", stored_file(digest))
+            ]
+        except Exception as e:  # pypdfium2 missing, or a damaged/encrypted PDF
+            st.error(f"⚠️ Could not read the uploaded files: {e}")
+            return None
+        batch = jobs.submit_batch(mode, diagrams)
+    else:
+        batch = jobs.get_pool().get_batch(st.session_state.get("dv_batch_id") or st.query_params.get("batch"))
+    if batch is not None:
+        # Also in the URL, so a refreshed tab (a brand-new session) can find the batch again.
+        st.session_state["dv_batch_id"] = batch.id
+        st.query_params["batch"] = batch.id
+    return batch
+
+
+def result_block(job: jobs.Job) -> Dict[str, Any]:
+    return job.result.get(RESULT_KEYS.get(job.result.get("mode"), ""), {}) if job.result else {}
+
+
+def summary_row(index: int, diagram: documents.Diagram, job: Optional[jobs.Job]) -> Dict[str, Any]:
+    """One line of the summary table; timings are the wait for a worker and the analysis itself."""
+    row: Dict[str, Any] = {
+        "#": index + 1, "diagram": diagram.name, "state": "waiting", "score": None, "checks": None,
+        "model": "", "wait_s": None, "run_s": None, "error": "",
+    }
+    if job is not None:
+        _, _, position = job.progress()
+        block = result_block(job)
+        row["state"] = f"{job.state} (#{position} for the model)" if position else job.state
+        row["score"] = block.get("score")
+        report = (job.result or {}).get("rules") or job.shared().get("rules")
+        row["checks"] = len(report["findings"]) if report else None
+        row["model"] = block.get("model", "")
+        row["wait_s"] = round(job.started_at - job.created_at, 1) if job.started_at else None
+        row["run_s"] = round(job.seconds(), 1) if job.started_at else None
+        row["error"] = job.error or ("model call failed" if block.get("error") else "")
+    return row
+
+
+def render_stored(result: Dict[str, Any]) -> Dict[str, str]:
+    """The analysis cards (and rule-check card) for one stored result."""
+    rendered = render_result(parsing.from_result(result.get(RESULT_KEYS.get(result.get("mode"), ""), {})))
+    if result.get("rules"):
+        rendered["rules"] = rules_card_html(result["rules"])
+    return rendered
+
+
+def rendered_for(job: jobs.Job) -> Dict[str, str]:
+    """
+    A finished diagram's reply, parsed and rendered once: the session keeps the
+    result's digest, the blob store the result and its rendering.
+    """
+    store = blobs.get_store()
+    digests = st.session_state.setdefault("dv_batch_results", {})
+    if job.id not in digests:
+        digests[job.id] = store.put_json(job.result)
+    rendered = store.get_json(digests[job.id], prepare=render_stored, view="batch")
+    if rendered is None:  # evicted from disk: store it again
+        digests[job.id] = store.put_json(job.result)
+        rendered = store.get_json(digests[job.id], prepare=render_stored, view="batch")
+    return rendered
+
+
+def show_preview(digest: str) -> None:
+    """A diagram at display size; its bytes count as sent the first time this session shows it."""
+    shown = previews.preview(digest, PREVIEW_WIDTH)
+    if shown is None:
+        return
+    st.image(shown.data, width="stretch", output_format=shown.format)
+    sent = st.session_state.setdefault("dv_previews_sent", set())
+    if (digest, shown.width) not in sent:
+        sent.add((digest, shown.width))
+        metrics.page_sent("batch", "image", len(shown.data))
+
+
+def show_html(html: str) -> None:
+    """Markdown with raw HTML, counted towards the page's bytes sent."""
+    st.markdown(html, unsafe_allow_html=True)
+    metrics.page_sent("batch", "html", len(html))
+
+
+def open_report(job: jobs.Job) -> None:
+    """Hand one diagram's finished analysis to the results page."""
+    request = job.request
+    st.session_state["dv_image"] = request.image_digest
+    st.session_state["dv_image_name"] = request.image_name
+    st.session_state["dv_analysis_method"] = METHOD_LABELS.get(request.mode, request.mode)
+    st.session_state["dv_results_ref"] = {
+        "analysis_method": job.result["analysis_method"],
+        "image_hash": job.result["image_hash"],
+        "blob": blobs.get_store().put_json(job.result),
+    }
+    st.session_state.pop("dv_job", None)
+
+
+def diagram_view(index: int, diagram: documents.Diagram, job: jobs.Job) -> None:
+    """One finished diagram: preview, score and the analysis cards."""
+    block = result_block(job)
+    score = block.get("score")
+    icon = "⚠️" if job.state == jobs.FAILED or block.get("error") else "✅"
+    title = f"{icon} {index + 1}. {diagram.name}" + (f" · {score}/100" if score is not None else "")
+    with st.expander(title):
+        if job.state == jobs.FAILED:
+            st.error(f"The analysis failed: {job.error}")
+            return
+        left, right = st.columns([1, 2])
+        with left:
+            show_preview(job.request.image_digest)
+            if score is not None:
+                st.progress(score / 100)
+                st.markdown(f"**{score}/100**")
+            if block.get("model"):
+                st.markdown(f"**Model:** {block['model']}")
+            st.caption(f"Analysed in {job.seconds():.1f}s")
+            if st.button("Open full report", key=f"dv_batch_open_{job.id}", on_click=open_report, args=(job,)):
+                st.switch_page("pages/results.py")
+        with right:
+            rendered = rendered_for(job)
+            if rendered.get("rules"):
+                show_html(rendered["rules"])
+            if rendered["cards"]:
+                show_html(rendered["cards"])
+            else:
+                st.info(block.get("summary") or "No analysis text returned.")
+
+
+metrics.page_view("batch")
+page_css = assets.page_css("batch")
+st.markdown(page_css, unsafe_allow_html=True)
+metrics.page_sent("batch", "css", len(page_css))
+st.markdown("<div class='dv-title'>Batch Analysis Results</div>", unsafe_allow_html=True)
+
+batch = current_batch()
+if batch is None or not batch.diagrams:
+    if batch is not None:
+        st.warning("The uploaded files contain no diagrams.")
+    else:
+        st.info("No batch analysis available. Upload several diagrams or a PDF to get started.")
+    if st.button("Go to upload", key="go_to_upload"):
+        st.switch_page("pages/upload.py")
+    st.stop()
+
+st.markdown(f"**Analysis method:** {METHOD_LABELS.get(batch.mode, batch.mode)}")
+polling = not batch.done
+
+
+# Polls only while diagrams are still queued or running; one full rerun afterwards stops the polling.
+@st.fragment(run_every=JOB_POLL_SECONDS if polling else None)
+def batch_progress(batch_id: str) -> None:
+    """Summary table plus each diagram's results, added as its analysis finishes."""
+    current = jobs.get_pool().get_batch(batch_id)
+    if current is None:
+        st.rerun()
+    items = current.items()
+    finished = [(i, diagram, job) for i, (diagram, job) in enumerate(items) if job is not None and job.done]
+    st.progress(len(finished) / len(items), text=f"{len(finished)} of {len(items)} diagrams analysed")
+
+    rows: List[Dict[str, Any]] = [summary_row(i, diagram, job) for i, (diagram, job) in enumerate(items)]
+    st.table(rows)
+    if polling:
+        st.caption(
+            f"Up to {current.parallel} diagrams are analysed at once in the background; "
+            "you can leave this page and come back."
+        )
+    else:
+        scored = [row["score"] for row in rows if row["score"] is not None]
+        busy = sum(job.seconds() for _, _, job in finished)
+        elapsed = (current.finished_at() or current.created_at) - current.created_at
+        average = f" · average score {sum(scored) / len(scored):.0f}/100" if scored else ""
+        st.caption(f"Finished in {elapsed:.1f}s ({busy:.1f}s of analysis time){average}")
+
+    for i, diagram, job in finished:
+        diagram_view(i, diagram, job)
+
+    if polling and current.done:
+        st.rerun()
+
+
+batch_progress(batch.id)
+
+if st.button("Upload more diagrams", key="try_another_button"):
+    st.switch_page("pages/upload.py")
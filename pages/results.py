@@ -1,447 +1,167 @@
 import streamlit as st
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 from io import BytesIO
 from PIL import Image
-import base64
-import requests
-import easyocr
-import numpy as np
-import re
-import time
 
-st.set_page_config(page_title="Diagram Results", layout="centered", initial_sidebar_state="collapsed", page_icon="📊")
+from normalizer import assets
+from normalizer import blobs
+from normalizer import cache as analysis_cache
+from normalizer import config
+from normalizer import jobs
+from normalizer import metrics
+from normalizer import parsing
+from normalizer import previews
+from normalizer import scheduler
+from normalizer import similarity
+from normalizer.rendering import render_result, rules_card_html, sections_preview_html
+from normalizer.pipelines import (
+    METHOD_LABELS,
+    RESULT_KEYS,
+    cached_result_key,
+    near_duplicate,
+    ocr_prompt_text,
+)
 
-CUSTOM_CSS = """
-<style>
-/* Remove white header bar and sidebar */
-[data-testid="stHeader"] {
-    background: transparent !important;
-    box-shadow: none !important;
-}
-
-.stApp {
-    background: radial-gradient(circle at 0% 0%, #4c1d95 0%, #020617 48%, #000000 100%) !important;
-}
-
-[data-testid="stAppViewContainer"] {
-    background: transparent !important;
-}
-
-.main .block-container {
-    background: transparent !important;
-    max-width: 1600px !important;
-    padding-top: 2.5rem !important;
-    padding-bottom: 3rem !important;
-}
-
-.dv-title {
-    text-align: left;
-    font-size: 1.5rem;
-    font-weight: 600;
-    margin-bottom: 0.25rem;
-}
-.dv-upload-subtitle {
-    font-size: 0.9rem;
-    color: #9ca3af;
-    margin-bottom: 1.2rem;
-}
-
-.dv-section-title {
-    font-weight: 600;
-    font-size: 0.95rem;
-    margin-bottom: 0.35rem;
-}
-
-.dv-results {
-    margin-top: 1.25rem;
-}
-
-.dv-issue-card {
-    border-radius: 12px;
-    padding: 1rem; /* Slightly more padding */
-    border: 1px solid rgba(148, 163, 184, 0.2);
-    margin-bottom: 0.75rem;
-    background: rgba(15, 23, 42, 0.6); /* Slightly more transparent */
-    
-    /* SCROLLING LOGIC */
-    max-height: 300px;       /* Stop card from getting too tall */
-    overflow-y: auto;        /* Add scrollbar if needed */
-}
-
-/* Custom Scrollbar for Webkit (Chrome/Safari) */
-.dv-issue-card::-webkit-scrollbar {
-    width: 6px;
-}
-.dv-issue-card::-webkit-scrollbar-track {
-    background: transparent; 
-}
-.dv-issue-card::-webkit-scrollbar-thumb {
-    background-color: rgba(255, 255, 255, 0.2);
-    border-radius: 10px;
-}
-.dv-issue-card::-webkit-scrollbar-thumb:hover {
-    background-color: rgba(255, 255, 255, 0.4);
-}
-
-.dv-section-text {
-    font-size: 0.88rem;
-    color: #9ca3af;
-}
-
-/* Button */
-div[data-testid="stButton"] {
-    display: flex !important;
-    width: 100% !important;
-    text-align: center !important;
-}
-div[data-testid="stButton"] > button {
-    width: 700px !important; 
-    
-    border-radius: 999px !important;
-    padding-top: 0.8rem !important;
-    padding-bottom: 0.8rem !important;
-    
-    font-weight: 600 !important;
-    font-size: 1.1rem !important;
-    color: #ffffff !important;
-    background: linear-gradient(90deg, #6366f1, #a855f7) !important;
-    
-    border: none !important;
-    box-shadow: 0 4px 18px rgba(99,102,241,0.35);
-    transition: all 0.2s ease-in-out;
-}
-div[data-testid="stButton"] > button:hover {
-    background: linear-gradient(90deg, #7c7ff7, #c084fc) !important;
-    color: #ffffff !important;
-    box-shadow: 0 6px 22px rgba(99,102,241,0.55);
-    transform: translateY(-1px);
-}
-
-/* Upload animation container and bouncing arrow */
-.dv-upload-animation-container {
-    margin-top: 0rem;
-    text-align: center;
-}
-.dv-arrow-bounce {
-    display: inline-block;
-    font-size: 4rem;
-    color: #a855f7;
-    animation: dv-arrow-move 1.3s infinite ease-in-out;
-}
-@keyframes dv-arrow-move {
-    0%, 100% { transform: translateY(0); }
-    50% { transform: translateY(20px); }
-}
-</style>
-"""
-
-
-def parse_score_from_text(text: str) -> int:
-    """
-    Robustly extracts a 0-100 score from model text.
-    It prioritizes explicit 'Score: NN' patterns but falls back to 'NN/100'.
-    """
-    if not text:
-        return None
+PIPELINE_IDS = {label: key for key, label in METHOD_LABELS.items()}
 
-    m1 = re.search(r"Score\s*[:\-]?\s*(\d{1,3})", text, flags=re.IGNORECASE)
-    
-    m2 = re.search(r"(\d{1,3})\s*/\s*100", text)
+st.set_page_config(page_title="Diagram Results", layout="centered", initial_sidebar_state="collapsed", page_icon="📊")
 
-    val = None
-    
-    # Prefer Strategy 1 if it exists and looks reasonable
-    if m1:
-        val = int(m1.group(1))
-    
-    # If Strategy 1 failed or gave a weird number (like 0 or >100), try Strategy 2
-    if (val is None or val < 0 or val > 100) and m2:
-        val = int(m2.group(1))
+# How often a page waiting on a background job redraws its progress.
+JOB_POLL_SECONDS = 1.0
 
-    # Final sanity check
-    if val is not None:
-        return max(0, min(val, 100))
-        
-    return None
 
-def format_text_to_html(text: str) -> str:
-    """
-    Converts Markdown (bold, lists, sub-headers) to HTML.
-    """
-    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
+def show_preview(digest: str) -> None:
+    """The upload at display size; its bytes count as sent the first time this session shows it."""
+    shown = previews.preview(digest)
+    if shown is None:
+        return
+    st.image(shown.data, width="stretch", output_format=shown.format)
+    sent = st.session_state.setdefault("dv_previews_sent", set())
+    if (digest, shown.width) not in sent:
+        sent.add((digest, shown.width))
+        metrics.page_sent("results", "image", len(shown.data))
 
-    text = re.sub(r'(?m)^###+\s*(.*)$', r'<div style="margin-top: 4px; font-weight: 700;">\1</div>', text)
-    
-    lines = text.split('\n')
-    html_lines = []
-    in_list = False
-    
-    for line in lines:
-        stripped = line.strip()
-        
-        if stripped.startswith(('* ', '- ', '• ', '+ ')):
-            content = stripped[1:].strip() 
-            if not in_list:
-                html_lines.append("<ul style='margin-bottom: 0; padding-left: 1.2rem;'>")
-                in_list = True
-            html_lines.append(f"<li>{content}</li>")
-        
-        elif stripped.startswith("<div"):
-             if in_list:
-                html_lines.append("</ul>")
-                in_list = False
-             html_lines.append(stripped)
-             
-        else:
-            if in_list:
-                html_lines.append("</ul>")
-                in_list = False
-            
-            if stripped:
-                html_lines.append(f"{line}<br>")
 
-    if in_list:
-        html_lines.append("</ul>")
-        
-    return "\n".join(html_lines)
-
-
-def _encode_image_to_base64(image: Image.Image) -> str:
-    """Encode a PIL image as base64 PNG for sending to Ollama."""
-    buf = BytesIO()
-    image.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
-
-
-# --- 1. LLaVA IMAGE ANALYSIS (Vision Mode) ---
-def analyze_diagram_with_llava(image: Image.Image) -> Dict[str, Any]:
-    """
-    Directly analyzes the image using LLaVA (Vision). 
-    Focuses on a balanced analysis of structure and logic.
-    """
-    ollama_url = "http://localhost:11434/api/chat"
-    img_b64 = _encode_image_to_base64(image)
-
-    # Prompt focused on General Analysis
-    prompt = (
-        "You are an expert Senior Database Engineer.\n"
-        "Analyze this ER diagram image.\n"
-        "Ignore watermark text or software UI noise.\n\n"
-        "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
-        "OUTPUT FORMAT (Strictly use these Markdown headers):\n\n"
-        "## 1. Overview\n"
-        "(1-2 sentences on what the diagram represents)\n\n"
-        "## 2. Entities & Attributes\n"
-        "(List detected entities and attributes. Use dashes '-' for lists.)\n\n"
-        "## 3. Relationships\n"
-        "(List connections between entities. Use dashes '-' for lists.)\n\n"
-        "## 4. Issues\n"
-        "(List logical database design issues, e.g., missing keys, bad cardinality. Do NOT mention OCR noise. It is not necessary to find issues if there are none.)\n\n"
-        "## 5. Suggestions\n"
-        "(Concrete fixes for the issues)\n\n"
-        "## 6. Score\n"
-        "Score: NN/100\n"
-        "(Brief justification)\n"
-    )
+def show_html(html: str) -> None:
+    """Markdown with raw HTML, counted towards the page's bytes sent."""
+    st.markdown(html, unsafe_allow_html=True)
+    metrics.page_sent("results", "html", len(html))
 
-    payload = {
-        "model": "llava",
-        "stream": False,
-        "messages": [{
-            "role": "user",
-            "content": prompt,
-            "images": [img_b64],
-        }],
-        "options": {"temperature": 0.1}
-    }
 
-    try:
-        resp = requests.post(ollama_url, json=payload, timeout=120)
-        resp.raise_for_status()
-        text = resp.json().get("message", {}).get("content", "").strip()
-        score = parse_score_from_text(text)
-    except requests.exceptions.ConnectionError:
-        text = (
-            "## ⚠️ Connection Error\n"
-            "Could not connect to **Ollama**.\n\n"
-            "**How to fix:**\n"
-            "- Make sure the Ollama llava model is running.\n"
-            "- Ensure you have pulled the model using `ollama pull llava`."
-        )
-        score = None
-    except Exception as e:
-        text = f"## ⚠️ System Error\nError calling LLaVA: {e}"
-        score = None
-
-    return {"summary": text, "raw_output": text, "score": score}
-
-
-# --- 2. LLaVA EXTRACTION (Detailed Mode) ---
-def extract_with_llava(image: Image.Image) -> Dict[str, Any]:
-    """
-    Also uses LLaVA (Vision), but the prompt is tuned slightly more 
-    towards rigorous extraction of details before analysis.
-    """
-    ollama_url = "http://localhost:11434/api/chat"
-    img_b64 = _encode_image_to_base64(image)
-
-    # Prompt tuned for HIGH DETAIL EXTRACTION
-    prompt = (
-        "You are a Database Architect specializing in Reverse Engineering.\n"
-        "Extract every detail from this ER diagram image into a formal report.\n"
-        "Be extremely precise with attribute names and relationship types.\n\n"
-        "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
-        "OUTPUT FORMAT (Strictly use these Markdown headers):\n\n"
-        "## 1. Overview\n"
-        "(Brief summary of the domain)\n\n"
-        "## 2. Entities & Attributes\n"
-        "(List EVERY entity and ALL its attributes found in the image. Be exhaustive.)\n\n"
-        "## 3. Relationships\n"
-        "(List every line connecting boxes, including cardinality labels like '1', 'N', 'M' if visible.)\n\n"
-        "## 4. Issues\n"
-        "(Critique the design: are Primary Keys marked? Are relationships named? Issues are not necessary to be found if there are none.)\n\n"
-        "## 5. Suggestions\n"
-        "(How to make this diagram professional)\n\n"
-        "## 6. Score\n"
-        "Score: NN/100\n"
-        "(Brief justification)\n"
-    )
+def choose_reuse(digest: str, choice: str) -> None:
+    """Remember whether the user reuses the near-duplicate's analysis ("reuse") or runs a fresh one ("fresh")."""
+    st.session_state.setdefault("dv_near_duplicate_choice", {})[digest] = choice
 
-    payload = {
-        "model": "llava",
-        "stream": False,
-        "messages": [{
-            "role": "user",
-            "content": prompt,
-            "images": [img_b64],
-        }],
-        "options": {"temperature": 0.1}
-    }
 
-    try:
-        resp = requests.post(ollama_url, json=payload, timeout=120)
-        resp.raise_for_status()
-        text = resp.json().get("message", {}).get("content", "").strip()
-        score = parse_score_from_text(text)
-    except requests.exceptions.ConnectionError:
-        text = (
-            "## ⚠️ Connection Error\n"
-            "Could not connect to **Ollama**.\n\n"
-            "**How to fix:**\n"
-            "- Make sure the Ollama llava model is running.\n"
-            "- Ensure you have pulled the model using `ollama pull llava`."
-        )
-        score = None
-    except Exception as e:
-        text = f"## ⚠️ System Error\nError calling LLaVA: {e}"
-        score = None
+def attach_parsed(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse and pre-render the run's LLM reply; the blob store keeps the outcome for every rerun."""
+    block = results.get(RESULT_KEYS.get(results.get("mode"), ""), {})
+    parsed = parsing.from_result(block)
+    results["parsed"] = parsed
+    results["rendered"] = render_result(parsed)
+    if results.get("rules"):
+        results["rendered"]["rules"] = rules_card_html(results["rules"])
+    return results
 
-    return {"summary": text, "raw_output": text, "score": score, "entities": [], "relationships": []}
 
-# --- 3. OCR AND TEXT LLM (Baseline Mode) ---
-def run_ocr(image: Image.Image) -> Dict[str, Any]:
-    """Run OCR on the uploaded image using EasyOCR."""
-    np_img = np.array(image.convert("RGB"))
-    
-    _easyocr_reader = easyocr.Reader(["en"], gpu=True, verbose=False)
-    results = _easyocr_reader.readtext(np_img, detail=0)
+def stored_results(analysis_method: str, image_hash: str) -> Optional[Dict[str, Any]]:
+    """This session's results for the current upload and method, if they are still stored."""
+    ref = st.session_state.get("dv_results_ref") or {}
+    if ref.get("analysis_method") != analysis_method or ref.get("image_hash") != image_hash:
+        return None
+    return blobs.get_store().get_json(ref["blob"], prepare=attach_parsed, view="results")
 
-    extracted_text = "\n".join(results)
 
-    return {
-        "extracted_text": extracted_text,
-        "entities": [], 
-        "relationships": [],
+def store_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Put a finished job's results in the blob store and keep only a reference in the session."""
+    st.session_state["dv_results_ref"] = {
+        "analysis_method": results["analysis_method"],
+        "image_hash": results["image_hash"],
+        "blob": blobs.get_store().put_json(results),
     }
-
-def analyze_ocr_with_llava(ocr_payload: Dict[str, Any]) -> Dict[str, Any]:
-    """Analyze OCR-derived ER diagram text using LLaVA as a text-only LLM."""
-    ollama_url = "http://localhost:11434/api/chat"
-    model_name = "llava"
-
-    extracted_text = ocr_payload.get("extracted_text", "")
-    
-    # HARDENED PROMPT
-    prompt = (
-        "You are an expert Senior Database Engineer acting as a Data Cleaner.\n"
-        "You have been given raw, dirty OCR text from an Entity Relationship Diagram (ERD).\n"
-        "The OCR text contains significant 'hallucinations' (gibberish words, random characters, misread labels).\n\n"
-        "For scoring, do not be afraid to give a good score. Sometimes no issues will be found. If there are issues give an appropriate score to reflect those.\n\n"
-        f"RAW OCR DATA:\n{extracted_text}\n\n"
-        "### STRICT INSTRUCTIONS:\n"
-        "1. **AGGRESSIVE FILTERING**: Before analyzing, mentally delete any text that does not look like a valid English word, a standard database abbreviation (e.g., PK, FK, ID), or a plausible variable name.\n"
-        "   - Example: 'Checynll', 'Haptd', 'Hadidid', 'Habitnmm' -> IGNORE THESE COMPLETELY.\n"
-        "   - Example: 'User', 'Student', 'enroll_date' -> KEEP THESE.\n"
-        "2. **DO NOT REPORT NOISE**: Do NOT list OCR artifacts in the 'Issues' section. If you see 'Haptd', pretend you never saw it. Do not suggest removing it; just exclude it from your output entirely.\n"
-        "3. **INFER CONTEXT**: If you see 'Studnt', correct it to 'Student'. If you see 'Primry Key', treat it as 'Primary Key'.\n"
-        "4. **OUTPUT FORMAT**: Use Markdown headers (##) and bullet points (-).\n\n"
-        "### OUTPUT SECTIONS:\n\n"
-        "## 1. Overview\n"
-        "(1-2 sentences on what the Valid parts of the diagram represent)\n\n"
-        "## 2. Entities & Attributes\n"
-        "(List ONLY the valid, real entities you detected. Correct spelling errors if obvious.)\n"
-        "- **EntityName**: Attribute1, Attribute2, ...\n\n"
-        "## 3. Relationships\n"
-        "(List valid relationships between the real entities)\n"
-        "- EntityA connects to EntityB (Type if known)\n\n"
-        "## 4. Issues\n"
-        "(List ONLY logical database issues like missing keys or bad cardinality. DO NOT mention OCR typos or gibberish words here. Do not need to find issues if there are none.)\n\n"
-        "## 5. Suggestions\n"
-        "(Standard database improvements)\n\n"
-        "## 6. Score\n"
-        "Score: NN/100\n"
-        "(Brief justification)\n"
+    return stored_results(results["analysis_method"], results["image_hash"])
+
+
+def current_job(request: jobs.AnalysisRequest) -> jobs.Job:
+    """This session's job for ``request``: the one it started earlier, or a new or in-flight one to join."""
+    key = jobs.analysis_key(request)
+    saved = st.session_state.get("dv_job") or {}
+    job = jobs.get_pool().get(saved.get("id")) if saved.get("key") == key else None
+    if job is None:
+        job = jobs.submit_analysis(request)
+        st.session_state["dv_job"] = {"id": job.id, "key": key}
+    # Also in the URL, so a refreshed tab (a brand-new session) can find the job again.
+    st.query_params["job"] = job.id
+    return job
+
+
+def restore_from_job(job_id: str) -> bool:
+    """Refill the upload page's session keys from a job's request; False if the job is gone."""
+    job = jobs.get_pool().get(job_id)
+    request = job.request if job is not None else None
+    if not isinstance(request, jobs.AnalysisRequest):
+        return False
+    st.session_state["dv_image"] = request.image_digest
+    st.session_state["dv_image_name"] = request.image_name
+    st.session_state["dv_analysis_method"] = METHOD_LABELS.get(request.mode, request.mode)
+    st.session_state.setdefault("dv_near_duplicate_choice", {})[request.image_digest] = (
+        "reuse" if request.reused_from else "fresh"
     )
-
-    payload = {
-        "model": model_name,
-        "stream": False,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt,
-            }
-        ],
-        "options": {
-            "temperature": 0.1,
-            "num_ctx": 2048
-        }
-    }
-
-    try:
-        resp = requests.post(ollama_url, json=payload, timeout=120)
-        resp.raise_for_status()
-        data = resp.json()
-        text = data.get("message", {}).get("content", "").strip()
-        score = parse_score_from_text(text)
-    except requests.exceptions.ConnectionError:
-        text = (
-            "## ⚠️ Connection Error\n"
-            "Could not connect to **Ollama**.\n\n"
-            "**How to fix:**\n"
-            "- Make sure the Ollama llava model is running.\n"
-            "- Ensure you have pulled the model using `ollama pull llava`."
+    st.session_state["dv_job"] = {"id": job.id, "key": job.key}
+    return True
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(job_id: str) -> None:
+    """Redraw a running job's progress log and streamed sections; rerun the page once it finishes."""
+    job = jobs.get_pool().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    log, text, position = job.progress()
+    if position:
+        label = f"⏳ Model busy, you are #{position} in the queue..."
+    elif job.state == jobs.QUEUED:
+        label = "Waiting for a free analysis worker..."
+    else:
+        label = f"Analyzing diagram... ({job.seconds():.0f}s)"
+    with st.status(label, expanded=True):
+        for line in log:
+            st.write(line)
+    report = job.shared().get("rules")
+    if report:
+        # Local rule findings arrive in milliseconds, long before the model's reply.
+        show_html(rules_card_html(report))
+    if text:
+        show_html(sections_preview_html(text))
+    shared = f" Shared with {job.attached - 1} other request(s) for this diagram and method." if job.attached > 1 else ""
+    st.caption(f"This analysis runs in the background; you can leave this page and come back.{shared}")
+
+
+def job_status_view() -> None:
+    """Expander listing the process's background jobs."""
+    pool = jobs.get_pool()
+    stats = pool.stats()
+    with st.expander(f"🧵 Background jobs ({stats['running']} running, {stats['queued']} queued)"):
+        st.caption(
+            f"{stats['workers']} workers · {stats['submitted']} submitted, {stats['coalesced']} joined an "
+            f"in-flight job, {stats['done']} done, {stats['failed']} failed"
         )
-        score = None
-    except Exception as e:
-        text = f"## ⚠️ System Error\nError calling LLaVA: {e}"
-        score = None
-
-    return {
-        "summary": text,
-        "issues": [],
-        "suggested_fixes": [],
-        "raw_output": text,
-        "score": score,
-    }
+        snapshots = [job.snapshot() for job in pool.jobs()]
+        if snapshots:
+            st.table(snapshots)
 
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+metrics.page_view("results")
+page_css = assets.page_css("results")
+st.markdown(page_css, unsafe_allow_html=True)
+metrics.page_sent("results", "css", len(page_css))
 
 st.markdown("<div class='dv-title'>Diagram Analysis Results</div>", unsafe_allow_html=True)
 status_container = st.empty()
 
-# Ensure we have inputs from the upload page
-if "dv_image_bytes" not in st.session_state or "dv_analysis_method" not in st.session_state:
+
+def no_diagram_page() -> None:
+    """The "upload a diagram" screen; ends the run."""
     st.markdown(
         """
         <div style='text-align:center; margin-top: 3rem;'>
@@ -473,87 +193,105 @@ if "dv_image_bytes" not in st.session_state or "dv_analysis_method" not in st.se
 
     st.stop()
 
-image_bytes = st.session_state["dv_image_bytes"]
-image_name = st.session_state.get("dv_image_name", "Uploaded diagram")
-analysis_method = st.session_state["dv_analysis_method"]
-
-image = Image.open(BytesIO(image_bytes))
 
-current_image_hash = hash(image_bytes)
+# Ensure we have inputs from the upload page (or from the job in the URL, after a refresh)
+has_inputs = "dv_image" in st.session_state and "dv_analysis_method" in st.session_state
+if not has_inputs and "job" in st.query_params:
+    has_inputs = restore_from_job(st.query_params["job"])
+stored = has_inputs and blobs.get_store().contains(st.session_state["dv_image"])
+if has_inputs and not stored:
+    st.warning("The uploaded diagram is no longer stored on the server. Please upload it again.")
+if not stored:
+    no_diagram_page()
 
-results = st.session_state.get("dv_results")
+image_name = st.session_state.get("dv_image_name", "Uploaded diagram")
+analysis_method = st.session_state["dv_analysis_method"]
 
-need_to_run = (
-    results is None 
-    or results.get("analysis_method") != analysis_method
-    or results.get("image_hash") != current_image_hash
-)
+# The blob store's key is the content digest (not Python's per-process salted hash),
+# so cache keys survive reloads and restarts
+current_image_hash = st.session_state["dv_image"]
+cache = analysis_cache.get_cache()
+
+# Results not stored any more (or never produced) are fetched again: the analysis cache has them.
+results = stored_results(analysis_method, current_image_hash)
+need_to_run = results is None
+
+# A rescaled/re-cropped/recompressed copy of an analysed diagram gets a new digest;
+# look it up by perceptual hash and reuse that analysis (offered, or served outright).
+analysis_digest = current_image_hash
+reused_from = None
+mode_id = PIPELINE_IDS.get(analysis_method, "llava_extract")
+if need_to_run and similarity.get_index() is not None and not cached_result_key(mode_id, current_image_hash):
+    # The only full decode of the upload on this page; previews come from previews.preview.
+    original_bytes = blobs.get_store().get(current_image_hash)
+    if original_bytes is None:  # evicted since the check above
+        st.warning("The uploaded diagram is no longer stored on the server. Please upload it again.")
+        no_diagram_page()
+    original = Image.open(BytesIO(original_bytes))
+    match = near_duplicate(mode_id, similarity.signature(original), current_image_hash)
+    choice = st.session_state.get("dv_near_duplicate_choice", {}).get(current_image_hash)
+    if match is not None and (config.SIMILARITY_MODE == "serve" or choice == "reuse"):
+        analysis_digest = match.digest
+        reused_from = {"digest": match.digest, "distance": match.distance}
+    elif match is not None and choice is None:
+        st.info(
+            f"♻️ This looks like a diagram that was already analysed with this method "
+            f"({match.distance} of 128 hash bits differ). Reuse that analysis instantly, "
+            f"or run a fresh one if the diagram's text changed?"
+        )
+        st.button("⚡ Use the earlier analysis", key="dv_reuse_yes", on_click=choose_reuse, args=(current_image_hash, "reuse"))
+        st.button("Analyze this upload", key="dv_reuse_no", on_click=choose_reuse, args=(current_image_hash, "fresh"))
+        show_preview(current_image_hash)
+        st.stop()
 
 if need_to_run:
-    if "dv_results" in st.session_state:
-        del st.session_state["dv_results"]
-
-    start_time = time.time()
-    # Use st.status for a multi-step progress log
-    with st.status("Starting analysis pipeline...", expanded=True) as status:
-
-        results_payload: Dict[str, Any] = {
-            "analysis_method": analysis_method,
-            "image_hash": current_image_hash,
-        }
-
-        # Show the image temporarily while processing so the screen isn't empty
-        with st.spinner("Processing image...", show_time=True):
-            st.write("✅ Image processed")
-        image_container = st.empty()
-        image_container.image(image, width="stretch")
-
-        if analysis_method == "OCR + text LLM (baseline)":
-            with st.spinner("Scanning text with EasyOCR...", show_time=True):
-                ocrresults = run_ocr(image)
-            st.write("✅ Text scanned")
-            
-            with st.spinner("Analyzing logical structure...", show_time=True):
-                llmresults = analyze_ocr_with_llava(ocrresults)
-            st.write("✅ Logic analyzed")
-
-            results_payload["mode"] = "ocr_llm"
-            results_payload["ocrresults"] = ocrresults
-            results_payload["llmresults"] = llmresults
-
-        elif analysis_method == "LLaVA image-based (Ollama)":
-            with st.spinner("Sending image to Vision model...", show_time=True):
-                llavaresults = analyze_diagram_with_llava(image)
-            st.write("✅ Vision analysis complete")
-
-            results_payload["mode"] = "llava_image"
-            results_payload["llavaresults"] = llavaresults
-
-        else: 
-            with st.spinner("Extracting entities and relationships...", show_time=True):
-                extractresults = extract_with_llava(image)
-            st.write("✅ Extraction complete")
-
-            results_payload["mode"] = "llava_extract"
-            results_payload["extractresults"] = extractresults
-
-        end_time = time.time()
-        duration = end_time - start_time
-
+    st.session_state.pop("dv_results_ref", None)
+
+    # The analysis runs on the background job pool; this script only starts or joins it and polls.
+    job = current_job(jobs.AnalysisRequest(
+        mode_id, image_name, current_image_hash, analysis_digest, reused_from
+    ))
+    if not job.done:
+        job_progress(job.id)
+        show_preview(current_image_hash)
+        job_status_view()
+        st.stop()
+
+    if job.state == jobs.FAILED:
+        st.error(f"⚠️ The analysis failed: {job.error}")
+        if st.button("Try again", key="dv_job_retry"):
+            st.session_state.pop("dv_job", None)
+            st.rerun()
+        st.stop()
+
+    with st.status(f"Analysis complete! ({job.seconds():.2f}s)", state="complete", expanded=False):
+        for line in job.progress()[0]:
+            st.write(line)
         st.write("✅ We ran your chosen analysis pipeline on the uploaded diagram. Review the findings below!")
-        status.update(
-            label=f"Analysis complete! ({duration:.2f}s)", 
-            state="complete", 
-            expanded=False
+        cache_stats = cache.stats()
+        st.caption(
+            f"Analysis cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.0f} KB)"
+        )
+        queue_stats = scheduler.get_scheduler().stats()
+        st.caption(
+            f"Model queue: {queue_stats['in_flight']}/{queue_stats['max_in_flight']} running, "
+            f"{queue_stats['queued']} waiting, {queue_stats['shed']} turned away"
+        )
+        store_stats = blobs.get_store().stats()
+        st.caption(
+            f"Session store: {store_stats['resident_bytes'] / 2**20:.1f} of "
+            f"{store_stats['memory_bytes'] / 2**20:.0f} MB in memory, {store_stats['disk_used'] / 2**20:.1f} MB on disk, "
+            f"{store_stats['deduplicated']} repeated uploads stored once"
         )
 
-    # Save to session state
-    st.session_state["dv_results"] = results_payload
-    results = results_payload
+    # The session keeps a digest; the results themselves (and their parsed form) live in the blob store.
+    results = store_results(job.result)
     
     st.warning("Results are not 100% accurate due to model hallucination. Manual review is recommended.")
-    
-    image_container.empty()
+
+parsed = results["parsed"]
+rendered = results["rendered"]
 
 st.set_page_config(layout="wide")
 
@@ -563,23 +301,24 @@ left_col, right_col = st.columns([1, 1])
 
 with left_col:
     st.markdown("<div class='dv-section-title'>Diagram preview</div>", unsafe_allow_html=True)
-    st.image(image, width="stretch")
+    show_preview(current_image_hash)
     st.markdown(f"**File:** {image_name}")
     st.markdown(f"**Analysis method:** {analysis_method}")
+    if results.get("reused_from"):
+        st.caption(
+            f"♻️ Reused the analysis of a near-identical earlier upload "
+            f"({results['reused_from']['distance']} of 128 hash bits differ)"
+        )
 
     mode = results.get("mode")
-    result_block = {}
-    
-    # Identify which results to use
-    if mode == "ocr_llm":
-        result_block = results.get("llmresults", {})
-    elif mode == "llava_image":
-        result_block = results.get("llavaresults", {})
-    elif mode == "llava_extract":
-        result_block = results.get("extractresults", {})
+    result_block = results.get(RESULT_KEYS.get(mode, ""), {})
+    if result_block.get("model"):
+        failed = [f["model"] for f in result_block.get("model_failures") or []]
+        note = f" (after {', '.join(failed)} failed)" if failed else ""
+        st.markdown(f"**Model:** {result_block['model']}{note}")
 
     score = result_block.get("score")
-    summary_text = result_block.get("summary", "")
+    rules_report = results.get("rules")
 
     # Display Score
     if score is not None:
@@ -632,28 +371,13 @@ with left_col:
             unsafe_allow_html=True
         )
 
-        # Extract Reasoning (Look for the ## Score section)
-        if summary_text:
-            # Split by Markdown headers (## Title)
-            parts = re.split(r"(?m)^##\s+(.+)$", summary_text)
-            reasoning_body = ""
-            
-            if len(parts) > 1:
-                for i in range(1, len(parts), 2):
-                    title = parts[i].strip().lower()
-                    if "score" in title:
-                        raw_body = parts[i+1].strip()
-                        clean_lines = [line for line in raw_body.splitlines() if "Score:" not in line]
-                        reasoning_body = "\n".join(clean_lines).strip()
-                        break
-            
-            if reasoning_body:
-                st.markdown("**Score reasoning**")
-                reasoning_html = format_text_to_html(reasoning_body)
-                st.markdown(
-                    f"<div class='dv-section-text'>{reasoning_html}</div>",
-                    unsafe_allow_html=True,
-                )
+        if rules_report:
+            count = len(rules_report["findings"])
+            st.caption(f"📏 Local rule checks alone: {rules_report['score']}/100 ({count} finding{'s' * (count != 1)})")
+
+        if rendered["reasoning"]:
+            st.markdown("**Score reasoning**")
+            show_html(f"<div class='dv-section-text'>{rendered['reasoning']}</div>")
 
     st.markdown(" ")
     st.markdown(" ")
@@ -665,11 +389,12 @@ with right_col:
     mode = results.get("mode")
     summary_text = ""
     ocr_debug_text = None
+    ocr_payload = results.get("ocrresults", {})
 
     if mode == "ocr_llm":
         st.markdown("<div class='dv-section-title'>Analysis: OCR + Text LLM</div>", unsafe_allow_html=True)
         summary_text = results.get("llmresults", {}).get("summary", "")
-        ocr_debug_text = results.get("ocrresults", {}).get("extracted_text", "")
+        ocr_debug_text = ocr_payload.get("extracted_text", "")
         
     elif mode == "llava_image":
         st.markdown("<div class='dv-section-title'>Analysis: LLaVA (Vision)</div>", unsafe_allow_html=True)
@@ -679,60 +404,64 @@ with right_col:
         st.markdown("<div class='dv-section-title'>Analysis: LLaVA (Extraction Focused)</div>", unsafe_allow_html=True)
         summary_text = results.get("extractresults", {}).get("summary", "")
 
+    elif mode == "hybrid":
+        st.markdown("<div class='dv-section-title'>Analysis: Hybrid OCR + Vision</div>", unsafe_allow_html=True)
+        summary_text = results.get("llmresults", {}).get("summary", "")
+        ocr_debug_text = ocr_payload.get("extracted_text", "")
+        timings = results.get("timings", {})
+        if timings:
+            st.caption(
+                f"OCR {timings['ocr']:.2f}s ∥ encode {timings['encode']:.2f}s "
+                f"→ parallel {timings['parallel']:.2f}s · LLaVA {timings['llm']:.2f}s"
+            )
+
+    if rendered.get("rules"):
+        show_html(rendered["rules"])
+
     if summary_text:
-        parts = re.split(r"(?m)^##\s+(.+)$", summary_text)
-
-        if len(parts) > 1:
-            for i in range(1, len(parts), 2):
-                title = parts[i].strip()
-                body = parts[i + 1].strip() if i + 1 < len(parts) else ""
-
-                if "score" in title.lower():
-                    continue
-
-                card_style = "border: 1px solid rgba(148, 163, 184, 0.2);" # Default Slate
-                icon = "📄"
-                
-                t_lower = title.lower()
-                
-                if "issue" in t_lower or "error" in t_lower or "problem" in t_lower:
-                    # Red styling for Issues
-                    card_style = "border: 1px solid rgba(239, 68, 68, 0.5); background: rgba(239, 68, 68, 0.1);" 
-                    icon = "⚠️"
-                elif "suggestion" in t_lower or "fix" in t_lower or "recommend" in t_lower:
-                    # Green styling for Suggestions
-                    card_style = "border: 1px solid rgba(34, 197, 94, 0.5); background: rgba(34, 197, 94, 0.1);" 
-                    icon = "💡"
-                elif "entity" in t_lower or "attribute" in t_lower or "relationship" in t_lower:
-                    # Blue styling for Structural Data (Entities/Relationships)
-                    card_style = "border: 1px solid rgba(59, 130, 246, 0.5); background: rgba(59, 130, 246, 0.1);"
-                    icon = "🧬"
-
-                formatted_body = format_text_to_html(body)
-
-                st.markdown(
-                    f"""
-                    <div class='dv-issue-card' style='{card_style}'>
-                        <div style='display: flex; align-items: center; margin-bottom: 8px;'>
-                            <span style='font-size: 1.2rem; margin-right: 8px;'>{icon}</span>
-                            <strong>{title}</strong>
-                        </div>
-                        <div style='font-size: 0.9rem; color: #cbd5e1;'>
-                            {formatted_body}
-                        </div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+        if parsed.sections:
+            show_html(rendered["cards"])
         else:
             st.warning("Analysis generated, but section headers were missing.")
             st.info(summary_text)
     else:
         st.error("No analysis text returned.")
 
+    if parsed.entities or parsed.relationships:
+        with st.expander(f"🧬 Parsed schema ({len(parsed.entities)} entities, {len(parsed.relationships)} relationships)"):
+            if parsed.entities:
+                st.table([
+                    {
+                        "entity": e.name,
+                        "attributes": ", ".join(a.name for a in e.attributes),
+                        "primary key": ", ".join(a.name for a in e.attributes if a.primary),
+                    }
+                    for e in parsed.entities
+                ])
+            if parsed.relationships:
+                st.table([r._asdict() for r in parsed.relationships])
+
     if ocr_debug_text:
         st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
         st.markdown("<div class='dv-section-title'>Extracted Text Content</div>", unsafe_allow_html=True)
         
+        prompt_text, _ = ocr_prompt_text(ocr_payload)
+        if prompt_text != ocr_debug_text:
+            # Cleaned and, when boxes could be grouped, one "Entity: attributes" line per entity.
+            with st.expander("Show OCR text sent to the model"):
+                st.code(prompt_text, language="text")
         with st.expander("Show raw text detected by OCR"):
-            st.code(ocr_debug_text, language="text")
\ No newline at end of file
+            st.code(ocr_debug_text, language="text")
+
+    stage_timings = results.get("stage_timings")
+    if stage_timings:
+        st.markdown("<div style='height: 1rem;'></div>", unsafe_allow_html=True)
+        with st.expander("⏱️ Stage timings"):
+            st.markdown("**This run**")
+            st.table(stage_timings)
+            st.markdown("**All runs in this process**")
+            st.table(metrics.REGISTRY.summary("ern_stage_seconds"))
+            st.markdown("**Sent to the browser per page view** (CSS, analysis cards, preview images)")
+            st.table(metrics.page_traffic())
+
+    job_status_view()
\ No newline at end of file
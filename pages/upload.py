@@ -1,102 +1,96 @@
+from typing import NamedTuple
+
 import streamlit as st
-from PIL import Image
-from io import BytesIO
+
+from normalizer import assets
+from normalizer import blobs
+from normalizer import config
+from normalizer import documents
+from normalizer import metrics
+from normalizer import previews
+from normalizer import residency
 
 st.set_page_config(page_title="Upload Diagram", layout="centered", initial_sidebar_state="collapsed", page_icon="📥")
 
-CUSTOM_CSS = """
-<style>
-.stApp {
-    background: radial-gradient(circle at 0% 0%, #4c1d95 0%, #020617 48%, #000000 100%) !important;
-}
-
-/* Upload section */
-.dv-upload-title {
-    text-align: left;
-    font-size: 1.5rem;
-    font-weight: 600;
-    margin-bottom: 0.25rem;
-}
-.dv-upload-subtitle {
-    font-size: 0.9rem;
-    color: #9ca3af;
-    margin-bottom: 1.2rem;
-}
-.dv-section-title {
-    font-weight: 600;
-    font-size: 1.2rem;
-    margin-bottom: 0.35rem;
-}
-[data-testid="stFileUploaderDropzone"] {
-    background: rgba(15,23,42,0.9) !important;
-    border: 1px dashed rgba(148,163,184,0.4) !important;
-    border-radius: 14px !important;
-    padding: 1.2rem !important;
-}
-
-/* Internal upload button */
-[data-testid="stFileUploaderDropzone"] button {
-    background: linear-gradient(90deg, #6366f1, #a855f7) !important;
-    border: none !important;
-    border-radius: 10px !important;
-    padding: 0.45rem 0.8rem !important;
-}
-[data-testid="stFileUploaderDropzone"] button:hover {
-    background: linear-gradient(90deg, #7c7ff7, #c084fc) !important;
-    color: #ffffff !important;
-    filter: brightness(1.15) !important;
-}
-
-/* Button */
-div[data-testid="stButton"] {
-    display: flex !important;
-    width: 100% !important;
-    text-align: center !important;
-}
-div[data-testid="stButton"] > button {
-    /* Dimensions */
-    width: 500px !important; 
-    
-    /* Visuals */
-    border-radius: 999px !important;
-    padding-top: 0.8rem !important;
-    padding-bottom: 0.8rem !important;
-    
-    /* Font & Color */
-    font-weight: 600 !important;
-    font-size: 1.1rem !important;
-    color: #ffffff !important;
-    background: linear-gradient(90deg, #6366f1, #a855f7) !important;
-    
-    border: none !important;
-    box-shadow: 0 4px 18px rgba(99,102,241,0.35);
-    transition: all 0.2s ease-in-out;
-}
-div[data-testid="stButton"] > button:hover {
-    background: linear-gradient(90deg, #7c7ff7, #c084fc) !important;
-    color: #ffffff !important;
-    box-shadow: 0 6px 22px rgba(99,102,241,0.55);
-    transform: translateY(-1px);
-}
-
-/* Expander Styling */
-.streamlit-expanderHeader {
-    background-color: rgba(15, 23, 42, 0.6) !important;
-    border-radius: 8px !important;
-    color: #e2e8f0 !important;
-    font-size: 0.95rem !important;
-}
-[data-testid="stExpanderDetails"] {
-    background-color: rgba(15, 23, 42, 0.4) !important;
-    border-bottom-left-radius: 8px !important;
-    border-bottom-right-radius: 8px !important;
-    color: #cbd5e1 !important;
-}
-</style>
-"""
+metrics.page_view("upload")
 
 # Apply CSS
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+page_css = assets.page_css("upload")
+st.markdown(page_css, unsafe_allow_html=True)
+metrics.page_sent("upload", "css", len(page_css))
+
+
+class StoredUpload(NamedTuple):
+    digest: str
+    pdf: bool
+    pages: int  # diagrams in the file: 1 for an image, the page count for a readable PDF
+    error: str  # why a PDF could not be read ("" if it could)
+
+
+def stored_upload(uploaded_file) -> StoredUpload:
+    """
+    Store an upload and count its pages once per file the uploader holds; later
+    reruns reuse the result instead of re-reading the file and re-parsing PDFs.
+    """
+    saved = st.session_state.setdefault("dv_uploads", {})
+    hit = saved.get(uploaded_file.file_id)
+    if hit is None:
+        data = uploaded_file.getvalue()
+        pdf, pages, error = documents.is_pdf(data), 1, ""
+        if pdf:
+            try:
+                pages = documents.pdf_page_count(data)
+            except documents.PdfUnavailable as e:
+                pages, error = 0, str(e)
+            except Exception as e:  # a damaged or encrypted PDF
+                pages, error = 0, f"Could not read {uploaded_file.name}: {e}"
+        hit = saved[uploaded_file.file_id] = StoredUpload(blobs.get_store().put(data), pdf, pages, error)
+    return hit
+
+
+def show_preview(digest: str) -> None:
+    """The upload at display size; its bytes count as sent the first time this session shows it."""
+    shown = previews.preview(digest)
+    if shown is None:
+        return
+    st.image(shown.data, width="stretch", output_format=shown.format)
+    sent = st.session_state.setdefault("dv_previews_sent", set())
+    if (digest, shown.width) not in sent:
+        sent.add((digest, shown.width))
+        metrics.page_sent("upload", "image", len(shown.data))
+
+
+def model_status_html(states) -> str:
+    """One status pill per routed model."""
+    pills = []
+    for s in states:
+        if s.state == residency.READY:
+            loaded = f" (loaded in {s.load_seconds:.1f}s)" if (s.load_seconds or 0) >= 0.1 else ""
+            pills.append(f"🟢 <strong>{s.model}</strong> is loaded and ready{loaded}")
+        elif s.state == residency.LOADING:
+            pills.append(f"🟡 Loading <strong>{s.model}</strong> into memory... analyses started now wait for it")
+        elif s.state == residency.FAILED:
+            pills.append(f"🔴 <strong>{s.model}</strong> is unavailable. Is Ollama running at {config.OLLAMA_HOST}?")
+        else:
+            pills.append(f"⚪ <strong>{s.model}</strong> is not loaded; the first analysis will include its load time")
+    return "".join(f"<div class='dv-model-status'>{p}</div>" for p in pills)
+
+
+# Re-check what Ollama has loaded, then (re)load anything cold while the user picks a file
+# rather than inside their first analysis.
+residency.get_residency().status()
+residency.ensure_warm()
+warming = any(s.state == residency.LOADING for s in residency.get_residency().status())
+
+
+# Polls only while a model is loading; one full rerun afterwards stops the polling.
+@st.fragment(run_every="2s" if warming else None)
+def model_readiness() -> None:
+    states = residency.get_residency().status()
+    st.markdown(model_status_html(states), unsafe_allow_html=True)
+    if warming and not any(s.state == residency.LOADING for s in states):
+        st.rerun()
+
 
 # Page heading
 st.markdown("<div class='dv-upload-title'>Upload a diagram</div>", unsafe_allow_html=True)
@@ -105,14 +99,18 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+model_readiness()
+
 st.markdown("<div class='dv-section-title'>Diagram image</div>", unsafe_allow_html=True)
 
-uploaded_file = st.file_uploader(
-    "Diagram image (PNG/JPEG)",
-    type=["png", "jpg", "jpeg"],
+uploaded_files = st.file_uploader(
+    "Diagram images or PDFs (PNG/JPEG/PDF)",
+    type=[*documents.IMAGE_TYPES, "pdf"],
+    accept_multiple_files=True,
     label_visibility="collapsed",
     key="diagram_uploader_page",
 )
+st.caption("Upload several images or a PDF (one diagram per page) to validate them all in one go.")
 
 st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
 st.markdown("<div class='dv-section-title'>Analysis method</div>", unsafe_allow_html=True)
@@ -123,6 +121,7 @@ analysis_method = st.radio(
         "OCR + text LLM (baseline)",
         "LLaVA image-based (Ollama)",
         "LLaVA extraction (entities & relationships)",
+        "Hybrid OCR + LLaVA (image + text)",
     ],
     horizontal=False, # Changed to False so it sits nicely above the expanders
     label_visibility="collapsed"
@@ -157,18 +156,45 @@ with st.expander("📝  Why use LLaVA Extraction?"):
     * **Pros:** Great for generating a list of requirements or database schemas.
     * **Cons:** Provides less "critique" or advice; focuses purely on data extraction.
     """)
+
+with st.expander("🧩  Why use Hybrid OCR + LLaVA?"):
+    st.markdown("""
+    **Best for: Diagrams with small labels *and* important structure.**
+    
+    OCR and image preparation run at the same time, then the Vision model gets the image *plus* the OCR text in a single request.
+    * **Pros:** Reads small labels like OCR while still understanding boxes, lines, and cardinality.
+    * **Cons:** Slightly longer prompt than Vision alone; still only one model call.
+    """)
 # -----------------------------
 
-image = None
-if uploaded_file:
-    st.markdown("---")
-    # Save raw bytes so the Results page can reconstruct the image
-    file_bytes = uploaded_file.getvalue()
-    st.session_state["dv_image_bytes"] = file_bytes
-    st.session_state["dv_image_name"] = uploaded_file.name
+# Files no longer in the uploader are forgotten; their bytes stay in the shared blob store.
+held = {f.file_id for f in uploaded_files}
+for file_id in [k for k in st.session_state.get("dv_uploads", {}) if k not in held]:
+    del st.session_state["dv_uploads"][file_id]
 
-    image = Image.open(BytesIO(file_bytes))
-    st.image(image, width="stretch")
+image_digest = None
+batch_files = []
+if len(uploaded_files) == 1 and not stored_upload(uploaded_files[0]).pdf:
+    uploaded_file = uploaded_files[0]
+    st.markdown("---")
+    # Stored (once) now, so the preview is built from the shared copy and Validate only passes the digest.
+    image_digest = stored_upload(uploaded_file).digest
+    show_preview(image_digest)
+elif uploaded_files:
+    # Several diagrams: the batch page expands PDFs and analyses them in the background.
+    st.markdown("---")
+    uploads = [(f.name, stored_upload(f)) for f in uploaded_files]
+    error = next((u.error for _, u in uploads if u.error), "")
+    if error:
+        st.error(error)
+    else:
+        # Only digests go into the session; the files themselves wait in the shared blob store.
+        batch_files = [(name, u.digest) for name, u in uploads]
+        rows = []
+        for name, u in uploads:
+            shown = min(u.pages, config.PDF_MAX_PAGES)
+            rows.append({"file": name, "diagrams": shown if shown == u.pages else f"{shown} (of {u.pages} pages)"})
+        st.table(rows)
 
 st.markdown(" ")
 col1, col2, col3 = st.columns([1,5,1])
@@ -176,11 +202,19 @@ run_button = col2.button("Validate diagram", key="validate_button_page")
 
 # When the button is clicked, store the chosen method and navigate to the results page.
 if run_button:
-    if image is None:
+    if batch_files:
+        st.session_state["dv_batch_files"] = batch_files
+        st.session_state["dv_analysis_method"] = analysis_method
+        st.session_state.pop("dv_batch_id", None)
+
+        st.switch_page("pages/batch.py")
+    elif image_digest is None:
         st.error("Please upload an image before validating.")
     else:
-        # Persist the chosen analysis method and clear any previous results
+        # Persist the upload's digest and the chosen analysis method, and clear any previous results
+        st.session_state["dv_image"] = image_digest
+        st.session_state["dv_image_name"] = uploaded_file.name
         st.session_state["dv_analysis_method"] = analysis_method
-        st.session_state.pop("dv_results", None)
+        st.session_state.pop("dv_results_ref", None)
 
         st.switch_page("pages/results.py")
\ No newline at end of file